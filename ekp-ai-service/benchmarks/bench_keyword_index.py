@@ -0,0 +1,70 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.keyword_index import KeywordIndex
+
+
+def synthetic_chunks(count: int, words: int = 60, seed: int = 0):
+    # 词频服从 Zipf-Mandelbrot 分布 (p ∝ 1 / (rank + 2.7))，词表为 5 万个两字词，近似中文文本的词频长尾；
+    # 每 50 个分块带一个保单编号
+    rng = np.random.default_rng(seed)
+    vocabulary = 50000
+    characters = np.array([chr(0x4E00 + i) for i in range(6000)])
+    lexicon = ["".join(pair) for pair in rng.choice(characters, size=(vocabulary, 2))]
+    weights = 1.0 / (np.arange(vocabulary) + 2.7)
+    weights /= weights.sum()
+    for start in range(0, count, 10000):
+        ranks = rng.choice(vocabulary, size=(min(10000, count - start), words), p=weights)
+        for offset, chunk_ranks in enumerate(ranks):
+            text = "".join(lexicon[r] for r in chunk_ranks)
+            if (start + offset) % 50 == 0:
+                text += f" PL-{start + offset:07d}"
+            yield text
+
+
+def main(count: int = 1_000_000, queries: int = 200, k: int = 20) -> None:
+    index = KeywordIndex()
+    started = time.perf_counter()
+    batch_ids, batch_texts = [], []
+    for chunk_id, text in enumerate(synthetic_chunks(count)):
+        batch_ids.append(chunk_id)
+        batch_texts.append(text)
+        if len(batch_ids) == 1000:
+            index.add(chunk_id // 1000, batch_ids, batch_texts)
+            batch_ids, batch_texts = [], []
+    if batch_ids:
+        index.add(count // 1000, batch_ids, batch_texts)
+    status = index.status()
+    postings_mb = status["postings"] * 5 / 2**20
+    print(
+        f"构建 {count} 个分块: {time.perf_counter() - started:.1f}s, "
+        f"{status['segments']} 个段, {status['postings']} 条倒排 (~{postings_mb:.0f} MB)"
+    )
+
+    rng = np.random.default_rng(1)
+    texts = [text[:12] for text in synthetic_chunks(queries, words=6, seed=2)]
+    cases = {
+        "中文短句": texts,
+        "编号精确匹配": [f"PL-{int(i) * 50:07d} 理赔" for i in rng.integers(0, count // 50, queries)],
+        "限定 10 篇文档": texts,
+    }
+    for name, query_texts in cases.items():
+        document_ids = list(range(10)) if name.startswith("限定") else None
+        latencies = []
+        for query in query_texts:
+            began = time.perf_counter()
+            index.search(query, top_k=k, document_ids=document_ids)
+            latencies.append((time.perf_counter() - began) * 1000)
+        print(
+            f"  {name:<12} p50={np.percentile(latencies, 50):6.2f} ms  "
+            f"p95={np.percentile(latencies, 95):6.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import settings
+from src.services.similarity import cosine_similarity_matrix, mmr_select
+
+
+def median_us(func, rounds: int) -> float:
+    func()
+    latencies = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(latencies)
+
+
+def naive_mmr(relevance, embeddings, k: int, lambda_mult: float):
+    selected = []
+    candidates = list(range(len(relevance)))
+    while candidates and len(selected) < k:
+        best, best_score = None, -float("inf")
+        for i in candidates:
+            redundancy = max(
+                (
+                    float(np.dot(embeddings[i], embeddings[j])
+                          / (np.linalg.norm(embeddings[i]) * np.linalg.norm(embeddings[j])))
+                    for j in selected
+                ),
+                default=0.0,
+            )
+            score = lambda_mult * relevance[i] - (1 - lambda_mult) * redundancy
+            if score > best_score:
+                best, best_score = i, score
+        selected.append(best)
+        candidates.remove(best)
+    return selected
+
+
+def main(cases=((5, 20), (5, 100), (10, 100), (10, 400)), rounds: int = 200) -> None:
+    dimension = settings.embedding_dimension
+    rng = np.random.default_rng(0)
+    print(f"MMR 选择耗时 ({dimension} 维, 中位数 / {rounds} 次)")
+    print(f"  {'k':>4} {'候选数':>6} {'向量化 us':>10} {'逐对 us':>10}")
+    for k, pool in cases:
+        embeddings = rng.normal(size=(pool, dimension)).astype(np.float32)
+        relevance = rng.random(pool).astype(np.float32)
+        fast = median_us(lambda: mmr_select(relevance, embeddings, k, settings.mmr_lambda), rounds)
+        slow = median_us(lambda: naive_mmr(relevance, embeddings, k, settings.mmr_lambda), 3)
+        print(f"  {k:>4} {pool:>6} {fast:>10.1f} {slow:>10.0f}")
+
+    queries = rng.normal(size=(32, dimension)).astype(np.float32)
+    corpus = rng.normal(size=(1000, dimension)).astype(np.float32)
+    elapsed = median_us(lambda: cosine_similarity_matrix(queries, corpus), 20)
+    print(f"相似度矩阵 32 x 1000: {elapsed / 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
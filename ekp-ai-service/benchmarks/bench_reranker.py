@@ -0,0 +1,64 @@
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import settings
+from src.services.reranker_service import PairScoreCache, RerankerService
+from src.services.vector_store import SearchResult
+
+
+def synthetic_results(count: int, length: int = 300, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    characters = [chr(0x4E00 + i) for i in range(3000)]
+    return [
+        SearchResult(i, i // 10, "".join(rng.choice(characters, size=length)), 1.0 - i / count)
+        for i in range(count)
+    ]
+
+
+def measure(reranker: RerankerService, query: str, results, rounds: int) -> float:
+    latencies = []
+    for _ in range(rounds):
+        reranker.cache = PairScoreCache()
+        started = time.perf_counter()
+        reranker.rerank(query, results, top_k=5)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return statistics.median(latencies)
+
+
+def main(pool_sizes=(10, 20, 50, 100, 200), rounds: int = 5) -> None:
+    from sentence_transformers import CrossEncoder
+
+    budget = settings.reranker_latency_budget_ms
+    # 只测模型本身的开销：关闭预算截断，逐个候选池大小测量冷缓存 / 热缓存耗时
+    settings.reranker_max_candidates = max(pool_sizes)
+    settings.reranker_latency_budget_ms = float("inf")
+    model = CrossEncoder(
+        settings.reranker_model, max_length=settings.reranker_max_length, device="cpu"
+    )
+    reranker = RerankerService(model=model)
+    query = "员工年假天数如何根据工龄计算"
+    reranker.rerank(query, synthetic_results(8), top_k=5)
+
+    print(f"交叉编码器重排耗时 ({settings.reranker_model}, CPU, 分块 300 字, 中位数 / {rounds} 次)")
+    print(f"  {'候选数':>6} {'冷缓存 ms':>10} {'每候选 ms':>10} {'热缓存 ms':>10}")
+    for size in pool_sizes:
+        results = synthetic_results(size, seed=size)
+        cold = measure(reranker, query, results, rounds)
+        reranker.rerank(query, results, top_k=5)
+        started = time.perf_counter()
+        reranker.rerank(query, results, top_k=5)
+        warm = (time.perf_counter() - started) * 1000
+        print(f"  {size:>6} {cold:>10.1f} {cold / size:>10.2f} {warm:>10.2f}")
+
+    print(f"按当前估计的单对耗时 {reranker.pair_latency_ms:.2f} ms，{budget:.0f} ms 预算可重排 "
+          f"{int(budget / reranker.pair_latency_ms)} 个候选")
+
+
+if __name__ == "__main__":
+    main()
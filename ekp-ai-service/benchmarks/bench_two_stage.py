@@ -0,0 +1,71 @@
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.document_embeddings import document_embedding, recall_at_k
+from src.services.similarity import normalize_rows
+
+
+# 合成语料：每篇文档围绕一个主题向量，分块是主题向量加噪声
+def make_corpus(documents: int, chunks_per_document: int, dimension: int, rng):
+    topics = normalize_rows(rng.normal(size=(documents, dimension)).astype(np.float32))
+    noise = rng.normal(scale=0.08, size=(documents, chunks_per_document, dimension))
+    noise = noise.astype(np.float32)
+    chunks = normalize_rows((topics[:, None, :] + noise).reshape(-1, dimension))
+    owners = np.repeat(np.arange(documents), chunks_per_document)
+    centroids = np.stack(
+        [document_embedding(chunks[owners == d]) for d in range(documents)]
+    )
+    return chunks, owners, centroids
+
+
+def flat_search(chunks, query, top_k):
+    scores = chunks @ query
+    return np.argpartition(-scores, top_k)[:top_k]
+
+
+def two_stage_search(chunks, owners, centroids, query, top_k, candidates):
+    selected = np.argpartition(-(centroids @ query), candidates)[:candidates]
+    rows = np.flatnonzero(np.isin(owners, selected))
+    scores = chunks[rows] @ query
+    return rows[np.argpartition(-scores, top_k)[:top_k]], len(rows)
+
+
+def main(sizes=(500, 2000, 8000), chunks_per_document: int = 20, dimension: int = 256,
+         top_k: int = 10, candidates: int = 50, queries: int = 50) -> None:
+    rng = np.random.default_rng(0)
+    print(
+        f"两阶段检索 vs 平铺检索 (每篇 {chunks_per_document} 块, {dimension} 维, "
+        f"top_k={top_k}, 候选文档 {candidates})"
+    )
+    print(f"  {'文档数':>6} {'召回率':>6} {'扫描分块比例':>12} {'平铺 ms':>8} {'两阶段 ms':>9}")
+    for documents in sizes:
+        chunks, owners, centroids = make_corpus(documents, chunks_per_document, dimension, rng)
+        recalls, scanned, flat_ms, staged_ms = [], [], [], []
+        for row in rng.choice(len(chunks), queries, replace=False):
+            query = chunks[row] + rng.normal(scale=0.05, size=dimension)
+            query = normalize_rows(query[None, :])[0].astype(np.float32)
+
+            started = time.perf_counter()
+            expected = flat_search(chunks, query, top_k)
+            flat_ms.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            found, rows = two_stage_search(chunks, owners, centroids, query, top_k, candidates)
+            staged_ms.append((time.perf_counter() - started) * 1000)
+
+            recalls.append(recall_at_k(expected.tolist(), found.tolist()))
+            scanned.append(rows / len(chunks))
+        print(
+            f"  {documents:>6} {statistics.mean(recalls):>6.3f} {statistics.mean(scanned):>12.3%} "
+            f"{statistics.median(flat_ms):>8.2f} {statistics.median(staged_ms):>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
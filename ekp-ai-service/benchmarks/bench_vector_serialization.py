@@ -0,0 +1,60 @@
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.vector_codec import (
+    from_pgvector_binary,
+    from_pgvector_text,
+    to_pgvector_binary,
+    to_pgvector_text,
+)
+
+
+def legacy_text(embedding):
+    return "[" + ",".join(str(x) for x in embedding) + "]"
+
+
+def measure(label: str, func, number: int) -> float:
+    per_call_us = timeit.timeit(func, number=number) / number * 1e6
+    print(f"  {label:<44} {per_call_us:>10.2f} us/向量")
+    return per_call_us
+
+
+def main(dimension: int = 1024, number: int = 2000) -> None:
+    rng = np.random.default_rng(0)
+    vector = rng.standard_normal(dimension).astype(np.float32)
+    as_list = vector.tolist()
+
+    print(f"向量序列化开销对比 (dim={dimension}, {number} 次)")
+    baseline = measure(
+        "旧实现: .tolist() + ','.join(str(x))",
+        lambda: legacy_text(vector.tolist()),
+        number,
+    )
+    measure("旧实现(已是 list): ','.join(str(x))", lambda: legacy_text(as_list), number)
+    text = measure("to_pgvector_text (psycopg2 文本参数)", lambda: to_pgvector_text(vector), number)
+    binary = measure(
+        "to_pgvector_binary (COPY / asyncpg)", lambda: to_pgvector_binary(vector), number
+    )
+
+    print(f"  文本快速路径加速: {baseline / text:.1f}x, 二进制加速: {baseline / binary:.1f}x")
+
+    encoded_text = to_pgvector_text(vector)
+    encoded_binary = to_pgvector_binary(vector)
+    print(f"  报文大小: 旧文本 {len(legacy_text(as_list))} B, "
+          f"新文本 {len(encoded_text)} B, 二进制 {len(encoded_binary)} B")
+
+    print("反序列化")
+    measure("from_pgvector_text", lambda: from_pgvector_text(encoded_text), number)
+    measure("from_pgvector_binary", lambda: from_pgvector_binary(encoded_binary), number)
+
+    assert np.array_equal(from_pgvector_binary(encoded_binary), vector)
+    assert np.array_equal(from_pgvector_text(encoded_text), vector)
+
+
+if __name__ == "__main__":
+    main()
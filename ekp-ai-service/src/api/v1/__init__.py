@@ -1,3 +1,3 @@
-from src.api.v1 import health, documents, qa
+from src.api.v1 import health, documents, qa, admin
 
-__all__ = ["health", "documents", "qa"]
+__all__ = ["health", "documents", "qa", "admin"]
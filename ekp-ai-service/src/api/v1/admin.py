@@ -0,0 +1,139 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+
+from src.services.vector_index_service import INDEX_METHODS, VectorIndexService
+from src.services.vector_replica import vector_replica
+from src.services.keyword_index import keyword_index
+from src.services.cache_service import semantic_qa_cache
+from src.services.retrieval_cache import retrieval_cache
+
+router = APIRouter()
+
+_index_tasks: Dict[str, asyncio.Task] = {}
+
+
+class VectorIndexCreateRequest(BaseModel):
+    method: str = "hnsw"
+    name: Optional[str] = None
+    m: Optional[int] = None
+    ef_construction: Optional[int] = None
+    lists: Optional[int] = None
+
+
+class VectorIndexTaskResponse(BaseModel):
+    index_name: str
+    action: str
+    status: str
+
+
+class VectorIndexStatusResponse(BaseModel):
+    table: str
+    row_estimate: int
+    indexes: List[Dict[str, Any]]
+    builds: List[Dict[str, Any]]
+    tasks: Dict[str, str]
+
+
+def _task_status(task: asyncio.Task) -> str:
+    if not task.done():
+        return "running"
+    if task.cancelled():
+        return "cancelled"
+    if task.exception():
+        return f"failed: {task.exception()}"
+    return "completed"
+
+
+def _schedule(index_name: str, action: str, func, *args, **kwargs) -> VectorIndexTaskResponse:
+    task = _index_tasks.get(index_name)
+    if task is not None and not task.done():
+        raise HTTPException(status_code=409, detail=f"索引 {index_name} 正在执行其他操作")
+
+    _index_tasks[index_name] = asyncio.create_task(asyncio.to_thread(func, *args, **kwargs))
+    return VectorIndexTaskResponse(index_name=index_name, action=action, status="running")
+
+
+def _ensure_managed_index(service: VectorIndexService, name: str) -> None:
+    if name not in {index.name for index in service.list_indexes()}:
+        raise HTTPException(status_code=404, detail=f"向量索引不存在: {name}")
+
+
+@router.get("/vector-indexes", response_model=VectorIndexStatusResponse)
+async def get_vector_index_status():
+    service = VectorIndexService()
+    try:
+        status = await asyncio.to_thread(service.status)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"查询索引状态失败: {e}")
+
+    return VectorIndexStatusResponse(
+        **status,
+        tasks={name: _task_status(task) for name, task in _index_tasks.items()},
+    )
+
+
+@router.post("/vector-indexes", response_model=VectorIndexTaskResponse, status_code=202)
+async def create_vector_index(request: VectorIndexCreateRequest):
+    if request.method not in INDEX_METHODS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支持的索引类型: {request.method}，可选: {', '.join(INDEX_METHODS)}",
+        )
+
+    service = VectorIndexService()
+    name = request.name or service.default_index_name(request.method)
+    return _schedule(
+        name,
+        "create",
+        service.create_index,
+        method=request.method,
+        name=name,
+        m=request.m,
+        ef_construction=request.ef_construction,
+        lists=request.lists,
+    )
+
+
+@router.post(
+    "/vector-indexes/{index_name}/rebuild",
+    response_model=VectorIndexTaskResponse,
+    status_code=202,
+)
+async def rebuild_vector_index(index_name: str):
+    service = VectorIndexService()
+    await asyncio.to_thread(_ensure_managed_index, service, index_name)
+    return _schedule(index_name, "rebuild", service.rebuild_index, index_name)
+
+
+@router.delete(
+    "/vector-indexes/{index_name}",
+    response_model=VectorIndexTaskResponse,
+    status_code=202,
+)
+async def drop_vector_index(index_name: str):
+    service = VectorIndexService()
+    await asyncio.to_thread(_ensure_managed_index, service, index_name)
+    return _schedule(index_name, "drop", service.drop_index, index_name)
+
+
+@router.get("/vector-replica")
+async def get_vector_replica_status():
+    return vector_replica.status()
+
+
+@router.get("/keyword-index")
+async def get_keyword_index_status():
+    return keyword_index.status()
+
+
+@router.get("/qa-cache")
+async def get_qa_cache_status():
+    return semantic_qa_cache.status()
+
+
+@router.get("/retrieval-cache")
+async def get_retrieval_cache_status():
+    return retrieval_cache.status()
@@ -33,6 +33,10 @@ class DocumentDetailResponse(BaseModel):
     file_size: Optional[int] = None
     file_type: Optional[str] = None
     error_message: Optional[str] = None
+    chunk_count: int = 0
+    vector_count: int = 0
+    token_count: int = 0
+    last_indexed_at: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -137,6 +141,7 @@ async def get_document(
     if not document:
         raise HTTPException(status_code=404, detail="文档不存在")
 
+    stats = document.stats
     return DocumentDetailResponse(
         id=document.id,
         title=document.title,
@@ -146,6 +151,12 @@ async def get_document(
         file_size=document.file_size,
         file_type=document.file_type,
         error_message=document.error_message,
+        chunk_count=stats.chunk_count if stats else 0,
+        vector_count=stats.vector_count if stats else 0,
+        token_count=stats.token_count if stats else 0,
+        last_indexed_at=(
+            stats.last_indexed_at.isoformat() if stats and stats.last_indexed_at else None
+        ),
     )
 
 
@@ -2,8 +2,12 @@ from typing import List, Optional
 from fastapi import APIRouter, HTTPException, Depends, Query
 from pydantic import BaseModel
 import asyncio
+import time
 
+from src.config import settings
+from src.services.cache_service import SemanticQACache, semantic_qa_cache
 from src.services.llm_service import LLMService
+from src.services.retrieval_pipeline import PIPELINE_NAMES, RetrievalState, get_pipeline
 from src.services.retriever_service import RetrieverService
 from src.database import SyncSessionLocal
 
@@ -14,6 +18,13 @@ class QARequest(BaseModel):
     question: str
     document_ids: Optional[List[int]] = None
     top_k: int = 5
+    ef_search: Optional[int] = None
+    probes: Optional[int] = None
+    hybrid: bool = True
+    rerank: Optional[bool] = None
+    diversify: Optional[bool] = None
+    # 检索流水线名称，未指定时按 hybrid 选择 hybrid 或 vector
+    pipeline: Optional[str] = None
 
 
 class QASource(BaseModel):
@@ -24,6 +35,13 @@ class QASource(BaseModel):
     relevance_score: float
 
 
+class RetrievalTiming(BaseModel):
+    branch: str
+    elapsed_ms: float
+    status: str
+    results: int = 0
+
+
 class QAResponse(BaseModel):
     session_id: int
     question: str
@@ -32,6 +50,9 @@ class QAResponse(BaseModel):
     model_used: Optional[str] = None
     tokens_used: int = 0
     response_time_ms: int = 0
+    retrieval_timings: List[RetrievalTiming] = []
+    cached: bool = False
+    context_tokens: int = 0
 
 
 class QAHistoryResponse(BaseModel):
@@ -67,28 +88,72 @@ async def ask_question(
     if not request.question or not request.question.strip():
         raise HTTPException(status_code=400, detail="问题不能为空")
 
+    pipeline_name = request.pipeline or ("hybrid" if request.hybrid else "vector")
+    pipeline = get_pipeline(pipeline_name)
+    if pipeline is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"未知的检索流水线: {pipeline_name}，可选: {', '.join(PIPELINE_NAMES)}",
+        )
+
     context = ""
     sources = []
-    
+    timings = []
+
+    # 语义缓存：问题向量与已缓存问题足够相似时直接返回答案，不再检索和调用模型。
+    # 问题向量同时传给检索，避免重复编码
+    question_embedding = None
+    cache_scope = None
+    cache_epoch = None
+    if settings.qa_semantic_cache_enabled:
+        started = time.perf_counter()
+        question_embedding = await retriever_service.embedding_service.embed_single_text_async(
+            request.question
+        )
+        if question_embedding is not None:
+            cache_scope = SemanticQACache.scope_key(
+                pipeline_name,
+                request.document_ids,
+                request.top_k,
+                rerank=request.rerank,
+                diversify=request.diversify,
+                ef_search=request.ef_search,
+                probes=request.probes,
+            )
+            cached = await semantic_qa_cache.lookup(question_embedding, cache_scope)
+            elapsed = round((time.perf_counter() - started) * 1000, 2)
+            if cached:
+                return _cached_response(request, cached, llm_service, elapsed)
+            cache_epoch = await semantic_qa_cache.epoch()
+            timings.append(RetrievalTiming(branch="cache", elapsed_ms=elapsed, status="miss"))
+
+    context_tokens = 0
     try:
-        chunks = retriever_service.search(
-            query=request.question,
-            top_k=request.top_k,
-            document_ids=request.document_ids,
+        state = await pipeline.run(
+            retriever_service,
+            RetrievalState(
+                query=request.question,
+                top_k=request.top_k,
+                document_ids=request.document_ids,
+                ef_search=request.ef_search,
+                probes=request.probes,
+                rerank=request.rerank,
+                diversify=request.diversify,
+                query_embedding=question_embedding,
+            ),
         )
-        
-        if chunks:
-            context_parts = []
-            for chunk in chunks:
-                context_parts.append(chunk.get("content", ""))
+        timings += [RetrievalTiming(**vars(t)) for t in state.timings]
+        if state.context is not None:
+            context = state.context.text
+            context_tokens = state.context.token_count
+            for r in state.context.sources:
                 sources.append({
-                    "chunk_id": chunk.get("id", 0),
-                    "document_id": chunk.get("document_id", 0),
-                    "document_title": chunk.get("document_title"),
-                    "content": chunk.get("content", "")[:200] + "...",
-                    "relevance_score": chunk.get("similarity", 0.0),
+                    "chunk_id": r.chunk_id,
+                    "document_id": r.document_id,
+                    "document_title": r.document_title,
+                    "content": r.content[:200] + "...",
+                    "relevance_score": r.score,
                 })
-            context = "\n\n---\n\n".join(context_parts)
     except Exception as e:
         print(f"检索失败: {e}")
 
@@ -108,6 +173,18 @@ async def ask_question(
         response_time_ms=result.get("response_time_ms", 0),
     )
 
+    # 只缓存有来源的答案，便于按来源文档失效；"抱歉，" 开头的是模型调用失败时的兜底文案
+    if cache_scope and sources and not result["answer"].startswith("抱歉，"):
+        await semantic_qa_cache.store(
+            question=request.question,
+            embedding=question_embedding,
+            scope=cache_scope,
+            answer=result["answer"],
+            sources=sources,
+            model_used=result.get("model_used"),
+            epoch=cache_epoch,
+        )
+
     qa_sources = [
         QASource(
             chunk_id=s.get("chunk_id", 0),
@@ -127,6 +204,34 @@ async def ask_question(
         model_used=result.get("model_used"),
         tokens_used=result.get("tokens_used", 0),
         response_time_ms=result.get("response_time_ms", 0),
+        retrieval_timings=timings,
+        context_tokens=context_tokens,
+    )
+
+
+def _cached_response(
+    request: QARequest,
+    cached: dict,
+    llm_service: LLMService,
+    elapsed_ms: float,
+) -> QAResponse:
+    sources = cached.get("sources", [])
+    session = llm_service.save_qa_session(
+        question=request.question,
+        answer=cached["answer"],
+        sources=sources,
+        model_used=cached.get("model_used"),
+        response_time_ms=int(elapsed_ms),
+    )
+    return QAResponse(
+        session_id=session.id if session else 0,
+        question=request.question,
+        answer=cached["answer"],
+        sources=[QASource(**s) for s in sources],
+        model_used=cached.get("model_used"),
+        response_time_ms=int(elapsed_ms),
+        retrieval_timings=[RetrievalTiming(branch="cache", elapsed_ms=elapsed_ms, status="hit")],
+        cached=True,
     )
 
 
@@ -1,8 +1,22 @@
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from src.api.v1 import documents, qa, health, agent
+from src.api.v1 import documents, qa, health, agent, admin
 from src.config import settings
+from src.services.embedding_service import EmbeddingService
+from src.services.async_vector_store import VectorPool
+from src.services.vector_index_service import VectorIndexService
+from src.services.vector_replica import vector_replica
+from src.services.mmap_vector_store import get_mmap_vector_index
+from src.services.sharded_vector_store import get_shard_placement
+from src.services.keyword_index import keyword_index
+from src.services.cache_service import semantic_qa_cache
+from src.services.corpus_events import corpus_events
+from src.services.retrieval_cache import retrieval_cache
+from src.services.vector_store import create_vector_store
+from src.database import SyncSessionLocal
 
 app = FastAPI(
     title="EKP AI Service",
@@ -24,6 +38,7 @@ app.include_router(health.router, tags=["Health"])
 app.include_router(documents.router, prefix="/api/v1/documents", tags=["Documents"])
 app.include_router(qa.router, prefix="/api/v1/qa", tags=["Q&A"])
 app.include_router(agent.router, prefix="/api/v1", tags=["Agent"])
+app.include_router(admin.router, prefix="/api/v1/admin", tags=["Admin"])
 
 
 @app.on_event("startup")
@@ -31,12 +46,59 @@ async def startup_event():
     print("EKP AI Service 启动中...")
     print(f"本地 LLM URL: {settings.local_llm_url}")
     print(f"模型: {settings.llm_model}")
+    corpus_events.bind_loop(asyncio.get_running_loop())
+    if settings.vector_store_backend == "mmap":
+        index = await asyncio.to_thread(get_mmap_vector_index)
+        print(f"本地向量库已加载: {len(index)} 条向量")
+    # 本地 / 分片向量库不受主库外键级联删除影响，订阅删除事件自行清理
+    if settings.vector_store_backend in ("mmap", "sharded"):
+        corpus_events.subscribe(create_vector_store())
+    if settings.vector_store_backend == "sharded":
+        placement = await asyncio.to_thread(get_shard_placement)
+        asyncio.create_task(placement.watch())
+    try:
+        pool = await VectorPool.get_pool()
+        print("向量库连接池已就绪")
+        if settings.vector_replica_enabled:
+            asyncio.create_task(vector_replica.start(pool))
+    except Exception as e:
+        print(f"向量库连接池初始化失败，将在首次检索时重试: {e}")
+
+    if settings.keyword_index_enabled:
+        async def build_keyword_index():
+            db = SyncSessionLocal()
+            try:
+                await asyncio.to_thread(keyword_index.build, db)
+            except Exception as e:
+                print(f"关键词索引构建失败: {e}")
+            finally:
+                db.close()
+
+        asyncio.create_task(build_keyword_index())
+
+    if settings.retrieval_cache_enabled:
+        corpus_events.subscribe(retrieval_cache)
+
+    if settings.qa_semantic_cache_enabled:
+        asyncio.create_task(semantic_qa_cache.start())
+
+    if settings.vector_index_auto_create:
+        async def ensure_vector_index():
+            try:
+                await asyncio.to_thread(VectorIndexService().ensure_default_index)
+            except Exception as e:
+                print(f"向量索引自动创建失败: {e}")
+
+        asyncio.create_task(ensure_vector_index())
     print("EKP AI Service 启动完成！")
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     print("EKP AI Service 关闭中...")
+    await vector_replica.stop()
+    await EmbeddingService.close()
+    await VectorPool.close()
 
 
 if __name__ == "__main__":
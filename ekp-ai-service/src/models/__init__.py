@@ -1,3 +1,21 @@
-from src.models.document import User, Document, DocumentChunk, DocumentVector, QASession, QASource
+from src.models.document import (
+    User,
+    Document,
+    DocumentStats,
+    DocumentEmbedding,
+    DocumentChunk,
+    DocumentVector,
+    QASession,
+    QASource,
+)
 
-__all__ = ["User", "Document", "DocumentChunk", "DocumentVector", "QASession", "QASource"]
+__all__ = [
+    "User",
+    "Document",
+    "DocumentStats",
+    "DocumentEmbedding",
+    "DocumentChunk",
+    "DocumentVector",
+    "QASession",
+    "QASource",
+]
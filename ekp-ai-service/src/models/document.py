@@ -39,6 +39,39 @@ class Document(Base):
     chunks = relationship("DocumentChunk", back_populates="document", cascade="all, delete-orphan")
     vectors = relationship("DocumentVector", back_populates="document", cascade="all, delete-orphan")
     qa_sessions = relationship("QASession", back_populates="document")
+    stats = relationship(
+        "DocumentStats",
+        back_populates="document",
+        uselist=False,
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+
+
+class DocumentStats(Base):
+    __tablename__ = "document_stats"
+
+    document_id = Column(
+        BigInteger, ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True
+    )
+    vector_count = Column(Integer, nullable=False, default=0)
+    chunk_count = Column(Integer, nullable=False, default=0)
+    token_count = Column(BigInteger, nullable=False, default=0)
+    last_indexed_at = Column(DateTime)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+    document = relationship("Document", back_populates="stats")
+
+
+class DocumentEmbedding(Base):
+    __tablename__ = "document_embeddings"
+
+    document_id = Column(
+        BigInteger, ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True
+    )
+    embedding = Column(Vector(1024), nullable=False)
+    chunk_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
 
 class DocumentChunk(Base):
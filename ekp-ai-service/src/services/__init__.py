@@ -3,6 +3,7 @@ from src.services.chunker_service import ChunkerService
 from src.services.document_processor import DocumentProcessor
 from src.services.embedding_service import EmbeddingService
 from src.services.vector_store import VectorStore
+from src.services.async_vector_store import AsyncVectorStore
 from src.services.retriever_service import RetrieverService
 from src.services.llm_service import LLMService
 
@@ -12,6 +13,7 @@ __all__ = [
     "DocumentProcessor",
     "EmbeddingService",
     "VectorStore",
+    "AsyncVectorStore",
     "RetrieverService",
     "LLMService",
 ]
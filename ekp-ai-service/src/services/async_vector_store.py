@@ -0,0 +1,340 @@
+import asyncio
+from typing import Dict, List, Optional, Sequence
+
+import asyncpg
+import numpy as np
+
+from src.config import settings
+from src.services.vector_codec import (
+    VectorLike,
+    as_matrix,
+    as_vector,
+    from_halfvec_binary,
+    from_pgvector_binary,
+    to_halfvec_binary,
+    to_pgvector_binary,
+)
+from src.services.vector_store import SearchResult
+from src.services.vector_index_service import search_settings_sql
+from src.services.vector_schema import (
+    VectorSchema,
+    build_batch_search_sql,
+    build_search_sql,
+    get_vector_schema,
+)
+from src.services.search_planner import (
+    max_distance_for,
+    needs_widening,
+    plan_search,
+    scope_stats_sql,
+    widen_plan,
+)
+
+
+async def init_vector_connection(conn: asyncpg.Connection) -> None:
+    await conn.set_type_codec(
+        "vector",
+        encoder=to_pgvector_binary,
+        decoder=from_pgvector_binary,
+        format="binary",
+    )
+    # halfvec 需要 pgvector 0.7+，旧版本扩展中不存在该类型
+    try:
+        await conn.set_type_codec(
+            "halfvec",
+            encoder=to_halfvec_binary,
+            decoder=from_halfvec_binary,
+            format="binary",
+        )
+    except ValueError:
+        pass
+
+
+async def create_vector_pool(
+    dsn: str,
+    min_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+) -> asyncpg.Pool:
+    return await asyncpg.create_pool(
+        dsn,
+        min_size=min_size or settings.vector_pool_min_size,
+        max_size=max_size or settings.vector_pool_max_size,
+        init=init_vector_connection,
+    )
+
+
+class VectorPool:
+    _pool: Optional[asyncpg.Pool] = None
+    _lock = asyncio.Lock()
+
+    @classmethod
+    async def get_pool(cls) -> asyncpg.Pool:
+        if cls._pool is None:
+            async with cls._lock:
+                if cls._pool is None:
+                    cls._pool = await create_vector_pool(settings.database_url)
+        return cls._pool
+
+    @classmethod
+    async def close(cls):
+        if cls._pool is not None:
+            await cls._pool.close()
+            cls._pool = None
+
+
+# asyncpg 按连接缓存预编译语句，同一条 SQL 在每个连接上只解析/规划一次；
+# 带阈值时距离上界是最后一个参数
+def search_sql(schema: VectorSchema, strategy: Optional[str] = None, bounded: bool = False) -> str:
+    if strategy is None:
+        return build_search_sql(schema, "$1", "$2", max_distance="$3::float8" if bounded else None)
+    if strategy == "exact":
+        return build_search_sql(
+            schema, "$1", "$2", "$3::bigint[]", strategy,
+            max_distance="$4::float8" if bounded else None,
+        )
+    return build_search_sql(
+        schema, "$1", "$2", "$3::bigint[]", strategy, "$4::int",
+        max_distance="$5::float8" if bounded else None,
+    )
+
+
+def batch_search_sql(schema: VectorSchema, strategy: Optional[str] = None) -> str:
+    if strategy is None:
+        return build_batch_search_sql(schema, "$1", "$2")
+    return build_batch_search_sql(schema, "$1", "$2", "$3::bigint[]", strategy, "$4::int")
+
+
+class AsyncVectorStore:
+    def __init__(self, pool: Optional[asyncpg.Pool] = None, schema: Optional[VectorSchema] = None):
+        self._pool = pool
+        self.schema = schema or get_vector_schema()
+
+    async def _get_pool(self) -> asyncpg.Pool:
+        if self._pool is not None:
+            return self._pool
+        return await VectorPool.get_pool()
+
+    async def search(
+        self,
+        query_embedding: VectorLike,
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        min_score: float = 0.0,
+    ) -> List[SearchResult]:
+        vector = as_vector(query_embedding)
+        max_distance = max_distance_for(min_score)
+        try:
+            pool = await self._get_pool()
+            async with pool.acquire() as conn:
+                if document_ids or search_settings_sql(ef_search, probes):
+                    async with conn.transaction():
+                        rows = await self._search_planned(
+                            conn, vector, top_k, document_ids, ef_search, probes, max_distance
+                        )
+                elif max_distance is not None:
+                    rows = await conn.fetch(
+                        search_sql(self.schema, bounded=True), vector, top_k, max_distance
+                    )
+                else:
+                    rows = await conn.fetch(search_sql(self.schema), vector, top_k)
+        except Exception as e:
+            print(f"向量搜索失败: {e}")
+            return []
+
+        return [
+            SearchResult(
+                chunk_id=row["chunk_id"],
+                document_id=row["document_id"],
+                content=row["content"],
+                score=float(row["score"]) if row["score"] else 0.0,
+                document_title=row["document_title"],
+            )
+            for row in rows
+        ]
+
+    async def _search_planned(
+        self,
+        conn: asyncpg.Connection,
+        vector: np.ndarray,
+        top_k: int,
+        document_ids: Optional[List[int]],
+        ef_search: Optional[int],
+        probes: Optional[int],
+        max_distance: Optional[float] = None,
+    ) -> List:
+        plan = None
+        if document_ids:
+            total_rows, scoped_rows = await conn.fetchrow(
+                scope_stats_sql(self.schema, "$1::bigint[]"), document_ids
+            )
+            plan = plan_search(top_k, scoped_rows, total_rows, ef_search)
+
+        bounded = max_distance is not None
+        bound = (max_distance,) if bounded else ()
+        while True:
+            index_settings = search_settings_sql(plan.ef_search if plan else ef_search, probes)
+            if index_settings:
+                await conn.execute(index_settings)
+
+            if plan is None:
+                return await conn.fetch(
+                    search_sql(self.schema, bounded=bounded), vector, top_k, *bound
+                )
+            if plan.strategy == "exact":
+                return await conn.fetch(
+                    search_sql(self.schema, "exact", bounded), vector, top_k, document_ids, *bound
+                )
+
+            rows = await conn.fetch(
+                search_sql(self.schema, "ann", bounded),
+                vector, top_k, document_ids, plan.fetch_k, *bound,
+            )
+            # 带阈值时总会有一行携带 horizon，阈值裁掉全部候选时该行 chunk_id 为 NULL
+            horizon = None
+            if bounded:
+                horizon = rows[0]["horizon"] if rows else None
+                rows = [row for row in rows if row["chunk_id"] is not None]
+            if not needs_widening(plan, len(rows), top_k, horizon, max_distance):
+                return rows
+            plan = widen_plan(plan, top_k)
+
+    async def search_many(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+    ) -> List[List[SearchResult]]:
+        vectors = list(as_matrix(query_embeddings))
+        grouped: List[List[SearchResult]] = [[] for _ in vectors]
+        if not vectors:
+            return grouped
+
+        try:
+            pool = await self._get_pool()
+            async with pool.acquire() as conn:
+                async with conn.transaction():
+                    plan = None
+                    if document_ids:
+                        total_rows, scoped_rows = await conn.fetchrow(
+                            scope_stats_sql(self.schema, "$1::bigint[]"), document_ids
+                        )
+                        plan = plan_search(top_k, scoped_rows, total_rows, ef_search)
+
+                    while True:
+                        index_settings = search_settings_sql(
+                            plan.ef_search if plan else ef_search, probes
+                        )
+                        if index_settings:
+                            await conn.execute(index_settings)
+
+                        if plan is None:
+                            args = (batch_search_sql(self.schema), vectors, top_k)
+                        elif plan.strategy == "exact":
+                            args = (batch_search_sql(self.schema, "exact"), vectors, top_k,
+                                    document_ids)
+                        else:
+                            args = (batch_search_sql(self.schema, "ann"), vectors, top_k,
+                                    document_ids, plan.fetch_k)
+                        rows = await conn.fetch(*args)
+
+                        grouped = [[] for _ in vectors]
+                        for row in rows:
+                            grouped[row["query_index"]].append(
+                                SearchResult(
+                                    chunk_id=row["chunk_id"],
+                                    document_id=row["document_id"],
+                                    content=row["content"],
+                                    score=float(row["score"]) if row["score"] else 0.0,
+                                    document_title=row["document_title"],
+                                )
+                            )
+
+                        if plan is None or plan.strategy == "exact":
+                            break
+                        if all(len(results) >= top_k for results in grouped):
+                            break
+                        plan = widen_plan(plan, top_k)
+        except Exception as e:
+            print(f"批量向量搜索失败: {e}")
+            return [[] for _ in vectors]
+
+        return grouped
+
+    async def add_vectors(
+        self,
+        document_id: int,
+        chunk_ids: Sequence[int],
+        contents: Sequence[str],
+        embeddings: np.ndarray,
+    ) -> int:
+        if not (len(chunk_ids) == len(contents) == len(embeddings)):
+            raise ValueError("chunks和embeddings数量不匹配")
+        if not chunk_ids:
+            return 0
+
+        embeddings = as_matrix(embeddings)
+        if self.schema.has_content:
+            columns = ["document_id", "chunk_id", "content", "embedding"]
+            records = [
+                (document_id, chunk_id, content, embedding)
+                for chunk_id, content, embedding in zip(chunk_ids, contents, embeddings)
+            ]
+        else:
+            columns = ["document_id", "chunk_id", "embedding"]
+            records = [
+                (document_id, chunk_id, embedding)
+                for chunk_id, embedding in zip(chunk_ids, embeddings)
+            ]
+
+        try:
+            pool = await self._get_pool()
+            async with pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.copy_records_to_table(
+                        self.schema.table,
+                        records=records,
+                        columns=columns,
+                    )
+            return len(records)
+        except Exception as e:
+            print(f"批量写入向量失败: {e}")
+            return 0
+
+    async def get_embeddings(self, chunk_ids: List[int]) -> Dict[int, np.ndarray]:
+        if not chunk_ids:
+            return {}
+        try:
+            pool = await self._get_pool()
+            async with pool.acquire() as conn:
+                rows = await conn.fetch(
+                    f"SELECT chunk_id, embedding FROM {self.schema.table} "
+                    "WHERE chunk_id = ANY($1::bigint[])",
+                    list(chunk_ids),
+                )
+        except Exception as e:
+            print(f"读取分块向量失败: {e}")
+            return {}
+        return {row["chunk_id"]: row["embedding"] for row in rows}
+
+    async def delete_document_vectors(self, document_id: int) -> int:
+        try:
+            pool = await self._get_pool()
+            async with pool.acquire() as conn:
+                status = await conn.execute(
+                    f"DELETE FROM {self.schema.table} WHERE document_id = $1", document_id
+                )
+            return int(status.split()[-1])
+        except Exception as e:
+            print(f"删除向量失败: {e}")
+            return 0
+
+    async def get_document_vector_count(self, document_id: int) -> int:
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            return await conn.fetchval(
+                f"SELECT COUNT(*) FROM {self.schema.table} WHERE document_id = $1", document_id
+            )
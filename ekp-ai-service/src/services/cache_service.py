@@ -1,9 +1,17 @@
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterable
+import base64
 import json
 import hashlib
+import threading
+import time
 
+import numpy as np
 import redis.asyncio as redis
 
+from src.config import settings
+from src.services.corpus_events import DocumentIndexedEvent, corpus_events
+from src.services.vector_codec import VectorLike, as_vector
+
 
 class QACacheService:
     def __init__(self, redis: redis.Redis):
@@ -127,6 +135,285 @@ class QACacheService:
         return True
 
 
+# 语义问答缓存：按问题向量的余弦相似度命中，措辞或标点不同的同一问题也能复用答案。
+# 答案、来源和问题向量存在 Redis（多实例共享），每个实例在内存里维护问题向量矩阵，一次矩阵向量乘法完成检索；
+# 其它实例新写入的条目按自增 id 水位增量拉取。来源文档重新处理或删除时按文档反查并删除相关条目，
+# 命中时再回 Redis 读取条目，已被其它实例失效的条目自然落空
+class SemanticQACache:
+    def __init__(
+        self,
+        redis_client: Optional[redis.Redis] = None,
+        dimension: Optional[int] = None,
+        threshold: Optional[float] = None,
+        ttl: Optional[int] = None,
+        max_entries: Optional[int] = None,
+    ):
+        self._redis = redis_client
+        self.dimension = dimension or settings.embedding_dimension
+        if threshold is None:
+            threshold = settings.qa_semantic_cache_threshold
+        self.threshold = threshold
+        self.ttl = ttl or settings.qa_semantic_cache_ttl
+        self.max_entries = max_entries or settings.qa_semantic_cache_max_entries
+        self.prefix = "ekp:qa_cache:semantic"
+
+        self._lock = threading.Lock()
+        self._watermark = 0
+        self._count = 0
+        self._vectors = np.zeros((0, self.dimension), dtype=np.float32)
+        self._entry_ids = np.zeros(0, dtype=np.int64)
+        self._scope_ids = np.zeros(0, dtype=np.int32)
+        self._scopes: Dict[str, int] = {}
+        self._document_entries: Dict[int, set] = {}
+        self._rows_by_entry: Dict[int, int] = {}
+
+    def _key(self, *parts) -> str:
+        return ":".join([self.prefix, *map(str, parts)])
+
+    async def _get_redis(self) -> redis.Redis:
+        if self._redis is None:
+            from src.redis_client import get_redis
+
+            self._redis = await get_redis()
+        return self._redis
+
+    # 同一问题在不同检索范围、模式和检索选项下的答案不同，只在相同范围内互相命中；
+    # rerank / diversify 未指定时按当前配置的默认值计入
+    @staticmethod
+    def scope_key(
+        mode: str,
+        document_ids: Optional[List[int]] = None,
+        top_k: int = 5,
+        rerank: Optional[bool] = None,
+        diversify: Optional[bool] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+    ) -> str:
+        documents = ",".join(str(d) for d in sorted(set(document_ids))) if document_ids else "all"
+        rerank = settings.reranker_enabled if rerank is None else rerank
+        diversify = settings.mmr_enabled if diversify is None else diversify
+        options = f"rerank={int(rerank)},mmr={int(diversify)},ef={ef_search},probes={probes}"
+        return f"{mode}:{top_k}:{documents}:{options}"
+
+    async def start(self) -> None:
+        corpus_events.subscribe(self)
+        try:
+            await self._sync()
+        except Exception as e:
+            print(f"语义问答缓存加载失败: {e}")
+
+    def __len__(self) -> int:
+        return len(self._rows_by_entry)
+
+    @staticmethod
+    def _encode_vector(vector: np.ndarray) -> str:
+        return base64.b64encode(vector.astype(np.float32).tobytes()).decode("ascii")
+
+    @staticmethod
+    def _decode_vector(value: str) -> np.ndarray:
+        return np.frombuffer(base64.b64decode(value), dtype=np.float32)
+
+    def _add_row(
+        self, entry_id: int, scope: str, vector: np.ndarray, document_ids: Iterable[int]
+    ) -> None:
+        norm = np.linalg.norm(vector)
+        if norm == 0 or entry_id in self._rows_by_entry:
+            return
+        if self._count == len(self._vectors):
+            live = len(self._rows_by_entry)
+            if live < self._count or live >= self.max_entries:
+                self._compact(keep=min(live, self.max_entries - 1))
+            if self._count == len(self._vectors):
+                self._grow(max(64, 2 * len(self._vectors)))
+
+        row = self._count
+        self._vectors[row] = vector / norm
+        self._entry_ids[row] = entry_id
+        self._scope_ids[row] = self._scopes.setdefault(scope, len(self._scopes))
+        self._rows_by_entry[entry_id] = row
+        for document_id in document_ids:
+            self._document_entries.setdefault(document_id, set()).add(entry_id)
+        self._count += 1
+
+    def _grow(self, capacity: int) -> None:
+        vectors = np.zeros((capacity, self.dimension), dtype=np.float32)
+        entry_ids = np.full(capacity, -1, dtype=np.int64)
+        scope_ids = np.zeros(capacity, dtype=np.int32)
+        vectors[:self._count] = self._vectors[:self._count]
+        entry_ids[:self._count] = self._entry_ids[:self._count]
+        scope_ids[:self._count] = self._scope_ids[:self._count]
+        self._vectors, self._entry_ids, self._scope_ids = vectors, entry_ids, scope_ids
+
+    def _drop_entry(self, entry_id: int) -> None:
+        row = self._rows_by_entry.pop(entry_id, None)
+        if row is not None:
+            self._entry_ids[row] = -1
+
+    # 去掉已删除的行；keep 给定时只保留最新的 keep 条
+    def _compact(self, keep: Optional[int] = None) -> None:
+        live = np.flatnonzero(self._entry_ids[:self._count] >= 0)
+        if keep is not None:
+            live = live[len(live) - keep:]
+        self._vectors[:len(live)] = self._vectors[live]
+        self._entry_ids[:len(live)] = self._entry_ids[live]
+        self._scope_ids[:len(live)] = self._scope_ids[live]
+        self._count = len(live)
+        self._rows_by_entry = {
+            int(entry_id): row for row, entry_id in enumerate(self._entry_ids[:self._count])
+        }
+        for entry_ids in self._document_entries.values():
+            entry_ids.intersection_update(self._rows_by_entry)
+
+    # 按自增 id 水位拉取其它实例新写入的条目
+    async def _sync(self) -> None:
+        client = await self._get_redis()
+        new_ids = await client.zrangebyscore(self._key("index"), f"({self._watermark}", "+inf")
+        if not new_ids:
+            return
+        new_ids = [int(entry_id) for entry_id in new_ids]
+        values = await client.mget([self._key("entry", entry_id) for entry_id in new_ids])
+        with self._lock:
+            for entry_id, value in zip(new_ids, values):
+                if value:
+                    entry = json.loads(value)
+                    self._add_row(
+                        entry_id,
+                        entry["scope"],
+                        self._decode_vector(entry["embedding"]),
+                        entry["document_ids"],
+                    )
+            self._watermark = max(self._watermark, max(new_ids))
+
+    async def lookup(self, embedding: VectorLike, scope: str) -> Optional[Dict[str, Any]]:
+        query = as_vector(embedding)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return None
+        try:
+            await self._sync()
+            with self._lock:
+                scope_id = self._scopes.get(scope)
+                if scope_id is None or self._count == 0:
+                    return None
+                scores = self._vectors[:self._count] @ (query / norm)
+                matched = (scores >= self.threshold) & (self._scope_ids[:self._count] == scope_id)
+                matched &= self._entry_ids[:self._count] >= 0
+                rows = np.flatnonzero(matched)
+                rows = rows[np.argsort(-scores[rows])][:settings.qa_semantic_cache_probe]
+                candidates = [(int(self._entry_ids[row]), float(scores[row])) for row in rows]
+            if not candidates:
+                return None
+
+            client = await self._get_redis()
+            values = await client.mget([self._key("entry", entry_id) for entry_id, _ in candidates])
+            for (entry_id, similarity), value in zip(candidates, values):
+                if value is None:
+                    with self._lock:
+                        self._drop_entry(entry_id)
+                    continue
+                entry = json.loads(value)
+                entry.pop("embedding", None)
+                entry["similarity"] = similarity
+                return entry
+        except Exception as e:
+            print(f"语义问答缓存查询失败: {e}")
+        return None
+
+    # 失效计数：检索前读取，写入时若期间有文档被失效则放弃写入，避免用旧内容生成的答案覆盖失效结果
+    async def epoch(self) -> int:
+        try:
+            client = await self._get_redis()
+            return int(await client.get(self._key("epoch")) or 0)
+        except Exception as e:
+            print(f"语义问答缓存读取失败: {e}")
+            return -1
+
+    async def store(
+        self,
+        question: str,
+        embedding: VectorLike,
+        scope: str,
+        answer: str,
+        sources: List[Dict],
+        model_used: Optional[str] = None,
+        epoch: Optional[int] = None,
+    ) -> Optional[int]:
+        vector = as_vector(embedding)
+        document_ids = sorted({s["document_id"] for s in sources if s.get("document_id")})
+        if not document_ids:
+            return None
+        try:
+            client = await self._get_redis()
+            if epoch is not None and (epoch < 0 or epoch != await self.epoch()):
+                return None
+
+            entry_id = await client.incr(self._key("seq"))
+            entry = {
+                "question": question,
+                "answer": answer,
+                "sources": sources,
+                "model_used": model_used,
+                "scope": scope,
+                "document_ids": document_ids,
+                "embedding": self._encode_vector(vector),
+                "cached_at": time.time(),
+            }
+            await client.setex(
+                self._key("entry", entry_id), self.ttl, json.dumps(entry, ensure_ascii=False)
+            )
+            for document_id in document_ids:
+                await client.sadd(self._key("document", document_id), entry_id)
+                await client.expire(self._key("document", document_id), self.ttl)
+            await client.zadd(self._key("index"), {str(entry_id): entry_id})
+            await client.zremrangebyrank(self._key("index"), 0, -self.max_entries - 1)
+
+            with self._lock:
+                self._add_row(entry_id, scope, vector, document_ids)
+            return entry_id
+        except Exception as e:
+            print(f"语义问答缓存写入失败: {e}")
+            return None
+
+    async def invalidate_documents(self, document_ids: Iterable[int]) -> int:
+        document_ids = list(document_ids)
+        with self._lock:
+            for document_id in document_ids:
+                for entry_id in self._document_entries.pop(document_id, ()):
+                    self._drop_entry(entry_id)
+        try:
+            client = await self._get_redis()
+            await client.incr(self._key("epoch"))
+            removed = set()
+            for document_id in document_ids:
+                document_key = self._key("document", document_id)
+                removed.update(int(entry_id) for entry_id in await client.smembers(document_key))
+                await client.delete(document_key)
+            if removed:
+                await client.delete(*[self._key("entry", entry_id) for entry_id in removed])
+                await client.zrem(self._key("index"), *[str(entry_id) for entry_id in removed])
+            return len(removed)
+        except Exception as e:
+            print(f"语义问答缓存失效失败: {e}")
+            return 0
+
+    async def on_document_indexed(self, event: DocumentIndexedEvent) -> None:
+        await self.invalidate_documents([event.document_id])
+
+    async def on_document_removed(self, document_id: int) -> None:
+        await self.invalidate_documents([document_id])
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._rows_by_entry),
+                "scopes": len(self._scopes),
+                "threshold": self.threshold,
+            }
+
+
+semantic_qa_cache = SemanticQACache()
+
+
 class DocumentCacheService:
     def __init__(self, redis: redis.Redis):
         self.redis = redis
@@ -5,6 +5,12 @@ import re
 from src.config import settings
 
 
+def estimate_token_count(text: str) -> int:
+    chinese_chars = sum(1 for c in text if "\u4e00" <= c <= "\u9fff")
+    other_chars = len(text) - chinese_chars
+    return chinese_chars + other_chars // 4
+
+
 @dataclass
 class TextChunk:
     content: str
@@ -125,9 +131,7 @@ class ChunkerService:
         return chunks
 
     def _estimate_token_count(self, text: str) -> int:
-        chinese_chars = sum(1 for c in text if "\u4e00" <= c <= "\u9fff")
-        other_chars = len(text) - chinese_chars
-        return chinese_chars + other_chars // 4
+        return estimate_token_count(text)
 
     def get_chunk_stats(self, chunks: List[TextChunk]) -> dict:
         if not chunks:
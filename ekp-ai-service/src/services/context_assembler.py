@@ -0,0 +1,224 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from src.config import settings
+from src.services.chunker_service import estimate_token_count
+from src.services.text_search import AsyncTextSearch
+from src.services.vector_store import SearchResult
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+# 重叠少于这么多字符时视为巧合，不去重
+MIN_OVERLAP = 16
+
+
+@dataclass
+class ChunkPosition:
+    chunk_id: int
+    document_id: int
+    chunk_index: int
+    content: str
+    token_count: int
+
+
+@dataclass
+class ContextBlock:
+    document_id: int
+    document_title: Optional[str]
+    chunk_ids: List[int]
+    content: str
+    score: float
+    token_count: int
+
+
+@dataclass
+class AssembledContext:
+    blocks: List[ContextBlock] = field(default_factory=list)
+    sources: List[SearchResult] = field(default_factory=list)
+    token_count: int = 0
+
+    @property
+    def text(self) -> str:
+        return CONTEXT_SEPARATOR.join(block.content for block in self.blocks)
+
+
+# 相邻分块拼接时去掉重叠部分：前一块的结尾与后一块的开头相同（分块重叠）时只保留一份
+def merge_adjacent(previous: str, following: str, max_overlap: Optional[int] = None) -> str:
+    max_overlap = min(max_overlap or settings.chunk_overlap, len(previous), len(following))
+    for size in range(max_overlap, MIN_OVERLAP - 1, -1):
+        if previous.endswith(following[:size]):
+            return previous + following[size:]
+    return previous + "\n\n" + following
+
+
+def _truncate(text: str, tokens: int, budget: int) -> str:
+    return text[:max(1, len(text) * budget // max(tokens, 1))]
+
+
+# 把检索结果装进固定的 token 预算：
+# 1. 原始余弦分数时去掉低于最高分 min_score_ratio 倍的尾部结果；RRF 融合分数或重排分数只反映名次
+#    （只被一路召回的结果最多约为两路都召回时的一半），不按比例裁剪，只由 token 预算截断；
+# 2. 按排名依次放入命中分块，放不下的跳过（后面更短的可能放得下）；
+# 3. 剩余预算按距离由近到远补充命中分块的相邻分块（chunk_index ± window，一次查询取回）；
+# 4. 同一文档中连续的分块合并成一段，段落按其中最高的命中分数排序
+class ContextAssembler:
+    def __init__(
+        self,
+        text_search: Optional[AsyncTextSearch] = None,
+        token_budget: Optional[int] = None,
+        neighbor_window: Optional[int] = None,
+        min_score_ratio: Optional[float] = None,
+    ):
+        self.text_search = text_search or AsyncTextSearch()
+        self.token_budget = token_budget or settings.context_token_budget
+        if neighbor_window is None:
+            neighbor_window = settings.context_neighbor_window
+        if min_score_ratio is None:
+            min_score_ratio = settings.context_min_score_ratio
+        self.neighbor_window = neighbor_window
+        self.min_score_ratio = min_score_ratio
+
+    def trim(self, results: List[SearchResult], cosine_scores: bool = True) -> List[SearchResult]:
+        if not results:
+            return []
+        best = max(r.score for r in results)
+        if not cosine_scores or best <= 0 or self.min_score_ratio <= 0:
+            return list(results)
+        return [r for r in results if r.score >= best * self.min_score_ratio]
+
+    async def _load_positions(self, hits: List[SearchResult]) -> Dict[int, ChunkPosition]:
+        try:
+            rows = await self.text_search.load_neighbors(
+                [r.chunk_id for r in hits], self.neighbor_window
+            )
+        except Exception as e:
+            print(f"读取相邻分块失败，只使用命中分块: {e}")
+            return {}
+        return {
+            row["id"]: ChunkPosition(
+                row["id"],
+                row["document_id"],
+                row["chunk_index"],
+                row["content"],
+                row["token_count"] or estimate_token_count(row["content"]),
+            )
+            for row in rows
+        }
+
+    # 关闭组装时保持原样：每个检索结果一段，不做裁剪和预算
+    @staticmethod
+    def passthrough(results: List[SearchResult]) -> AssembledContext:
+        blocks = [
+            ContextBlock(r.document_id, r.document_title, [r.chunk_id], r.content, r.score,
+                         estimate_token_count(r.content))
+            for r in results
+        ]
+        return AssembledContext(blocks, list(results), sum(block.token_count for block in blocks))
+
+    async def assemble(
+        self, results: List[SearchResult], cosine_scores: bool = True
+    ) -> AssembledContext:
+        if not settings.context_assembly_enabled:
+            return self.passthrough(results)
+        hits = self.trim(results, cosine_scores)
+        if not hits:
+            return AssembledContext()
+        positions = await self._load_positions(hits) if self.neighbor_window > 0 else {}
+        return self.pack(hits, positions)
+
+    def pack(
+        self, hits: List[SearchResult], positions: Dict[int, ChunkPosition]
+    ) -> AssembledContext:
+        by_location: Dict[Tuple[int, int], ChunkPosition] = {
+            (p.document_id, p.chunk_index): p for p in positions.values()
+        }
+        selected: Dict[int, str] = {}
+        used = 0
+        sources = []
+
+        for hit in hits:
+            if hit.chunk_id in selected:
+                continue
+            content = hit.content
+            tokens = positions[hit.chunk_id].token_count if hit.chunk_id in positions else (
+                estimate_token_count(content)
+            )
+            if used + tokens > self.token_budget:
+                if selected:
+                    continue
+                # 第一个命中分块就超出预算时截断它，保证上下文不为空
+                content = _truncate(content, tokens, self.token_budget)
+                tokens = self.token_budget
+            selected[hit.chunk_id] = content
+            used += tokens
+            sources.append(hit)
+
+        for distance in range(1, self.neighbor_window + 1):
+            for hit in sources:
+                position = positions.get(hit.chunk_id)
+                if position is None:
+                    continue
+                for index in (position.chunk_index - distance, position.chunk_index + distance):
+                    neighbor = by_location.get((position.document_id, index))
+                    if neighbor is None or neighbor.chunk_id in selected:
+                        continue
+                    if used + neighbor.token_count > self.token_budget:
+                        continue
+                    selected[neighbor.chunk_id] = neighbor.content
+                    used += neighbor.token_count
+
+        blocks = self._blocks(sources, positions, selected)
+        return AssembledContext(blocks, sources, sum(block.token_count for block in blocks))
+
+    @staticmethod
+    def _blocks(
+        sources: List[SearchResult],
+        positions: Dict[int, ChunkPosition],
+        selected: Dict[int, str],
+    ) -> List[ContextBlock]:
+        scores = {hit.chunk_id: hit.score for hit in sources}
+        titles = {}
+        for hit in sources:
+            if hit.document_title:
+                titles.setdefault(hit.document_id, hit.document_title)
+        hit_documents = {hit.chunk_id: hit.document_id for hit in sources}
+
+        # 有位置信息的分块按 (文档, chunk_index) 排序后切成连续段；没有位置信息的命中分块各自成段
+        located = sorted(
+            (positions[chunk_id] for chunk_id in selected if chunk_id in positions),
+            key=lambda p: (p.document_id, p.chunk_index),
+        )
+        runs: List[List[int]] = []
+        previous = None
+        for position in located:
+            if (
+                previous is None
+                or position.document_id != previous.document_id
+                or position.chunk_index != previous.chunk_index + 1
+            ):
+                runs.append([])
+            runs[-1].append(position.chunk_id)
+            previous = position
+        runs.extend([chunk_id] for chunk_id in selected if chunk_id not in positions)
+
+        blocks = []
+        for run in runs:
+            content = selected[run[0]]
+            for chunk_id in run[1:]:
+                content = merge_adjacent(content, selected[chunk_id])
+            first = run[0]
+            if first in positions:
+                document_id = positions[first].document_id
+            else:
+                document_id = hit_documents[first]
+            blocks.append(
+                ContextBlock(
+                    document_id=document_id,
+                    document_title=titles.get(document_id),
+                    chunk_ids=run,
+                    content=content,
+                    score=max(scores.get(chunk_id, float("-inf")) for chunk_id in run),
+                    token_count=estimate_token_count(content),
+                )
+            )
+        blocks.sort(key=lambda block: block.score, reverse=True)
+        return blocks
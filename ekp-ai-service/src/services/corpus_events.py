@@ -0,0 +1,76 @@
+import asyncio
+import inspect
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+
+@dataclass
+class DocumentIndexedEvent:
+    document_id: int
+    document_title: Optional[str]
+    chunk_ids: List[int]
+    contents: List[str]
+    embeddings: np.ndarray
+
+
+# 文档入库 / 删除事件：进程内的副本、索引与缓存订阅它来做增量同步和失效。
+# 订阅者实现 on_document_indexed(event) / on_document_removed(document_id)，可以是同步或异步方法；
+# 异步方法在绑定的应用事件循环上执行（Redis 等异步客户端绑定在该循环上），事件可以从工作线程发布
+class CorpusEvents:
+    def __init__(self):
+        self._listeners = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def bind_loop(self, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        self._loop = loop
+
+    def subscribe(self, listener) -> None:
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def document_indexed(self, event: DocumentIndexedEvent) -> None:
+        self._publish("on_document_indexed", event)
+
+    def document_removed(self, document_id: int) -> None:
+        self._publish("on_document_removed", document_id)
+
+    def _publish(self, method: str, payload) -> None:
+        for listener in list(self._listeners):
+            handler = getattr(listener, method, None)
+            if handler is None:
+                continue
+            label = f"{type(listener).__name__}.{method}"
+            try:
+                result = handler(payload)
+                if inspect.isawaitable(result):
+                    self._run_async(self._guard(result, label))
+            except Exception as e:
+                print(f"语料事件处理失败 ({label}): {e}")
+
+    @staticmethod
+    async def _guard(awaitable, label: str) -> None:
+        try:
+            await awaitable
+        except Exception as e:
+            print(f"语料事件处理失败 ({label}): {e}")
+
+    def _run_async(self, coroutine) -> None:
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not None:
+            running.create_task(coroutine)
+        elif self._loop is not None and self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+        else:
+            asyncio.run(coroutine)
+
+
+corpus_events = CorpusEvents()
@@ -0,0 +1,222 @@
+import argparse
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import psycopg2
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.models.document import DocumentEmbedding
+from src.services.similarity import normalize_rows
+from src.services.vector_codec import VectorLike, as_matrix, as_vector
+from src.services.vector_schema import get_vector_schema
+
+DOCUMENT_SEARCH_SQL = """
+    SELECT document_id
+    FROM document_embeddings
+    ORDER BY embedding <=> $1::vector
+    LIMIT $2
+"""
+
+# 给定范围时直接在范围内精确排序，范围内的文档数远小于文档向量表
+DOCUMENT_SEARCH_SCOPED_SQL = """
+    SELECT document_id
+    FROM document_embeddings
+    WHERE document_id = ANY($3::bigint[])
+    ORDER BY embedding <=> $1::vector
+    LIMIT $2
+"""
+
+# 文档数取表的 reltuples 估计值，表从未 ANALYZE（reltuples = -1）时才精确计数
+DOCUMENT_COUNT_SQL = """
+    SELECT CASE WHEN reltuples >= 0 THEN reltuples::bigint
+                ELSE (SELECT COUNT(*) FROM document_embeddings) END
+    FROM pg_class
+    WHERE oid = 'document_embeddings'::regclass
+"""
+
+# pgvector 的 hnsw.ef_search 上限
+MAX_EF_SEARCH = 1000
+
+
+# 文档向量：分块向量归一化后的质心，有标题向量时按 title_weight 加权混合，再整体归一化
+def document_embedding(
+    chunk_embeddings: np.ndarray,
+    title_embedding: Optional[VectorLike] = None,
+    title_weight: Optional[float] = None,
+) -> np.ndarray:
+    centroid = normalize_rows(as_matrix(chunk_embeddings)).mean(axis=0)
+    if title_embedding is not None:
+        weight = settings.document_embedding_title_weight if title_weight is None else title_weight
+        title = normalize_rows(as_vector(title_embedding)[None, :])[0]
+        centroid = (1 - weight) * normalize_rows(centroid[None, :])[0] + weight * title
+    return normalize_rows(centroid[None, :])[0].astype(np.float32)
+
+
+# 文档级向量索引（document_embeddings 表）：入库时与分块、向量在同一事务中写入，
+# 两阶段检索的第一阶段从这里选出候选文档
+class DocumentEmbeddingStore:
+    def __init__(self, db: Optional[Session] = None, pool=None):
+        self.db = db
+        self._pool = pool
+
+    async def _get_pool(self):
+        if self._pool is not None:
+            return self._pool
+        from src.services.async_vector_store import VectorPool
+
+        return await VectorPool.get_pool()
+
+    def save(self, document_id: int, embedding: np.ndarray, chunk_count: int) -> DocumentEmbedding:
+        row = self.db.merge(
+            DocumentEmbedding(
+                document_id=document_id,
+                embedding=as_vector(embedding),
+                chunk_count=chunk_count,
+            )
+        )
+        self.db.flush()
+        return row
+
+    def clear(self, document_id: int) -> None:
+        self.db.query(DocumentEmbedding).filter(
+            DocumentEmbedding.document_id == document_id
+        ).delete()
+
+    # 返回 None 表示直接平铺检索：语料（或给定范围）不超过 limit 篇，或文档向量检索失败
+    async def select_documents(
+        self,
+        query_embedding: VectorLike,
+        limit: int,
+        document_ids: Optional[List[int]] = None,
+    ) -> Optional[List[int]]:
+        vector = as_vector(query_embedding)
+        try:
+            pool = await self._get_pool()
+            async with pool.acquire() as conn:
+                async with conn.transaction():
+                    if document_ids:
+                        document_count = len(document_ids)
+                    else:
+                        document_count = await conn.fetchval(DOCUMENT_COUNT_SQL)
+                    if not two_stage_applies(document_count, limit):
+                        return None
+                    # HNSW 最多返回 ef_search 条（默认 40），少于 limit 时候选文档会被截断
+                    await conn.execute(f"SET LOCAL hnsw.ef_search = {document_ef_search(limit)}")
+                    if document_ids:
+                        rows = await conn.fetch(
+                            DOCUMENT_SEARCH_SCOPED_SQL, vector, limit, document_ids
+                        )
+                    else:
+                        rows = await conn.fetch(DOCUMENT_SEARCH_SQL, vector, limit)
+        except Exception as e:
+            print(f"文档向量检索失败: {e}")
+            return None
+        return [row["document_id"] for row in rows] or None
+
+
+document_embedding_store = DocumentEmbeddingStore()
+
+
+# 语料（或给定范围）不超过 limit 篇时两阶段检索没有收益，直接平铺检索
+def two_stage_applies(document_count: Optional[int], limit: int) -> bool:
+    return bool(document_count) and document_count > limit
+
+
+def document_ef_search(limit: int) -> int:
+    return min(max(limit, settings.vector_search_ef_search or 40), MAX_EF_SEARCH)
+
+
+def recall_at_k(expected: Sequence[int], found: Sequence[int]) -> float:
+    if not expected:
+        return 1.0
+    return len(set(expected) & set(found)) / len(expected)
+
+
+# 用库中随机抽取的分块向量作为查询，以关闭索引的精确检索为基准，
+# 比较两阶段检索与平铺 ANN 检索的 top-k 召回率和耗时
+def evaluate_recall(
+    samples: int = 100,
+    top_k: int = 10,
+    documents: Optional[int] = None,
+    database_url: Optional[str] = None,
+) -> Dict:
+    documents = documents or settings.two_stage_documents
+    schema = get_vector_schema()
+    table = schema.table
+    flat_sql = (
+        f"SELECT chunk_id FROM {table} ORDER BY embedding <=> %s::{schema.vector_type} LIMIT %s"
+    )
+    conn = psycopg2.connect(database_url or settings.database_url)
+    recalls, flat_recalls, flat_ms, two_stage_ms = [], [], [], []
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT embedding::text FROM {table} ORDER BY random() LIMIT %s", (samples,)
+        )
+        queries = [row[0] for row in cursor.fetchall()]
+        conn.commit()
+        for query in queries:
+            # 基准：关闭索引扫描，顺序扫描 + 排序得到精确 top-k
+            cursor.execute("SET LOCAL enable_indexscan = off")
+            cursor.execute(flat_sql, (query, top_k))
+            exact = [row[0] for row in cursor.fetchall()]
+            conn.commit()
+
+            started = time.perf_counter()
+            cursor.execute(flat_sql, (query, top_k))
+            flat = [row[0] for row in cursor.fetchall()]
+            flat_ms.append((time.perf_counter() - started) * 1000)
+            conn.commit()
+
+            started = time.perf_counter()
+            cursor.execute(f"SET LOCAL hnsw.ef_search = {document_ef_search(documents)}")
+            cursor.execute(
+                "SELECT document_id FROM document_embeddings "
+                "ORDER BY embedding <=> %s::vector LIMIT %s",
+                (query, documents),
+            )
+            candidates = [row[0] for row in cursor.fetchall()]
+            cursor.execute(
+                f"SELECT chunk_id FROM {table} WHERE document_id = ANY(%s) "
+                f"ORDER BY embedding <=> %s::{schema.vector_type} LIMIT %s",
+                (candidates, query, top_k),
+            )
+            scoped = [row[0] for row in cursor.fetchall()]
+            two_stage_ms.append((time.perf_counter() - started) * 1000)
+            conn.commit()
+
+            recalls.append(recall_at_k(exact, scoped))
+            flat_recalls.append(recall_at_k(exact, flat))
+        cursor.close()
+    finally:
+        conn.close()
+
+    def median_ms(values: List[float]) -> Optional[float]:
+        return round(float(np.median(values)), 2) if values else None
+
+    return {
+        "samples": len(recalls),
+        "top_k": top_k,
+        "documents": documents,
+        "recall": round(float(np.mean(recalls)), 4) if recalls else None,
+        "flat_recall": round(float(np.mean(flat_recalls)), 4) if flat_recalls else None,
+        "flat_ms": median_ms(flat_ms),
+        "two_stage_ms": median_ms(two_stage_ms),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="以精确检索为基准评估两阶段检索与平铺检索的召回率")
+    parser.add_argument("--samples", type=int, default=100, help="抽样查询数")
+    parser.add_argument("--top-k", type=int, default=10, help="比较的结果数")
+    parser.add_argument("--documents", type=int, default=None, help="第一阶段选出的文档数")
+    args = parser.parse_args()
+
+    for key, value in evaluate_recall(args.samples, args.top_k, args.documents).items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,7 +6,10 @@ from sqlalchemy.orm import Session
 from src.models.document import Document, DocumentChunk
 from src.services.chunker_service import ChunkerService
 from src.services.embedding_service import EmbeddingService
-from src.services.vector_store import VectorStore
+from src.services.vector_store import create_vector_store
+from src.services.corpus_events import DocumentIndexedEvent, corpus_events
+from src.services.document_stats_service import DocumentStatsService
+from src.services.document_embeddings import DocumentEmbeddingStore, document_embedding
 from src.config import settings
 
 
@@ -15,7 +18,9 @@ class DocumentProcessor:
         self.db = db
         self.chunker = ChunkerService()
         self.embedding_service = EmbeddingService()
-        self.vector_store = VectorStore(db)
+        self.vector_store = create_vector_store(db)
+        self.stats_service = DocumentStatsService(db)
+        self.document_embeddings = DocumentEmbeddingStore(db)
 
     def process_document(self, document_id: int) -> bool:
         return asyncio.run(self.process_document_async(document_id))
@@ -40,39 +45,54 @@ class DocumentProcessor:
 
             chunk_texts = [chunk.content for chunk in chunks]
             embeddings = self.embedding_service.embed_texts(chunk_texts)
-            if not embeddings:
+            if embeddings is None or len(embeddings) != len(chunk_texts):
                 self._update_status(document, "FAILED", "生成嵌入向量失败")
                 return False
 
-            db_chunks = []
-            for i, chunk in enumerate(chunks):
-                db_chunk = DocumentChunk(
+            db_chunks = [
+                DocumentChunk(
                     document_id=document_id,
                     chunk_index=chunk.chunk_index,
                     content=chunk.content,
                     token_count=chunk.token_count,
                 )
-                self.db.add(db_chunk)
-                db_chunks.append(db_chunk)
+                for chunk in chunks
+            ]
+            self.db.add_all(db_chunks)
+            self.db.flush()
+            chunk_ids = [db_chunk.id for db_chunk in db_chunks]
+
+            added = self.vector_store.add_vectors(document_id, db_chunks, embeddings, commit=False)
+            if added != len(db_chunks):
+                self._mark_failed(document_id, "写入向量失败")
+                return False
 
-            self.db.commit()
+            # 文档向量供两阶段检索选文档；标题编码失败时只用分块质心
+            title_embedding = None
+            if document.title:
+                title_embedding = self.embedding_service.embed_single_text(document.title)
+            self.document_embeddings.save(
+                document_id, document_embedding(embeddings, title_embedding), len(db_chunks)
+            )
 
-            for db_chunk, embedding in zip(db_chunks, embeddings):
-                self.db.refresh(db_chunk)
-                self.vector_store.add_vector(
-                    chunk_id=db_chunk.id,
+            # 统计、文档向量与分块、向量、状态在同一事务中提交
+            self.stats_service.record_indexed(document_id, db_chunks, added)
+            self._update_status(document, "COMPLETED")
+            corpus_events.document_indexed(
+                DocumentIndexedEvent(
                     document_id=document_id,
-                    content=db_chunk.content,
-                    embedding=embedding,
+                    document_title=document.title,
+                    chunk_ids=chunk_ids,
+                    contents=chunk_texts,
+                    embeddings=embeddings,
                 )
-
-            self._update_status(document, "COMPLETED")
+            )
             return True
 
         except Exception as e:
             error_msg = str(e)
             print(f"文档处理错误: {error_msg}")
-            self._update_status(document, "FAILED", error_msg)
+            self._mark_failed(document_id, error_msg)
             return False
 
     async def _extract_text(self, file_path: str) -> Optional[str]:
@@ -122,6 +142,17 @@ class DocumentProcessor:
             document.error_message = error_message
         self.db.commit()
 
+    # 入库失败：先回滚未提交的分块、向量和文档向量（数据库报错时会话也需要回滚才能继续使用），
+    # 不随主库事务回滚的向量后端（本地 mmap、分片）需要补偿删除已写入的向量，
+    # 再重新查询文档并单独提交 FAILED 状态
+    def _mark_failed(self, document_id: int, error_message: str) -> None:
+        self.db.rollback()
+        if not self.vector_store.transactional:
+            self.vector_store.delete_document_vectors(document_id)
+        document = self.db.query(Document).filter(Document.id == document_id).first()
+        if document:
+            self._update_status(document, "FAILED", error_message)
+
     def get_document_chunks(self, document_id: int) -> List[DocumentChunk]:
         return (
             self.db.query(DocumentChunk)
@@ -137,5 +168,8 @@ class DocumentProcessor:
             .filter(DocumentChunk.document_id == document_id)
             .delete()
         )
+        self.stats_service.clear(document_id)
+        self.document_embeddings.clear(document_id)
         self.db.commit()
+        corpus_events.document_removed(document_id)
         return deleted
@@ -6,6 +6,7 @@ from sqlalchemy.orm import Session
 from sqlalchemy import desc
 
 from src.models.document import Document
+from src.services.corpus_events import corpus_events
 from src.config import settings
 
 
@@ -101,5 +102,6 @@ class DocumentService:
                 os.remove(document.file_path)
             self.db.delete(document)
             self.db.commit()
+            corpus_events.document_removed(document_id)
             return True
         return False
@@ -0,0 +1,58 @@
+from datetime import datetime
+from typing import List
+
+from sqlalchemy.orm import Session
+
+from src.models.document import Document, DocumentChunk, DocumentStats
+
+
+# 每篇文档的向量数 / 分块数 / token 总数 / 最近入库时间，在入库和删除的同一事务中维护，
+# 文档列表与检索规划直接读取，不再对 document_vectors 逐篇 COUNT(*)
+class DocumentStatsService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def record_indexed(
+        self,
+        document_id: int,
+        chunks: List[DocumentChunk],
+        vector_count: int,
+    ) -> DocumentStats:
+        stats = self.db.merge(
+            DocumentStats(
+                document_id=document_id,
+                vector_count=vector_count,
+                chunk_count=len(chunks),
+                token_count=sum(chunk.token_count or 0 for chunk in chunks),
+                last_indexed_at=datetime.utcnow(),
+            )
+        )
+        self.db.flush()
+        return stats
+
+    def clear(self, document_id: int) -> None:
+        self.db.query(DocumentStats).filter(DocumentStats.document_id == document_id).delete()
+
+    def list_completed_documents(self) -> List[dict]:
+        rows = (
+            self.db.query(Document, DocumentStats)
+            .outerjoin(DocumentStats, DocumentStats.document_id == Document.id)
+            .filter(Document.status == "COMPLETED")
+            .order_by(Document.created_at.desc())
+            .all()
+        )
+
+        return [
+            {
+                "id": doc.id,
+                "title": doc.title,
+                "created_at": doc.created_at.isoformat() if doc.created_at else None,
+                "vector_count": stats.vector_count if stats else 0,
+                "chunk_count": stats.chunk_count if stats else 0,
+                "token_count": stats.token_count if stats else 0,
+                "last_indexed_at": (
+                    stats.last_indexed_at.isoformat() if stats and stats.last_indexed_at else None
+                ),
+            }
+            for doc, stats in rows
+        ]
@@ -0,0 +1,83 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from src.config import settings
+
+
+# 把并发的单条查询嵌入请求在短时间窗口内合并成一次批量 encode，
+# encode 在专用线程中执行，不阻塞事件循环
+class EmbeddingBatcher:
+    def __init__(
+        self,
+        encode_fn: Callable[[List[str]], Optional[np.ndarray]],
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+    ):
+        self._encode_fn = encode_fn
+        self.max_batch_size = max_batch_size or settings.embedding_batch_max_size
+        self.max_wait_ms = (
+            max_wait_ms if max_wait_ms is not None else settings.embedding_batch_max_wait_ms
+        )
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def embed(self, text: str) -> Optional[np.ndarray]:
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    def _ensure_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.max_wait_ms / 1000
+
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._dispatch(batch)
+
+    async def _dispatch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        texts = [text for text, _ in batch]
+        try:
+            embeddings = await self._loop.run_in_executor(self._executor, self._encode_fn, texts)
+        except Exception as e:
+            print(f"批量查询嵌入失败: {e}")
+            embeddings = None
+
+        for i, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            future.set_result(embeddings[i] if embeddings is not None else None)
+
+    async def close(self) -> None:
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,293 @@
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.config import settings
+
+
+# 以 (嵌入模型, sha256(文本)) 为键的持久化嵌入缓存：
+# 向量以 float32 存放在内存映射文件中，索引按 LRU 顺序淘汰。
+# 索引由快照 index.json 和追加写的 index.log 组成，put_many 只追加新增的键，
+# 日志条数超过索引规模时才压缩为新快照。同一目录只允许一个写进程（writer.lock 文件锁），
+# 其他进程只读，每次查询前从日志增量同步写进程新增和淘汰的键
+class EmbeddingCache:
+    VECTORS_FILE = "vectors.f32"
+    INDEX_FILE = "index.json"
+    LOG_FILE = "index.log"
+    LOCK_FILE = "writer.lock"
+    MIN_COMPACT_ENTRIES = 1024
+
+    def __init__(
+        self,
+        model_name: str,
+        dimension: int,
+        cache_dir: Optional[str] = None,
+        max_entries: Optional[int] = None,
+    ):
+        self.model_name = model_name
+        self.dimension = dimension
+        self.max_entries = max_entries or settings.embedding_cache_max_entries
+        safe_name = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        self.directory = os.path.join(cache_dir or settings.embedding_cache_dir, safe_name)
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._slots: "OrderedDict[str, int]" = OrderedDict()
+        self._free_slots: List[int] = []
+        self._next_slot = 0
+        self._capacity = 0
+        self._vectors: Optional[np.memmap] = None
+        self._log_inode: Optional[int] = None
+        self._log_offset = 0
+        self._log_entries = 0
+        self._lock_file = None
+        self.writable = self._acquire_writer()
+        self._load()
+
+    @staticmethod
+    def text_key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _acquire_writer(self) -> bool:
+        lock_file = open(self._path(self.LOCK_FILE), "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            print(f"嵌入缓存目录 {self.directory} 已有写进程，本进程只读")
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def close(self) -> None:
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+                self._vectors = None
+            if self._lock_file is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+                self._lock_file.close()
+                self._lock_file = None
+                self.writable = False
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        with self._lock:
+            if not self.writable:
+                self._refresh()
+            results: List[Optional[np.ndarray]] = []
+            for text in texts:
+                key = self.text_key(text)
+                slot = self._slots.get(key)
+                if slot is None or self._vectors is None:
+                    results.append(None)
+                    continue
+                self._slots.move_to_end(key)
+                results.append(np.array(self._vectors[slot]))
+            return results
+
+    def put_many(self, texts: List[str], embeddings: np.ndarray) -> None:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if not self.writable or embeddings.ndim != 2 or embeddings.shape[1] != self.dimension:
+            return
+
+        with self._lock:
+            evicted: List[str] = []
+            assigned: List[Tuple[str, int]] = []
+            for text, embedding in zip(texts, embeddings):
+                key = self.text_key(text)
+                slot = self._slots.get(key)
+                if slot is None:
+                    slot = self._allocate_slot(evicted)
+                self._vectors[slot] = embedding
+                self._slots[key] = slot
+                self._slots.move_to_end(key)
+                assigned.append((key, slot))
+            # 批次大于 max_entries 时，本批先写入的键可能又被淘汰、槽位被后面的键复用，
+            # 只记录仍然有效的映射
+            assigned = [(key, slot) for key, slot in assigned if self._slots.get(key) == slot]
+            # 先记淘汰再落盘向量、最后记新键，只读进程不会把复用的槽位读成旧键的向量
+            self._append_log([f"- {key}" for key in evicted])
+            self._vectors.flush()
+            self._append_log([f"{key} {slot}" for key, slot in assigned])
+            if self._log_entries > max(len(self._slots), self.MIN_COMPACT_ENTRIES):
+                self._compact()
+
+    def _allocate_slot(self, evicted: List[str]) -> int:
+        if len(self._slots) >= self.max_entries:
+            key, slot = self._slots.popitem(last=False)
+            evicted.append(key)
+            return slot
+
+        if self._free_slots:
+            return self._free_slots.pop()
+
+        slot = self._next_slot
+        if slot >= self._capacity:
+            self._grow(min(max(self._capacity * 2, 1024), self.max_entries))
+        self._next_slot += 1
+        return slot
+
+    def _grow(self, capacity: int) -> None:
+        path = self._path(self.VECTORS_FILE)
+        if self._vectors is not None:
+            self._vectors.flush()
+            self._vectors = None
+        with open(path, "ab") as f:
+            f.truncate(capacity * self.dimension * 4)
+        self._map(capacity)
+
+    def _map(self, capacity: int) -> None:
+        self._vectors = np.memmap(
+            self._path(self.VECTORS_FILE),
+            dtype=np.float32,
+            mode="r+" if self.writable else "r",
+            shape=(capacity, self.dimension),
+        )
+        self._capacity = capacity
+
+    def _append_log(self, lines: List[str]) -> None:
+        if not lines:
+            return
+        with open(self._path(self.LOG_FILE), "a", encoding="utf-8") as f:
+            f.write("".join(line + "\n" for line in lines))
+        self._log_entries += len(lines)
+
+    def _replay(self, line: str) -> None:
+        key, value = line.split()
+        if key == "-":
+            self._slots.pop(value, None)
+            return
+        self._slots[key] = int(value)
+        self._slots.move_to_end(key)
+
+    def _read_log(self) -> None:
+        path = self._path(self.LOG_FILE)
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            self._log_inode = os.fstat(f.fileno()).st_ino
+            f.seek(self._log_offset)
+            while True:
+                line = f.readline()
+                # 写进程可能正在追加，只消费完整的行
+                if not line.endswith(b"\n"):
+                    break
+                self._log_offset += len(line)
+                self._log_entries += 1
+                self._replay(line.decode("ascii"))
+
+    def _read_snapshot(self) -> Optional[List[List]]:
+        index_path = self._path(self.INDEX_FILE)
+        if not os.path.exists(index_path) or not os.path.exists(self._path(self.VECTORS_FILE)):
+            return None
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except Exception as e:
+            print(f"嵌入缓存索引读取失败，将重建: {e}")
+            return None
+        if meta.get("dimension") != self.dimension:
+            return None
+        return meta.get("entries", [])
+
+    def _load(self) -> None:
+        self._slots.clear()
+        self._log_offset = 0
+        self._log_entries = 0
+        entries = self._read_snapshot()
+        # 快照缺失或维度不符时日志也作废
+        if entries is not None:
+            for key, slot in entries:
+                self._slots[key] = slot
+            self._read_log()
+        vectors_path = self._path(self.VECTORS_FILE)
+        capacity = 0
+        if os.path.exists(vectors_path):
+            capacity = os.path.getsize(vectors_path) // (self.dimension * 4)
+
+        if not self.writable:
+            self._vectors = None
+            if capacity:
+                self._map(capacity)
+            self._drop_unmapped()
+            return
+
+        if not self._slots:
+            for name in (self.VECTORS_FILE, self.LOG_FILE, self.INDEX_FILE):
+                if os.path.exists(self._path(name)):
+                    os.remove(self._path(name))
+            self._capacity = 0
+            self._log_entries = 0
+            self._grow(min(1024, self.max_entries))
+            self._compact()
+            return
+
+        self._map(capacity)
+        self._drop_unmapped()
+        while len(self._slots) > self.max_entries:
+            self._slots.popitem(last=False)
+        used = set(self._slots.values())
+        self._next_slot = max(used) + 1 if used else 0
+        self._free_slots = [slot for slot in range(self._next_slot) if slot not in used]
+
+    def _drop_unmapped(self) -> None:
+        for key in [key for key, slot in self._slots.items() if slot >= self._capacity]:
+            del self._slots[key]
+
+    # 只读进程：日志被压缩替换（inode 变化）时重新加载，否则只读取新追加的行
+    def _refresh(self) -> None:
+        path = self._path(self.LOG_FILE)
+        try:
+            inode = os.stat(path).st_ino
+        except FileNotFoundError:
+            return
+        if inode != self._log_inode:
+            self._load()
+            return
+        self._read_log()
+        if self._slots and max(self._slots.values()) >= self._capacity:
+            self._map(os.path.getsize(self._path(self.VECTORS_FILE)) // (self.dimension * 4))
+            self._drop_unmapped()
+
+    # 压缩：按当前 LRU 顺序写出快照，再用空日志原子替换旧日志
+    def _compact(self) -> None:
+        index_path = self._path(self.INDEX_FILE)
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "model": self.model_name,
+                    "dimension": self.dimension,
+                    "capacity": self._capacity,
+                    "entries": [[key, slot] for key, slot in self._slots.items()],
+                },
+                f,
+            )
+        os.replace(tmp_path, index_path)
+        log_path = self._path(self.LOG_FILE)
+        open(log_path + ".tmp", "w").close()
+        os.replace(log_path + ".tmp", log_path)
+        self._log_offset = 0
+        self._log_entries = 0
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._slots),
+            "capacity": self._capacity,
+            "max_entries": self.max_entries,
+            "log_entries": self._log_entries,
+            "writable": self.writable,
+        }
@@ -0,0 +1,110 @@
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from src.config import settings
+
+_worker_model = None
+
+
+def _init_worker(model_name: str, threads: int) -> None:
+    global _worker_model
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except Exception:
+        pass
+
+    from sentence_transformers import SentenceTransformer
+
+    _worker_model = SentenceTransformer(model_name)
+
+
+def _encode_shard(
+    shm_name: str,
+    shape: Tuple[int, int],
+    start: int,
+    texts: List[str],
+    batch_size: int,
+) -> int:
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        output = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+        output[start:start + len(texts)] = _worker_model.encode(
+            texts, batch_size=batch_size, convert_to_numpy=True
+        )
+        del output
+    finally:
+        shm.close()
+    return len(texts)
+
+
+def plan_shards(total: int, workers: int, shard_size: int) -> List[Tuple[int, int]]:
+    if total <= 0:
+        return []
+    size = max(1, min(shard_size, math.ceil(total / workers)))
+    return [(start, min(start + size, total)) for start in range(0, total, size)]
+
+
+# 批量入库用的多进程嵌入池：每个工作进程只加载一次模型，
+# 文本按分片分发，结果通过共享内存以 float32 写回，避免 pickle 大列表
+class EmbeddingProcessPool:
+    def __init__(
+        self,
+        model_name: str,
+        dimension: int,
+        workers: Optional[int] = None,
+        shard_size: Optional[int] = None,
+        threads_per_worker: Optional[int] = None,
+    ):
+        self.model_name = model_name
+        self.dimension = dimension
+        self.workers = workers or settings.embedding_pool_workers
+        self.shard_size = shard_size or settings.embedding_pool_shard_size
+        threads = threads_per_worker or settings.embedding_pool_threads_per_worker
+
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_name, threads),
+        )
+        print(f"多进程嵌入池已启动: {self.workers} 个进程, 每进程 {threads} 线程")
+
+    def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        total = len(texts)
+        shape = (total, self.dimension)
+        if total == 0:
+            return np.empty(shape, dtype=np.float32)
+
+        shm = shared_memory.SharedMemory(create=True, size=total * self.dimension * 4)
+        try:
+            futures = [
+                self._executor.submit(
+                    _encode_shard, shm.name, shape, start, texts[start:end], batch_size
+                )
+                for start, end in plan_shards(total, self.workers, self.shard_size)
+            ]
+
+            done = 0
+            try:
+                for future in as_completed(futures):
+                    done += future.result()
+                    print(f"多进程嵌入进度 {done}/{total}")
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+
+            return np.ndarray(shape, dtype=np.float32, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
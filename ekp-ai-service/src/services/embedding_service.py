@@ -3,12 +3,20 @@ import numpy as np
 import httpx
 
 from src.config import settings
+from src.services.embedding_batcher import EmbeddingBatcher
+from src.services.embedding_cache import EmbeddingCache
+from src.services.embedding_pool import EmbeddingProcessPool
+from src.services.similarity import cosine_similarity_matrix
+from src.services.vector_codec import VectorLike, as_matrix, as_vector
 
 
 class EmbeddingService:
     _instance = None
     _model = None
     _use_local = True
+    _batcher = None
+    _cache = None
+    _pool = None
 
     def __new__(cls):
         if cls._instance is None:
@@ -43,22 +51,68 @@ class EmbeddingService:
     def is_ready(self) -> bool:
         return self._model is not None
 
-    def embed_texts(self, texts: List[str]) -> Optional[List[List[float]]]:
+    def _get_cache(self) -> Optional[EmbeddingCache]:
+        if not settings.embedding_cache_enabled:
+            return None
+        if self._cache is None:
+            try:
+                EmbeddingService._cache = EmbeddingCache(settings.embedding_model, self.dimension)
+            except Exception as e:
+                print(f"嵌入缓存初始化失败: {e}")
+                return None
+        return self._cache
+
+    def _get_pool(self) -> Optional[EmbeddingProcessPool]:
+        if settings.embedding_pool_workers <= 0:
+            return None
+        if self._pool is None:
+            try:
+                EmbeddingService._pool = EmbeddingProcessPool(
+                    settings.embedding_model, self.dimension
+                )
+            except Exception as e:
+                print(f"多进程嵌入池启动失败: {e}")
+                return None
+        return self._pool
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        pool = self._get_pool()
+        if pool is not None and len(texts) >= settings.embedding_pool_min_texts:
+            try:
+                return pool.encode(texts)
+            except Exception as e:
+                print(f"多进程嵌入失败，回退到单进程: {e}")
+        return self._model.encode(texts, convert_to_numpy=True)
+
+    def embed_texts(self, texts: List[str], use_cache: bool = True) -> Optional[np.ndarray]:
         if not texts:
-            return []
+            return np.empty((0, self.dimension), dtype=np.float32)
 
         if self._model is None:
             print("嵌入模型未初始化")
             return None
 
         try:
-            embeddings = self._model.encode(texts, convert_to_numpy=True)
-            return embeddings.tolist()
+            cache = self._get_cache() if use_cache else None
+            if cache is None:
+                return as_matrix(self._encode(texts))
+
+            cached = cache.get_many(texts)
+            miss_indices = [i for i, embedding in enumerate(cached) if embedding is None]
+            if miss_indices:
+                miss_texts = [texts[i] for i in miss_indices]
+                encoded = self._encode(miss_texts)
+                cache.put_many(miss_texts, encoded)
+                for i, embedding in zip(miss_indices, encoded):
+                    cached[i] = embedding
+
+            print(f"嵌入缓存命中 {len(texts) - len(miss_indices)}/{len(texts)}")
+            return as_matrix(np.stack(cached))
         except Exception as e:
             print(f"嵌入生成失败: {e}")
             return None
 
-    def embed_single_text(self, text: str) -> Optional[List[float]]:
+    def embed_single_text(self, text: str) -> Optional[np.ndarray]:
         if not text:
             return None
 
@@ -68,31 +122,57 @@ class EmbeddingService:
 
         try:
             embedding = self._model.encode(text, convert_to_numpy=True)
-            return embedding.tolist()
+            return as_vector(embedding)
         except Exception as e:
             print(f"嵌入生成失败: {e}")
             return None
 
-    def compute_similarity(self, embedding1: List[float], embedding2: List[float]) -> float:
-        vec1 = np.array(embedding1)
-        vec2 = np.array(embedding2)
-
-        dot_product = np.dot(vec1, vec2)
-        norm1 = np.linalg.norm(vec1)
-        norm2 = np.linalg.norm(vec2)
+    async def embed_single_text_async(self, text: str) -> Optional[np.ndarray]:
+        if not text:
+            return None
 
-        if norm1 == 0 or norm2 == 0:
-            return 0.0
+        if self._model is None:
+            print("嵌入模型未初始化")
+            return None
 
-        return float(dot_product / (norm1 * norm2))
+        if self._batcher is None:
+            EmbeddingService._batcher = EmbeddingBatcher(
+                lambda texts: self.embed_texts(texts, use_cache=False)
+            )
+        return await self._batcher.embed(text)
+
+    @classmethod
+    async def close(cls) -> None:
+        if cls._batcher is not None:
+            await cls._batcher.close()
+            cls._batcher = None
+        if cls._pool is not None:
+            cls._pool.shutdown()
+            cls._pool = None
+
+    def compute_similarity(self, embedding1: VectorLike, embedding2: VectorLike) -> float:
+        similarity = cosine_similarity_matrix([as_vector(embedding1)], [as_vector(embedding2)])
+        return float(similarity[0, 0])
+
+    # 批量余弦相似度：(m, d) 与 (n, d) 两组向量一次矩阵乘法得到 (m, n) 的 float32 矩阵
+    def compute_similarity_matrix(
+        self, embeddings1: np.ndarray, embeddings2: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        return cosine_similarity_matrix(embeddings1, embeddings2)
 
     def batch_embed_with_progress(
         self, texts: List[str], batch_size: int = 32
-    ) -> Optional[List[List[float]]]:
+    ) -> Optional[np.ndarray]:
         if self._model is None:
             print("嵌入模型未初始化")
             return None
 
+        if self._get_pool() is not None and len(texts) >= settings.embedding_pool_min_texts:
+            try:
+                return self._pool.encode(texts, batch_size=batch_size)
+            except Exception as e:
+                print(f"多进程嵌入失败，回退到单进程: {e}")
+
         try:
             all_embeddings = []
             total = len(texts)
@@ -101,9 +181,11 @@ class EmbeddingService:
                 batch = texts[i:i + batch_size]
                 print(f"处理文本批次 {i // batch_size + 1}/{(total + batch_size - 1) // batch_size}")
                 embeddings = self._model.encode(batch, convert_to_numpy=True)
-                all_embeddings.extend(embeddings.tolist())
+                all_embeddings.append(embeddings)
 
-            return all_embeddings
+            if not all_embeddings:
+                return np.empty((0, self.dimension), dtype=np.float32)
+            return as_matrix(np.vstack(all_embeddings))
         except Exception as e:
             print(f"批量嵌入生成失败: {e}")
             return None
@@ -0,0 +1,426 @@
+import asyncio
+import math
+import re
+import threading
+import time
+from array import array
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.services.corpus_events import DocumentIndexedEvent, corpus_events
+
+_TOKEN_PATTERN = re.compile(
+    r"([\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+)|([a-z0-9]+(?:[._/\-][a-z0-9]+)*)"
+)
+_SEPARATOR_PATTERN = re.compile(r"[._/\-]")
+
+# tf 用 1 字节保存，BM25 的 tf 饱和后再大也几乎不影响得分
+_MAX_TF = 255
+
+
+# 中文连续片段切成字 bigram（单字片段保留单字），英文 / 数字按词切分并转小写；
+# 保单号、条款编号这类带分隔符的编号同时保留整体和各段，既能精确命中也能部分命中
+def tokenize(text: str) -> List[str]:
+    tokens: List[str] = []
+    for cjk, word in _TOKEN_PATTERN.findall(text.lower()):
+        if cjk:
+            if len(cjk) == 1:
+                tokens.append(cjk)
+            else:
+                tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        else:
+            tokens.append(word)
+            if _SEPARATOR_PATTERN.search(word):
+                tokens.extend(part for part in _SEPARATOR_PATTERN.split(word) if part)
+    return tokens
+
+
+# 索引只存在于进程内，用 64 位字符串哈希代替词本身，省去词表字符串的内存
+def _term_hash(term: str) -> int:
+    return hash(term)
+
+
+# 一段不可变的倒排索引，CSR 布局：按词哈希排序的词表 + 偏移量，倒排表拼接成 int32 行号和 uint8 词频两个大数组，
+# 每条倒排 5 字节，每个词 17 字节，不为单个词创建 Python 对象
+class _Segment:
+    def __init__(self, terms, offsets, rows, tfs, max_tfs):
+        self.terms = terms
+        self.offsets = offsets
+        self.rows = rows
+        self.tfs = tfs
+        self.max_tfs = max_tfs
+
+    @classmethod
+    def build(cls, hashes: np.ndarray, rows: np.ndarray, tfs: np.ndarray) -> "_Segment":
+        # 输入按行号递增，稳定排序后同一个词的倒排表仍按行号有序
+        order = np.argsort(hashes, kind="stable")
+        hashes, rows, tfs = hashes[order], rows[order], tfs[order]
+        terms, starts = np.unique(hashes, return_index=True)
+        offsets = np.append(starts, len(hashes)).astype(np.int64)
+        max_tfs = np.maximum.reduceat(tfs, starts) if len(tfs) else np.empty(0, dtype=np.uint8)
+        return cls(terms, offsets, rows, tfs, max_tfs)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def lookup(self, term: int) -> int:
+        i = int(np.searchsorted(self.terms, term))
+        return i if i < len(self.terms) and self.terms[i] == term else -1
+
+    def postings(self, i: int):
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.rows[start:end], self.tfs[start:end]
+
+
+_HASH_MIN, _HASH_SPAN = -(2 ** 63), 2 ** 64
+
+
+# 多个段按写入先后合并：段内和段间行号都递增，按词稳定排序后倒排表仍然有序。
+# 词哈希近似均匀分布，按哈希区间分块合并并直接写入预分配的结果数组，峰值内存只比结果多一个块
+def _merge_segments(
+    segments: List[_Segment],
+    alive: Optional[np.ndarray] = None,
+    remap: Optional[np.ndarray] = None,
+) -> _Segment:
+    total = sum(len(segment) for segment in segments)
+    blocks = max(1, -(-total // settings.keyword_index_merge_block))
+    rows_out = np.empty(total, dtype=np.int32)
+    tfs_out = np.empty(total, dtype=np.uint8)
+    terms, offsets, max_tfs = [], [], []
+    written = 0
+
+    for block in range(blocks):
+        low = _HASH_MIN + block * _HASH_SPAN // blocks
+        high = _HASH_MIN + (block + 1) * _HASH_SPAN // blocks
+        hash_parts, row_parts, tf_parts = [], [], []
+        for segment in segments:
+            first = int(np.searchsorted(segment.terms, low))
+            if block == blocks - 1:
+                last = len(segment.terms)
+            else:
+                last = int(np.searchsorted(segment.terms, high))
+            start, end = segment.offsets[first], segment.offsets[last]
+            counts = np.diff(segment.offsets[first:last + 1])
+            hash_parts.append(np.repeat(segment.terms[first:last], counts))
+            row_parts.append(segment.rows[start:end])
+            tf_parts.append(segment.tfs[start:end])
+
+        hashes = np.concatenate(hash_parts)
+        rows, tfs = np.concatenate(row_parts), np.concatenate(tf_parts)
+        if alive is not None:
+            keep = alive[rows]
+            hashes, rows, tfs = hashes[keep], remap[rows[keep]], tfs[keep]
+        if len(hashes) == 0:
+            continue
+
+        part = _Segment.build(hashes, rows, tfs)
+        rows_out[written:written + len(part)] = part.rows
+        tfs_out[written:written + len(part)] = part.tfs
+        terms.append(part.terms)
+        offsets.append(part.offsets[:-1] + written)
+        max_tfs.append(part.max_tfs)
+        written += len(part)
+
+    if not terms:
+        return _Segment.build(
+            np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.uint8)
+        )
+    if written < total:
+        rows_out, tfs_out = rows_out[:written].copy(), tfs_out[:written].copy()
+    return _Segment(
+        np.concatenate(terms),
+        np.append(np.concatenate(offsets), written).astype(np.int64),
+        rows_out,
+        tfs_out,
+        np.concatenate(max_tfs),
+    )
+
+
+# document_chunks 的进程内 BM25 倒排索引。新写入的文档各自成为一个小段，末尾相邻两段大小接近时合并
+# （对数合并策略），段数保持在 O(log n)。行号按写入顺序递增，所以每个词的倒排表天然有序。
+# 查询用 MaxScore 剪枝：从最稀有的词开始稠密累加，一旦剩余词的得分上界之和小于当前第 k 名，
+# 高频词只需用二分查找给已有候选补分。删除只打墓碑，墓碑比例超过阈值时整体压缩成一个段
+class KeywordIndex:
+    def __init__(self, k1: Optional[float] = None, b: Optional[float] = None):
+        self.k1 = k1 if k1 is not None else settings.keyword_bm25_k1
+        self.b = b if b is not None else settings.keyword_bm25_b
+        self._lock = threading.RLock()
+        self._segments: List[_Segment] = []
+        self._chunk_ids = np.empty(0, dtype=np.int64)
+        self._document_ids = np.empty(0, dtype=np.int64)
+        self._lengths = np.empty(0, dtype=np.int32)
+        self._document_rows: Dict[int, array] = {}
+        self._count = 0
+        self._live = 0
+        self._total_length = 0
+        self._ready = False
+        self._indexed_while_building: set = set()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="keyword-index")
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready
+
+    def __len__(self) -> int:
+        return self._live
+
+    def _reserve(self, extra: int) -> None:
+        needed = self._count + extra
+        if needed <= len(self._chunk_ids):
+            return
+        capacity = max(needed, len(self._chunk_ids) * 2, 1024)
+        for name in ("_chunk_ids", "_document_ids", "_lengths"):
+            old = getattr(self, name)
+            grown = np.empty(capacity, dtype=old.dtype)
+            grown[:self._count] = old[:self._count]
+            setattr(self, name, grown)
+
+    def add(self, document_id: int, chunk_ids: Sequence[int], contents: Sequence[str]) -> int:
+        counted = [Counter(tokenize(content)) for content in contents]
+        hashes = [_term_hash(term) for counts in counted for term in counts]
+        tfs = [tf for counts in counted for tf in counts.values()]
+        sizes = [len(counts) for counts in counted]
+        lengths = [sum(counts.values()) for counts in counted]
+
+        with self._lock:
+            start = self._count
+            self._reserve(len(chunk_ids))
+            end = start + len(chunk_ids)
+            self._chunk_ids[start:end] = chunk_ids
+            self._document_ids[start:end] = document_id
+            self._lengths[start:end] = lengths
+            self._document_rows.setdefault(document_id, array("i")).extend(range(start, end))
+            self._count = end
+            self._live += len(chunk_ids)
+            self._total_length += sum(lengths)
+
+            if hashes:
+                self._segments.append(
+                    _Segment.build(
+                        np.array(hashes, dtype=np.int64),
+                        np.repeat(np.arange(start, end, dtype=np.int32), sizes),
+                        np.minimum(np.array(tfs), _MAX_TF).astype(np.uint8),
+                    )
+                )
+                self._merge_tail()
+            return len(chunk_ids)
+
+    def _merge_tail(self) -> None:
+        factor = settings.keyword_index_merge_factor
+        segments = self._segments
+        while len(segments) > 1 and len(segments[-1]) * factor >= len(segments[-2]):
+            segments[-2:] = [_merge_segments(segments[-2:])]
+
+    def remove_document(self, document_id: int) -> int:
+        with self._lock:
+            removed = self._document_rows.pop(document_id, None)
+            if not removed:
+                return 0
+            rows = np.array(removed, dtype=np.int32)
+            self._document_ids[rows] = -1
+            self._live -= len(rows)
+            self._total_length -= int(self._lengths[rows].sum())
+            if (self._count - self._live) / self._count > settings.keyword_index_compact_ratio:
+                self.compact()
+            return len(rows)
+
+    def compact(self) -> None:
+        with self._lock:
+            alive = self._document_ids[:self._count] >= 0
+            remap = (np.cumsum(alive) - 1).astype(np.int32)
+            if self._segments:
+                self._segments = [_merge_segments(self._segments, alive, remap)]
+            for name in ("_chunk_ids", "_document_ids", "_lengths"):
+                setattr(self, name, getattr(self, name)[:self._count][alive].copy())
+            self._document_rows = {
+                document_id: array("i", remap[np.array(rows, dtype=np.int32)].tobytes())
+                for document_id, rows in self._document_rows.items()
+            }
+            self._count = self._live
+
+    # 一个词在所有段中的倒排表（行号有序）及其最大词频
+    def _postings(self, term: int):
+        row_parts, tf_parts, max_tf = [], [], 0
+        for segment in self._segments:
+            i = segment.lookup(term)
+            if i >= 0:
+                rows, tfs = segment.postings(i)
+                row_parts.append(rows)
+                tf_parts.append(tfs)
+                max_tf = max(max_tf, int(segment.max_tfs[i]))
+        if not row_parts:
+            return None
+        if len(row_parts) == 1:
+            return row_parts[0], tf_parts[0], max_tf
+        return np.concatenate(row_parts), np.concatenate(tf_parts), max_tf
+
+    def _idf(self, df: int) -> float:
+        return math.log(1 + (self._count - df + 0.5) / (df + 0.5))
+
+    def _weights(
+        self, tfs: np.ndarray, rows: np.ndarray, idf: float, average_length: float
+    ) -> np.ndarray:
+        tfs = tfs.astype(np.float32)
+        norm = self.k1 * (1 - self.b + self.b * self._lengths[rows] / average_length)
+        return idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+    def _scoped_rows(self, document_ids: List[int]) -> np.ndarray:
+        parts = [
+            np.array(self._document_rows[d], dtype=np.int32)
+            for d in set(document_ids)
+            if d in self._document_rows
+        ]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int32)
+
+    # 返回 [(chunk_id, document_id, bm25 分数)]，按分数降序
+    def search(
+        self,
+        query: str,
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+    ) -> List[Tuple[int, int, float]]:
+        with self._lock:
+            if self._live == 0 or top_k <= 0:
+                return []
+            found = [self._postings(_term_hash(term)) for term in set(tokenize(query))]
+            terms = sorted((f for f in found if f is not None), key=lambda f: len(f[0]))
+            if not terms:
+                return []
+
+            average_length = self._total_length / self._live
+            scores = np.zeros(self._count, dtype=np.float32)
+
+            # 只给指定的（有序）行补上某个词的得分，用二分查找代替扫描整条倒排表
+            def add_to_rows(term, rows: np.ndarray) -> None:
+                postings, tfs, _ = term
+                positions = np.minimum(np.searchsorted(postings, rows), len(postings) - 1)
+                hit = postings[positions] == rows
+                if hit.any():
+                    idf = self._idf(len(postings))
+                    scores[rows[hit]] += self._weights(
+                        tfs[positions[hit]], rows[hit], idf, average_length
+                    )
+
+            # 限定范围较小时直接对范围内的行逐词二分补分
+            if document_ids:
+                scoped = self._scoped_rows(document_ids)
+                if len(scoped) * settings.keyword_scoped_scan_factor < self._count:
+                    for term in terms:
+                        add_to_rows(term, scoped)
+                    return self._top(scores, scoped[scores[scoped] > 0], top_k)
+                allowed = np.zeros(self._count, dtype=bool)
+                allowed[scoped] = True
+            elif self._live < self._count:
+                allowed = self._document_ids[:self._count] >= 0
+            else:
+                allowed = None
+
+            # 单个词的得分上界：该词最大词频、文档长度取 0 时的 BM25 权重
+            bounds = [
+                self._idf(len(rows)) * max_tf * (self.k1 + 1) / (max_tf + self.k1 * (1 - self.b))
+                for rows, _, max_tf in terms
+            ]
+            remaining = sum(bounds)
+            seen = np.zeros(self._count, dtype=bool)
+            candidates: List[np.ndarray] = []
+            threshold = 0.0
+            scored = 0
+            for (rows, tfs, _), bound in zip(terms, bounds):
+                scores[rows] += self._weights(tfs, rows, self._idf(len(rows)), average_length)
+                fresh = ~seen[rows] if allowed is None else ~seen[rows] & allowed[rows]
+                candidates.append(rows[fresh])
+                seen[rows] = True
+                scored += 1
+                remaining -= bound
+
+                pool = np.concatenate(candidates)
+                if len(pool) >= top_k:
+                    kth = len(pool) - top_k
+                    threshold = float(np.partition(scores[pool], kth)[kth])
+                    if remaining < threshold:
+                        break
+
+            pool = np.concatenate(candidates)
+            if scored < len(terms):
+                refine = np.sort(pool[scores[pool] + remaining >= threshold])
+                for term in terms[scored:]:
+                    add_to_rows(term, refine)
+            return self._top(scores, pool, top_k)
+
+    def _top(
+        self, scores: np.ndarray, rows: np.ndarray, top_k: int
+    ) -> List[Tuple[int, int, float]]:
+        if len(rows) == 0:
+            return []
+        k = min(top_k, len(rows))
+        top = rows[np.argpartition(-scores[rows], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            (int(self._chunk_ids[row]), int(self._document_ids[row]), float(scores[row]))
+            for row in top
+        ]
+
+    def _reindex(self, event: DocumentIndexedEvent) -> None:
+        self.remove_document(event.document_id)
+        self.add(event.document_id, event.chunk_ids, event.contents)
+
+    # 分词、追加段和级联合并（以及删除触发的压缩）在单线程的写入线程上执行，不阻塞事件循环；
+    # 单线程保证同一文档的入库与删除按发布顺序生效
+    async def on_document_indexed(self, event: DocumentIndexedEvent) -> None:
+        if not self._ready:
+            self._indexed_while_building.add(event.document_id)
+        await asyncio.get_running_loop().run_in_executor(self._writer, self._reindex, event)
+
+    async def on_document_removed(self, document_id: int) -> None:
+        await asyncio.get_running_loop().run_in_executor(
+            self._writer, self.remove_document, document_id
+        )
+
+    def build(self, db: Session) -> int:
+        from src.models.document import Document, DocumentChunk
+
+        corpus_events.subscribe(self)
+        started = time.time()
+        rows = (
+            db.query(DocumentChunk.document_id, DocumentChunk.id, DocumentChunk.content)
+            .join(Document, Document.id == DocumentChunk.document_id)
+            .filter(Document.status == "COMPLETED")
+            .order_by(DocumentChunk.document_id, DocumentChunk.id)
+            .yield_per(settings.keyword_index_batch_size)
+        )
+
+        # 构建期间通过事件入库的文档已是最新内容，扫描时跳过
+        document_id, chunk_ids, contents = None, [], []
+        for row_document_id, chunk_id, content in rows:
+            if row_document_id != document_id and chunk_ids:
+                if document_id not in self._indexed_while_building:
+                    self.add(document_id, chunk_ids, contents)
+                chunk_ids, contents = [], []
+            document_id = row_document_id
+            chunk_ids.append(chunk_id)
+            contents.append(content)
+        if chunk_ids and document_id not in self._indexed_while_building:
+            self.add(document_id, chunk_ids, contents)
+
+        self._ready = True
+        self._indexed_while_building.clear()
+        print(f"关键词索引构建完成: {self._live} 个分块, 耗时 {time.time() - started:.1f}s")
+        return self._live
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                "ready": self._ready,
+                "chunks": self._live,
+                "segments": len(self._segments),
+                "postings": sum(len(segment) for segment in self._segments),
+                "tombstones": self._count - self._live,
+            }
+
+
+keyword_index = KeywordIndex()
@@ -0,0 +1,536 @@
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.models.document import Document, DocumentChunk
+from src.services.embedding_service import EmbeddingService
+from src.services.vector_codec import VectorLike, as_matrix, as_vector
+from src.services.vector_quantizer import create_quantizer, load_quantizer
+from src.services.vector_store import SearchResult
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+# 精确检索引擎：归一化后的 float32 向量保存在内存映射文件中，与之并行的 chunk_id / document_id
+# 数组用于过滤（document_id = -1 表示已删除）。一次矩阵乘法算出全部余弦分数，argpartition 取 top-k
+class MmapVectorIndex:
+    EMBEDDINGS_FILE = "embeddings.f32"
+    CHUNK_IDS_FILE = "chunk_ids.i64"
+    DOCUMENT_IDS_FILE = "document_ids.i64"
+    CONTENTS_FILE = "contents.jsonl"
+    META_FILE = "meta.json"
+    CODES_FILE = "codes.bin"
+    QUANTIZER_FILE = "quantizer.npz"
+
+    def __init__(self, directory: str, dimension: int, quantization: Optional[str] = None):
+        self.directory = directory
+        self.dimension = dimension
+        self.quantization = quantization
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._count = 0
+        self._deleted = 0
+        self._capacity = 0
+        self._embeddings: Optional[np.memmap] = None
+        self._chunk_ids: Optional[np.memmap] = None
+        self._document_ids: Optional[np.memmap] = None
+        self._quantizer = None
+        self._codes: Optional[np.memmap] = None
+        self._contents: Dict[int, str] = {}
+        self._titles: Dict[int, Optional[str]] = {}
+        self._load()
+
+    def __len__(self) -> int:
+        return self._count - self._deleted
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _open_arrays(self, capacity: int) -> None:
+        arrays = {}
+        for name, dtype, shape in (
+            (self.EMBEDDINGS_FILE, np.float32, (capacity, self.dimension)),
+            (self.CHUNK_IDS_FILE, np.int64, (capacity,)),
+            (self.DOCUMENT_IDS_FILE, np.int64, (capacity,)),
+        ):
+            path = self._path(name)
+            with open(path, "ab") as f:
+                f.truncate(int(np.prod(shape)) * np.dtype(dtype).itemsize)
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+        self._embeddings = arrays[self.EMBEDDINGS_FILE]
+        self._chunk_ids = arrays[self.CHUNK_IDS_FILE]
+        self._document_ids = arrays[self.DOCUMENT_IDS_FILE]
+        self._capacity = capacity
+        if self._quantizer is not None:
+            self._open_codes()
+
+    def _codes_order(self) -> str:
+        return "F" if self._quantizer.kind == "pq" else "C"
+
+    def _open_codes(self) -> None:
+        # PQ 编码按列存储（Fortran 序），查表时每个子空间的编码是连续内存；
+        # sq8 按行存储，打分时逐块反量化。容量变化时需要重排文件
+        previous = None
+        if self._codes is not None and len(self._codes) != self._capacity:
+            previous = np.array(self._codes[:self._count])
+            self._codes = None
+            os.remove(self._path(self.CODES_FILE))
+
+        dtype = np.uint8 if self._quantizer.kind == "pq" else np.int8
+        shape = (self._capacity, self._quantizer.code_size)
+        path = self._path(self.CODES_FILE)
+        with open(path, "ab") as f:
+            f.truncate(int(np.prod(shape)))
+        self._codes = np.memmap(
+            path, dtype=dtype, mode="r+", shape=shape, order=self._codes_order()
+        )
+        if previous is not None:
+            self._codes[:len(previous)] = previous
+
+    def _load(self) -> None:
+        meta = {}
+        if os.path.exists(self._path(self.META_FILE)):
+            with open(self._path(self.META_FILE), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+
+        if meta.get("dimension") != self.dimension:
+            for name in (self.EMBEDDINGS_FILE, self.CHUNK_IDS_FILE, self.DOCUMENT_IDS_FILE,
+                         self.CONTENTS_FILE, self.CODES_FILE, self.QUANTIZER_FILE):
+                if os.path.exists(self._path(name)):
+                    os.remove(self._path(name))
+            meta = {}
+
+        reencode = False
+        if self.quantization and meta.get("quantization") == self.quantization:
+            self._quantizer = load_quantizer(self._path(self.QUANTIZER_FILE))
+            # 早期版本的 sq8 编码按列存储，布局不符时用全精度向量重新编码
+            if meta.get("codes_order", "F") != self._codes_order():
+                os.remove(self._path(self.CODES_FILE))
+                reencode = True
+        self._open_arrays(max(meta.get("capacity", 0), 1024))
+        self._count = meta.get("count", 0)
+        self._titles = {int(k): v for k, v in meta.get("titles", {}).items()}
+
+        if os.path.exists(self._path(self.CONTENTS_FILE)):
+            with open(self._path(self.CONTENTS_FILE), "r", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    self._contents[record["chunk_id"]] = record["content"]
+        self._deleted = int(np.count_nonzero(self._document_ids[:self._count] < 0))
+        if reencode:
+            self._encode_all()
+            self._save_meta()
+
+    def _save_meta(self) -> None:
+        for array in (self._embeddings, self._chunk_ids, self._document_ids, self._codes):
+            if array is not None:
+                array.flush()
+        tmp_path = self._path(self.META_FILE) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "dimension": self.dimension,
+                    "count": self._count,
+                    "capacity": self._capacity,
+                    "quantization": self._quantizer.kind if self._quantizer is not None else None,
+                    "codes_order": self._codes_order() if self._quantizer is not None else None,
+                    "titles": self._titles,
+                },
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, self._path(self.META_FILE))
+
+    def add(
+        self,
+        document_id: int,
+        chunk_ids: Sequence[int],
+        contents: Sequence[str],
+        embeddings: np.ndarray,
+        document_title: Optional[str] = None,
+    ) -> int:
+        embeddings = _normalize_rows(as_matrix(embeddings))
+        total = len(chunk_ids)
+        if total == 0:
+            return 0
+
+        with self._lock:
+            needed = self._count + total
+            if needed > self._capacity:
+                self._open_arrays(max(needed, self._capacity * 2))
+
+            start, end = self._count, needed
+            self._embeddings[start:end] = embeddings
+            self._chunk_ids[start:end] = chunk_ids
+            self._document_ids[start:end] = document_id
+            if self._quantizer is not None:
+                self._codes[start:end] = self._quantizer.encode(embeddings)
+            self._count = end
+
+            with open(self._path(self.CONTENTS_FILE), "a", encoding="utf-8") as f:
+                for chunk_id, content in zip(chunk_ids, contents):
+                    self._contents[int(chunk_id)] = content
+                    f.write(json.dumps({"chunk_id": int(chunk_id), "content": content},
+                                       ensure_ascii=False) + "\n")
+            if document_title is not None:
+                self._titles[document_id] = document_title
+            if (
+                self.quantization
+                and self._quantizer is None
+                and len(self) >= settings.vector_quantization_min_rows
+            ):
+                self.train_quantizer()
+            self._save_meta()
+            return total
+
+    def remove_document(self, document_id: int) -> int:
+        with self._lock:
+            rows = np.flatnonzero(self._document_ids[:self._count] == document_id)
+            if len(rows) == 0:
+                return 0
+
+            for chunk_id in self._chunk_ids[rows]:
+                self._contents.pop(int(chunk_id), None)
+            self._document_ids[rows] = -1
+            self._deleted += len(rows)
+            self._titles.pop(document_id, None)
+
+            if self._deleted > settings.mmap_vector_compact_ratio * self._count:
+                self.compact()
+            else:
+                self._save_meta()
+            return len(rows)
+
+    def compact(self) -> None:
+        with self._lock:
+            keep = np.flatnonzero(self._document_ids[:self._count] >= 0)
+            embeddings = np.array(self._embeddings[keep])
+            chunk_ids = np.array(self._chunk_ids[keep])
+            document_ids = np.array(self._document_ids[keep])
+            codes = np.array(self._codes[keep]) if self._codes is not None else None
+
+            count = len(keep)
+            self._embeddings[:count] = embeddings
+            self._chunk_ids[:count] = chunk_ids
+            self._document_ids[:count] = document_ids
+            if codes is not None:
+                self._codes[:count] = codes
+            self._count = count
+            self._deleted = 0
+
+            tmp_path = self._path(self.CONTENTS_FILE) + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for chunk_id in chunk_ids:
+                    content = self._contents.get(int(chunk_id), "")
+                    f.write(json.dumps(
+                        {"chunk_id": int(chunk_id), "content": content}, ensure_ascii=False
+                    ) + "\n")
+            os.replace(tmp_path, self._path(self.CONTENTS_FILE))
+            self._save_meta()
+
+    def train_quantizer(self, sample_size: Optional[int] = None) -> None:
+        with self._lock:
+            live = np.flatnonzero(self._document_ids[:self._count] >= 0)
+            if len(live) == 0:
+                return
+            sample_size = min(sample_size or settings.vector_quantization_train_size, len(live))
+            sample = np.random.default_rng(0).choice(live, sample_size, replace=False)
+
+            quantizer = create_quantizer(
+                self.quantization, self.dimension, settings.vector_quantization_subspaces
+            )
+            quantizer.train(self._embeddings[np.sort(sample)])
+            quantizer.save(self._path(self.QUANTIZER_FILE))
+            self._quantizer = quantizer
+            self._open_codes()
+            self._encode_all()
+            self._save_meta()
+            print(f"向量量化完成: {quantizer.kind}, 每条向量 {quantizer.code_size} 字节")
+
+    def _encode_all(self) -> None:
+        for start in range(0, self._count, 10000):
+            end = min(start + 10000, self._count)
+            self._codes[start:end] = self._quantizer.encode(self._embeddings[start:end])
+
+    # 量化只压缩每次查询要扫描的数据（scan_bytes）：全精度向量仍保存在磁盘上用于精排，
+    # 磁盘占用（disk_bytes）是向量与编码之和，比不量化时更大。只作用于 mmap 后端，不涉及 document_vectors
+    def stats(self) -> Dict:
+        code_size = self._quantizer.code_size if self._quantizer is not None else None
+        vector_bytes = self.dimension * 4
+        disk_bytes = sum(
+            os.path.getsize(self._path(name))
+            for name in (self.EMBEDDINGS_FILE, self.CHUNK_IDS_FILE, self.DOCUMENT_IDS_FILE,
+                         self.CONTENTS_FILE, self.CODES_FILE)
+            if os.path.exists(self._path(name))
+        )
+        return {
+            "vectors": len(self),
+            "dimension": self.dimension,
+            "quantization": self._quantizer.kind if self._quantizer is not None else None,
+            "vector_bytes": vector_bytes,
+            "code_bytes": code_size,
+            "scan_bytes": self._count * (code_size or vector_bytes),
+            "disk_bytes": disk_bytes,
+        }
+
+    def _candidate_rows(self, document_ids: Optional[List[int]]) -> Optional[np.ndarray]:
+        row_document_ids = self._document_ids[:self._count]
+        if document_ids:
+            return np.flatnonzero(np.isin(row_document_ids, document_ids))
+        if self._deleted:
+            return np.flatnonzero(row_document_ids >= 0)
+        return None
+
+    def _top_results(
+        self,
+        scores: np.ndarray,
+        rows: Optional[np.ndarray],
+        top_k: int,
+    ) -> List[SearchResult]:
+        k = min(top_k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        positions = rows[top] if rows is not None else top
+
+        results = []
+        for position, score in zip(positions, scores[top]):
+            chunk_id = int(self._chunk_ids[position])
+            document_id = int(self._document_ids[position])
+            results.append(
+                SearchResult(
+                    chunk_id=chunk_id,
+                    document_id=document_id,
+                    content=self._contents.get(chunk_id, ""),
+                    score=float(score),
+                    document_title=self._titles.get(document_id),
+                )
+            )
+        return results
+
+    def search(
+        self,
+        query_embedding: VectorLike,
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+        min_score: float = 0.0,
+    ) -> List[SearchResult]:
+        query = as_vector(query_embedding)
+        norm = np.linalg.norm(query)
+        if norm == 0 or top_k <= 0:
+            return []
+        query = query / norm
+
+        with self._lock:
+            count = self._count
+            rows = self._candidate_rows(document_ids)
+            candidates = count if rows is None else len(rows)
+            pool = top_k * settings.vector_quantization_rerank_factor
+            if self._quantizer is not None and candidates > pool:
+                # 先在压缩编码上粗排，再用全精度向量对候选池精排
+                codes = self._codes[:count] if rows is None else self._codes[rows]
+                coarse = self._quantizer.scores(query, codes)
+                shortlist = np.argpartition(-coarse, pool - 1)[:pool]
+                rows = shortlist if rows is None else rows[shortlist]
+                scores = self._embeddings[rows] @ query
+            elif rows is not None and document_ids:
+                scores = self._embeddings[rows] @ query
+            elif rows is not None:
+                scores = (self._embeddings[:count] @ query)[rows]
+            else:
+                scores = self._embeddings[:count] @ query
+
+            if min_score > 0:
+                # 先按阈值裁掉候选，再在剩下的行上取 top-k
+                keep = np.flatnonzero(scores >= min_score)
+                rows = keep if rows is None else rows[keep]
+                scores = scores[keep]
+            return self._top_results(scores, rows, top_k)
+
+    # 多条查询合并成一次矩阵乘法；启用量化时逐条走粗排 + 精排
+    def search_many(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+    ) -> List[List[SearchResult]]:
+        queries = _normalize_rows(as_matrix(query_embeddings))
+        if len(queries) == 0 or top_k <= 0:
+            return [[] for _ in queries]
+
+        with self._lock:
+            if self._quantizer is not None:
+                return [self.search(query, top_k, document_ids) for query in queries]
+
+            rows = self._candidate_rows(document_ids)
+            if rows is None:
+                scores = queries @ self._embeddings[:self._count].T
+            else:
+                scores = queries @ self._embeddings[rows].T
+            return [self._top_results(query_scores, rows, top_k) for query_scores in scores]
+
+    def document_vector_count(self, document_id: int) -> int:
+        with self._lock:
+            return int(np.count_nonzero(self._document_ids[:self._count] == document_id))
+
+    def document_ids(self) -> List[int]:
+        with self._lock:
+            ids = np.unique(self._document_ids[:self._count])
+            return [int(d) for d in ids if d >= 0]
+
+    def export_document(self, document_id: int) -> Tuple[List[int], List[str], np.ndarray]:
+        with self._lock:
+            rows = np.flatnonzero(self._document_ids[:self._count] == document_id)
+            chunk_ids = [int(chunk_id) for chunk_id in self._chunk_ids[rows]]
+            contents = [self._contents.get(chunk_id, "") for chunk_id in chunk_ids]
+            return chunk_ids, contents, np.array(self._embeddings[rows])
+
+    # 存储的是归一化后的向量
+    def get_embeddings(self, chunk_ids: List[int]) -> Dict[int, np.ndarray]:
+        with self._lock:
+            rows = np.flatnonzero(np.isin(self._chunk_ids[:self._count], chunk_ids))
+            rows = rows[self._document_ids[rows] >= 0]
+            embeddings = np.array(self._embeddings[rows])
+            return {
+                int(chunk_id): embedding
+                for chunk_id, embedding in zip(self._chunk_ids[rows], embeddings)
+            }
+
+
+_index: Optional[MmapVectorIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_mmap_vector_index() -> MmapVectorIndex:
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = MmapVectorIndex(
+                    settings.vector_store_dir,
+                    settings.embedding_dimension,
+                    settings.vector_quantization,
+                )
+    return _index
+
+
+# 与 VectorStore 相同接口的本地向量库，适合小租户以及无 Postgres 的开发 / 测试部署
+class MmapVectorStore:
+    # 写入立即落盘，不随主库事务回滚
+    transactional = False
+
+    def __init__(self, db: Optional[Session] = None, index: Optional[MmapVectorIndex] = None):
+        self.db = db
+        self.index = index if index is not None else get_mmap_vector_index()
+        self.embedding_service = EmbeddingService()
+
+    def add_vector(
+        self,
+        chunk_id: int,
+        document_id: int,
+        content: str,
+        embedding: VectorLike,
+    ) -> Optional[dict]:
+        self.index.add(document_id, [chunk_id], [content], as_vector(embedding)[None, :],
+                       self._document_title(document_id))
+        return {"document_id": document_id, "chunk_id": chunk_id, "content": content}
+
+    def add_vectors(
+        self,
+        document_id: int,
+        chunks: List[DocumentChunk],
+        embeddings: np.ndarray,
+        commit: bool = True,
+    ) -> int:
+        if len(chunks) != len(embeddings):
+            raise ValueError("chunks和embeddings数量不匹配")
+        if not chunks:
+            return 0
+
+        chunk_ids = [chunk.id for chunk in chunks]
+        contents = [chunk.content for chunk in chunks]
+        try:
+            document_title = self._document_title(document_id)
+            if commit and self.db is not None:
+                self.db.commit()
+            return self.index.add(document_id, chunk_ids, contents, embeddings, document_title)
+        except Exception as e:
+            print(f"批量写入向量失败: {e}")
+            if self.db is not None:
+                self.db.rollback()
+            return 0
+
+    def search(
+        self,
+        query_embedding: VectorLike,
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        min_score: float = 0.0,
+    ) -> List[SearchResult]:
+        try:
+            return self.index.search(query_embedding, top_k, document_ids, min_score)
+        except Exception as e:
+            print(f"向量搜索失败: {e}")
+            return []
+
+    def search_many(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+    ) -> List[List[SearchResult]]:
+        try:
+            return self.index.search_many(query_embeddings, top_k, document_ids)
+        except Exception as e:
+            print(f"批量向量搜索失败: {e}")
+            return [[] for _ in range(len(query_embeddings))]
+
+    def search_by_text(
+        self,
+        query: str,
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+    ) -> List[SearchResult]:
+        query_embedding = self.embedding_service.embed_single_text(query)
+        if query_embedding is None:
+            return []
+
+        return self.search(query_embedding, top_k, document_ids)
+
+    def delete_document_vectors(self, document_id: int) -> int:
+        return self.index.remove_document(document_id)
+
+    # 删除文档只删除主库中的行，本地向量库不受外键级联影响，需要订阅删除事件自行清理
+    def on_document_removed(self, document_id: int) -> None:
+        self.delete_document_vectors(document_id)
+
+    def get_document_vector_count(self, document_id: int) -> int:
+        return self.index.document_vector_count(document_id)
+
+    def get_all_document_ids(self) -> List[int]:
+        return self.index.document_ids()
+
+    def get_embeddings(self, chunk_ids: List[int]) -> Dict[int, np.ndarray]:
+        return self.index.get_embeddings(chunk_ids)
+
+    def _document_title(self, document_id: int) -> Optional[str]:
+        if self.db is None:
+            return None
+        document = self.db.get(Document, document_id)
+        return document.title if document else None
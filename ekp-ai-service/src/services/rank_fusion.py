@@ -0,0 +1,31 @@
+import heapq
+from dataclasses import replace
+from typing import Dict, List, Optional, Sequence
+
+from src.config import settings
+from src.services.vector_store import SearchResult
+
+
+# 倒数排名融合 (RRF)：每路结果按名次贡献 weight / (k + rank)，只看名次不看原始分数，
+# 因此余弦相似度和 BM25 这类量纲不同的分数可以直接融合。返回结果的 score 为融合分数，
+# normalize 时除以各路都排第一时的满分，落在 [0, 1]
+def reciprocal_rank_fusion(
+    result_lists: Sequence[List[SearchResult]],
+    top_k: int,
+    weights: Optional[Sequence[float]] = None,
+    k: Optional[int] = None,
+    normalize: bool = False,
+) -> List[SearchResult]:
+    k = k if k is not None else settings.rrf_k
+    weights = weights if weights is not None else [1.0] * len(result_lists)
+    fused: Dict[int, float] = {}
+    first_seen: Dict[int, SearchResult] = {}
+
+    for weight, results in zip(weights, result_lists):
+        for rank, result in enumerate(results, start=1):
+            fused[result.chunk_id] = fused.get(result.chunk_id, 0.0) + weight / (k + rank)
+            first_seen.setdefault(result.chunk_id, result)
+
+    ranked = heapq.nlargest(top_k, fused.items(), key=lambda item: item[1])
+    scale = (k + 1) / sum(weights) if normalize and sum(weights) > 0 else 1.0
+    return [replace(first_seen[chunk_id], score=score * scale) for chunk_id, score in ranked]
@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import replace
+from typing import List, Optional
+
+import numpy as np
+
+from src.config import settings
+from src.services.vector_store import SearchResult
+
+
+# (sha256(查询), chunk_id) -> 交叉编码器分数的 LRU 缓存；同一问题重复提问或翻页时不再重复打分
+class PairScoreCache:
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or settings.reranker_cache_max_entries
+        self._lock = threading.Lock()
+        self._scores: "OrderedDict[tuple[str, int], float]" = OrderedDict()
+
+    @staticmethod
+    def query_key(query: str) -> str:
+        return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def get_many(self, query_key: str, chunk_ids: List[int]) -> List[Optional[float]]:
+        with self._lock:
+            scores = []
+            for chunk_id in chunk_ids:
+                key = (query_key, chunk_id)
+                score = self._scores.get(key)
+                if score is not None:
+                    self._scores.move_to_end(key)
+                scores.append(score)
+            return scores
+
+    def put_many(self, query_key: str, chunk_ids: List[int], scores: List[float]) -> None:
+        with self._lock:
+            for chunk_id, score in zip(chunk_ids, scores):
+                self._scores[(query_key, chunk_id)] = score
+                self._scores.move_to_end((query_key, chunk_id))
+            while len(self._scores) > self.max_entries:
+                self._scores.popitem(last=False)
+
+
+# 交叉编码器重排：对 (查询, 分块) 对一次批量前向打分。按指数滑动平均估计单对耗时，
+# 候选数按延迟预算截断；模型不可用时保持原排序
+class RerankerService:
+    def __init__(self, model=None, cache: Optional[PairScoreCache] = None):
+        self._model = model
+        self._model_lock = threading.Lock()
+        self._loaded = model is not None
+        self.cache = cache or PairScoreCache()
+        self._pair_ms: Optional[float] = None
+
+    def _get_model(self):
+        if not self._loaded:
+            with self._model_lock:
+                if not self._loaded:
+                    try:
+                        from sentence_transformers import CrossEncoder
+
+                        print(f"正在加载重排模型: {settings.reranker_model}")
+                        self._model = CrossEncoder(
+                            settings.reranker_model, max_length=settings.reranker_max_length
+                        )
+                        print("重排模型加载完成")
+                    except Exception as e:
+                        print(f"重排模型加载失败: {e}")
+                        self._model = None
+                    self._loaded = True
+        return self._model
+
+    @property
+    def pair_latency_ms(self) -> Optional[float]:
+        return self._pair_ms
+
+    def candidate_limit(self) -> int:
+        limit = settings.reranker_max_candidates
+        if self._pair_ms:
+            affordable = int(settings.reranker_latency_budget_ms / self._pair_ms)
+            limit = min(limit, max(settings.reranker_min_candidates, affordable))
+        return limit
+
+    def _record_latency(self, elapsed_ms: float, pairs: int) -> None:
+        per_pair = elapsed_ms / pairs
+        if self._pair_ms is None:
+            self._pair_ms = per_pair
+        else:
+            self._pair_ms += settings.reranker_latency_ema * (per_pair - self._pair_ms)
+
+    def score(self, query: str, results: List[SearchResult]) -> Optional[List[float]]:
+        model = self._get_model()
+        if model is None:
+            return None
+
+        query_key = self.cache.query_key(query)
+        chunk_ids = [r.chunk_id for r in results]
+        scores = self.cache.get_many(query_key, chunk_ids)
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            pairs = [(query, results[i].content) for i in missing]
+            started = time.perf_counter()
+            predicted = np.asarray(model.predict(pairs, batch_size=len(pairs)), dtype=np.float32)
+            self._record_latency((time.perf_counter() - started) * 1000, len(pairs))
+            predicted = predicted.reshape(len(pairs)).tolist()
+            self.cache.put_many(query_key, [chunk_ids[i] for i in missing], predicted)
+            for i, score in zip(missing, predicted):
+                scores[i] = score
+        return scores
+
+    def rerank(self, query: str, results: List[SearchResult], top_k: int) -> List[SearchResult]:
+        if not results:
+            return []
+        candidates = results[:self.candidate_limit()]
+        try:
+            scores = self.score(query, candidates)
+        except Exception as e:
+            print(f"重排失败，保持检索排序: {e}")
+            scores = None
+        if scores is None:
+            return results[:top_k]
+
+        order = np.argsort(-np.asarray(scores), kind="stable")
+        reranked = [replace(candidates[i], score=float(scores[i])) for i in order]
+        return (reranked + results[len(candidates):])[:top_k]
+
+    async def rerank_async(
+        self, query: str, results: List[SearchResult], top_k: int
+    ) -> List[SearchResult]:
+        return await asyncio.to_thread(self.rerank, query, results, top_k)
+
+
+_reranker: Optional[RerankerService] = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker_service() -> RerankerService:
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                _reranker = RerankerService()
+    return _reranker
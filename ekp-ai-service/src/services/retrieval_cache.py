@@ -0,0 +1,169 @@
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import redis.asyncio as redis
+
+from src.config import settings
+from src.services.corpus_events import DocumentIndexedEvent
+from src.services.vector_store import SearchResult
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+# 全角半角、大小写和空白差异不影响检索结果，统一后再做键
+def normalize_query(query: str) -> str:
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", query)).strip().lower()
+
+
+# 检索结果缓存：键为 sha256(语料版本, 规范化查询, 文档范围, top_k, 检索配置)，值为分块 id、文档 id 和分数。
+# 进程内 LRU 保存回表后的完整结果，Redis 保存 id 和分数供多实例共享，命中 Redis 时一次查询回表取内容。
+# 每次入库、删除都 INCR Redis 中的语料版本，旧版本的键不会再被命中，随 TTL 过期，无需扫描删除
+class RetrievalCache:
+    def __init__(
+        self,
+        redis_client: Optional[redis.Redis] = None,
+        max_entries: Optional[int] = None,
+        ttl: Optional[int] = None,
+    ):
+        self._redis = redis_client
+        self.max_entries = max_entries or settings.retrieval_cache_max_entries
+        self.ttl = ttl or settings.retrieval_cache_ttl
+        self.prefix = "ekp:retrieval_cache"
+        self._lock = threading.Lock()
+        self._local: "OrderedDict[str, List[SearchResult]]" = OrderedDict()
+        self._version: Optional[int] = None
+        self._version_checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    async def _get_redis(self) -> redis.Redis:
+        if self._redis is None:
+            from src.redis_client import get_redis
+
+            self._redis = await get_redis()
+        return self._redis
+
+    def _version_key(self) -> str:
+        return f"{self.prefix}:corpus_version"
+
+    # 语料版本在本地缓存 retrieval_cache_version_refresh 秒，其它实例的入库最多延迟这么久可见
+    async def corpus_version(self) -> int:
+        now = time.monotonic()
+        if (
+            self._version is not None
+            and now - self._version_checked_at < settings.retrieval_cache_version_refresh
+        ):
+            return self._version
+        client = await self._get_redis()
+        self._version = int(await client.get(self._version_key()) or 0)
+        self._version_checked_at = now
+        return self._version
+
+    async def bump_version(self) -> Optional[int]:
+        with self._lock:
+            self._local.clear()
+        try:
+            client = await self._get_redis()
+            self._version = int(await client.incr(self._version_key()))
+            self._version_checked_at = time.monotonic()
+            return self._version
+        except Exception as e:
+            # 无法通知其它实例时至少让本实例下次重新读取版本
+            self._version = None
+            print(f"检索缓存版本更新失败: {e}")
+            return None
+
+    def make_key(
+        self,
+        version: int,
+        query: str,
+        document_ids: Optional[Sequence[int]],
+        top_k: int,
+        config: Dict,
+    ) -> str:
+        payload = json.dumps(
+            [
+                normalize_query(query),
+                sorted(set(document_ids)) if document_ids else None,
+                top_k,
+                config,
+            ],
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        return f"{self.prefix}:v{version}:{digest}"
+
+    async def get(self, key: str, loader) -> Optional[List[SearchResult]]:
+        with self._lock:
+            results = self._local.get(key)
+            if results is not None:
+                self._local.move_to_end(key)
+                self.hits += 1
+                return list(results)
+
+        try:
+            client = await self._get_redis()
+            value = await client.get(key)
+        except Exception as e:
+            print(f"检索缓存读取失败: {e}")
+            value = None
+        if value is None:
+            self.misses += 1
+            return None
+
+        hits: List[Tuple[int, int, float]] = json.loads(value)
+        loaded = await loader([chunk_id for chunk_id, _, _ in hits])
+        # 回表时缺少分块说明语料已变化但版本尚未可见，按未命中处理
+        if any(chunk_id not in loaded for chunk_id, _, _ in hits):
+            self.misses += 1
+            return None
+        results = [
+            SearchResult(chunk_id, document_id, loaded[chunk_id][0], score, loaded[chunk_id][1])
+            for chunk_id, document_id, score in hits
+        ]
+        self._put_local(key, results)
+        self.hits += 1
+        return list(results)
+
+    async def put(self, key: str, results: List[SearchResult]) -> None:
+        self._put_local(key, results)
+        value = json.dumps([[r.chunk_id, r.document_id, r.score] for r in results])
+        try:
+            client = await self._get_redis()
+            await client.setex(key, self.ttl, value)
+        except Exception as e:
+            print(f"检索缓存写入失败: {e}")
+
+    def _put_local(self, key: str, results: List[SearchResult]) -> None:
+        with self._lock:
+            self._local[key] = list(results)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    async def on_document_indexed(self, event: DocumentIndexedEvent) -> None:
+        await self.bump_version()
+
+    async def on_document_removed(self, document_id: int) -> None:
+        await self.bump_version()
+
+    def status(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "local_entries": len(self._local),
+                "corpus_version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+retrieval_cache = RetrievalCache()
@@ -0,0 +1,413 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from src.config import settings
+from src.services.context_assembler import AssembledContext, ContextAssembler
+from src.services.keyword_index import keyword_index
+from src.services.rank_fusion import reciprocal_rank_fusion
+from src.services.reranker_service import get_reranker_service
+from src.services.retrieval_cache import retrieval_cache
+from src.services.retriever_service import (
+    BranchTiming,
+    RetrieverService,
+    candidate_pool_size,
+    metadata_ranking,
+    run_branch,
+)
+from src.services.vector_store import SearchResult
+
+CANDIDATE_BRANCHES = ("vector", "keyword", "metadata")
+
+
+# 一次检索在各阶段之间传递的状态；rerank / diversify 为 None 时由流水线的默认值决定
+@dataclass
+class RetrievalState:
+    query: str
+    top_k: int = 5
+    document_ids: Optional[List[int]] = None
+    ef_search: Optional[int] = None
+    probes: Optional[int] = None
+    rerank: Optional[bool] = None
+    diversify: Optional[bool] = None
+    keyword_weight: float = 0.3
+    query_embedding: Optional[np.ndarray] = None
+    candidates: Dict[str, List[SearchResult]] = field(default_factory=dict)
+    # 标题分支命中的文档 id，等向量 / 关键词候选到齐后再展开成分块
+    titles: List[int] = field(default_factory=list)
+    results: List[SearchResult] = field(default_factory=list)
+    # results 的分数是否仍是向量检索的余弦相似度；融合、重排或只剩关键词 / 标题一路时为 False
+    cosine_scores: bool = True
+    context: Optional[AssembledContext] = None
+    timings: List[BranchTiming] = field(default_factory=list)
+
+    @property
+    def pool_size(self) -> int:
+        return candidate_pool_size(self.top_k, bool(self.rerank), bool(self.diversify))
+
+
+# 流水线阶段：run 在 budget_ms 内完成并把结果写回 state，返回结果数；
+# 超时或出错时流水线调用 degrade 给出降级结果后继续执行后续阶段
+class Stage(ABC):
+    name = ""
+    packs = False
+
+    def __init__(self, budget_ms: float):
+        self.budget_ms = budget_ms
+
+    def enabled(self, state: RetrievalState) -> bool:
+        return True
+
+    @abstractmethod
+    async def run(self, state: RetrievalState, retriever: RetrieverService) -> int:
+        ...
+
+    def degrade(self, state: RetrievalState) -> int:
+        return len(state.results)
+
+
+# 问题向量：调用方已编码（例如语义缓存查询时）则跳过；编码失败时向量分支不执行，只走关键词和标题
+class EmbedStage(Stage):
+    name = "embed"
+
+    def enabled(self, state: RetrievalState) -> bool:
+        return state.query_embedding is None
+
+    async def run(self, state: RetrievalState, retriever: RetrieverService) -> int:
+        embedding_service = retriever.embedding_service
+        state.query_embedding = await embedding_service.embed_single_text_async(state.query)
+        return 0 if state.query_embedding is None else 1
+
+    def degrade(self, state: RetrievalState) -> int:
+        return 0
+
+
+# 候选生成：各分支并发执行，单个分支的超时不超过本阶段预算，超时的分支按空结果处理。
+# 每个分支完成时立即把结果和计时写入 state，整个阶段超时被取消时，degrade 用已到达的分支继续
+class CandidateStage(Stage):
+    name = "candidates"
+
+    def __init__(
+        self,
+        budget_ms: float,
+        branches: Sequence[str] = CANDIDATE_BRANCHES,
+        factor: int = 1,
+    ):
+        super().__init__(budget_ms)
+        self.branches = tuple(branches)
+        self.factor = factor
+
+    def _timeout(self, branch_timeout: float) -> float:
+        return min(branch_timeout, self.budget_ms / 1000)
+
+    def _active(self, state: RetrievalState) -> List[str]:
+        return [
+            branch for branch in self.branches
+            if branch != "vector" or state.query_embedding is not None
+        ]
+
+    async def _collect(
+        self, state: RetrievalState, name: str, awaitable, timeout: float
+    ) -> None:
+        results, timing = await run_branch(name, awaitable, timeout)
+        state.timings.append(timing)
+        if name == "metadata":
+            state.titles = results
+        else:
+            state.candidates[name] = results
+
+    # 分支按完成顺序写入计时，结束时末尾这段按声明顺序排列，便于对照
+    def _finish(self, state: RetrievalState) -> int:
+        start = len(state.timings)
+        while start > 0 and state.timings[start - 1].branch in self.branches:
+            start -= 1
+        state.timings[start:] = sorted(
+            state.timings[start:], key=lambda timing: self.branches.index(timing.branch)
+        )
+        if state.titles:
+            state.candidates["metadata"] = metadata_ranking(
+                state.titles,
+                [state.candidates.get("vector", []), state.candidates.get("keyword", [])],
+            )
+        return sum(len(results) for results in state.candidates.values())
+
+    async def run(self, state: RetrievalState, retriever: RetrieverService) -> int:
+        fetch_k = max(state.top_k * self.factor, state.pool_size)
+        jobs = []
+        active = self._active(state)
+        if "vector" in active:
+            jobs.append(self._collect(
+                state,
+                "vector",
+                retriever.retrieve_relevant_chunks_async(
+                    state.query, fetch_k, state.document_ids, ef_search=state.ef_search,
+                    probes=state.probes, rerank=False, diversify=False,
+                    query_embedding=state.query_embedding, use_cache=False,
+                ),
+                self._timeout(settings.retrieval_vector_timeout),
+            ))
+        if "keyword" in active:
+            jobs.append(self._collect(
+                state,
+                "keyword",
+                retriever.keyword_branch(state.query, fetch_k, state.document_ids),
+                self._timeout(settings.retrieval_keyword_timeout),
+            ))
+        if "metadata" in active:
+            jobs.append(self._collect(
+                state,
+                "metadata",
+                retriever.text_search.match_titles(state.query, state.top_k, state.document_ids),
+                self._timeout(settings.retrieval_metadata_timeout),
+            ))
+
+        await asyncio.gather(*jobs)
+        return self._finish(state)
+
+    # 阶段预算先于分支超时耗尽时，未完成的分支按超时记录，已完成分支的结果照常参与融合
+    def degrade(self, state: RetrievalState) -> int:
+        finished = {timing.branch for timing in state.timings}
+        for branch in self._active(state):
+            if branch not in finished:
+                state.timings.append(BranchTiming(branch, round(self.budget_ms, 2), "timeout"))
+        return self._finish(state)
+
+
+# 融合：多路候选按 RRF 融合为一个候选池；只有一路时保留该路的原始分数
+class FusionStage(Stage):
+    name = "fusion"
+
+    def _lists(self, state: RetrievalState) -> List[List[SearchResult]]:
+        return [state.candidates.get(branch, []) for branch in CANDIDATE_BRANCHES]
+
+    async def run(self, state: RetrievalState, retriever: RetrieverService) -> int:
+        lists = self._lists(state)
+        if sum(1 for results in lists if results) <= 1:
+            return self.degrade(state)
+        weights = [
+            2 * (1 - state.keyword_weight),
+            2 * state.keyword_weight,
+            settings.retrieval_metadata_weight,
+        ]
+        state.results = reciprocal_rank_fusion(lists, state.pool_size, weights, normalize=True)
+        state.cosine_scores = False
+        return len(state.results)
+
+    def degrade(self, state: RetrievalState) -> int:
+        branch, results = next(
+            ((branch, results) for branch, results in zip(CANDIDATE_BRANCHES, self._lists(state))
+             if results),
+            ("vector", []),
+        )
+        state.results = results[:state.pool_size]
+        state.cosine_scores = branch == "vector"
+        return len(state.results)
+
+
+# 交叉编码器重排；超出预算时保留融合顺序
+class RerankStage(Stage):
+    name = "rerank"
+
+    def enabled(self, state: RetrievalState) -> bool:
+        return bool(state.rerank) and bool(state.results)
+
+    async def run(self, state: RetrievalState, retriever: RetrieverService) -> int:
+        state.results = await get_reranker_service().rerank_async(
+            state.query, state.results, state.pool_size if state.diversify else state.top_k
+        )
+        state.cosine_scores = False
+        return len(state.results)
+
+
+# MMR 去冗余；超出预算时保留当前顺序
+class DiversifyStage(Stage):
+    name = "mmr"
+
+    def enabled(self, state: RetrievalState) -> bool:
+        return bool(state.diversify) and bool(state.results)
+
+    async def run(self, state: RetrievalState, retriever: RetrieverService) -> int:
+        state.results = await retriever.diversify_async(state.results, state.top_k)
+        return len(state.results)
+
+
+# 上下文组装；超出预算（相邻分块查询过慢）时只用命中分块在 token 预算内组装
+class PackStage(Stage):
+    name = "context"
+    packs = True
+
+    def __init__(self, budget_ms: float, neighbor_window: Optional[int] = None):
+        super().__init__(budget_ms)
+        self.neighbor_window = neighbor_window
+
+    async def run(self, state: RetrievalState, retriever: RetrieverService) -> int:
+        assembler = ContextAssembler(retriever.text_search, neighbor_window=self.neighbor_window)
+        state.context = await assembler.assemble(state.results, state.cosine_scores)
+        return len(state.context.blocks)
+
+    def degrade(self, state: RetrievalState) -> int:
+        assembler = ContextAssembler(neighbor_window=0)
+        state.context = assembler.pack(assembler.trim(state.results, state.cosine_scores), {})
+        return len(state.context.blocks)
+
+
+# 检索流水线：按声明顺序执行各阶段，每个阶段单独限时、计时，超时或出错时降级而不中断。
+# 组装之前的结果（截断到 top_k）走检索结果缓存，命中时只执行组装阶段；
+# pack=False 时只检索不组装上下文（RetrieverService.hybrid_search_async）
+class RetrievalPipeline:
+    def __init__(
+        self,
+        name: str,
+        stages: List[Stage],
+        rerank: Optional[bool] = None,
+        diversify: Optional[bool] = None,
+    ):
+        self.name = name
+        self.stages = stages
+        self.rerank = rerank
+        self.diversify = diversify
+
+    def _resolve(self, state: RetrievalState) -> None:
+        if state.rerank is None:
+            state.rerank = settings.reranker_enabled if self.rerank is None else self.rerank
+        if state.diversify is None:
+            state.diversify = settings.mmr_enabled if self.diversify is None else self.diversify
+
+    # 缓存的结果不带分数来源：只有向量一路且不重排的流水线才确定是余弦分数
+    def _cosine_scores(self, state: RetrievalState) -> bool:
+        branches = {
+            branch
+            for stage in self.stages
+            if isinstance(stage, CandidateStage)
+            for branch in stage.branches
+        }
+        return branches == {"vector"} and not state.rerank
+
+    async def _run_stage(
+        self, stage: Stage, state: RetrievalState, retriever: RetrieverService
+    ) -> str:
+        if not stage.enabled(state):
+            return "ok"
+        started = time.perf_counter()
+        try:
+            count = await asyncio.wait_for(stage.run(state, retriever), stage.budget_ms / 1000)
+            status = "ok"
+        except asyncio.TimeoutError:
+            count, status = stage.degrade(state), "timeout"
+        except Exception as e:
+            print(f"检索阶段 {stage.name} 失败，降级处理: {e}")
+            count, status = stage.degrade(state), "error"
+        elapsed = round((time.perf_counter() - started) * 1000, 2)
+        state.timings.append(BranchTiming(stage.name, elapsed, status, count))
+        return status
+
+    async def run(
+        self,
+        retriever: RetrieverService,
+        state: RetrievalState,
+        pack: bool = True,
+        use_cache: bool = True,
+    ) -> RetrievalState:
+        if not state.query or not state.query.strip():
+            return state
+        started = time.perf_counter()
+        self._resolve(state)
+        stages = [stage for stage in self.stages if not stage.packs]
+        cache_key = None
+        if use_cache and settings.retrieval_cache_enabled:
+            config = retriever.cache_config(
+                f"pipeline:{self.name}",
+                keyword_weight=state.keyword_weight,
+                ef_search=state.ef_search,
+                probes=state.probes,
+                rerank=state.rerank,
+                diversify=state.diversify,
+                keyword_index=keyword_index.is_ready,
+            )
+            cache_key, cached = await retriever.cache_lookup(
+                state.query, state.document_ids, state.top_k, config
+            )
+            if cached is not None:
+                elapsed = round((time.perf_counter() - started) * 1000, 2)
+                state.results = cached
+                state.cosine_scores = self._cosine_scores(state)
+                state.timings.append(BranchTiming("cache", elapsed, "hit", len(cached)))
+                stages = []
+
+        statuses = [await self._run_stage(stage, state, retriever) for stage in stages]
+        state.results = state.results[:state.top_k]
+        branches_ok = all(
+            t.status == "ok" for t in state.timings if t.branch in CANDIDATE_BRANCHES
+        )
+        # 有阶段或分支降级时结果不完整，不写缓存
+        if cache_key and stages and branches_ok and all(status == "ok" for status in statuses):
+            await retrieval_cache.put(cache_key, state.results)
+
+        for stage in self.stages:
+            if pack and stage.packs:
+                await self._run_stage(stage, state, retriever)
+
+        total = round((time.perf_counter() - started) * 1000, 2)
+        state.timings.append(BranchTiming("total", total, "ok", len(state.results)))
+        return state
+
+
+# 预置流水线，每次按当前配置构建：
+# fast：聊天场景，向量 + 关键词，候选阶段预算更紧，不取相邻分块，默认不重排、不做 MMR；
+# vector：只走向量检索；hybrid：向量、关键词、标题三路融合（默认）；
+# thorough：智能体场景，三路候选加倍，默认开启重排和 MMR，预算放宽一倍
+def build_pipelines() -> Dict[str, RetrievalPipeline]:
+    def stages(
+        candidates: CandidateStage,
+        scale: float = 1.0,
+        neighbor_window: Optional[int] = None,
+    ) -> List[Stage]:
+        return [
+            EmbedStage(settings.pipeline_embed_budget_ms),
+            candidates,
+            FusionStage(settings.pipeline_fusion_budget_ms),
+            RerankStage(settings.pipeline_rerank_budget_ms * scale),
+            DiversifyStage(settings.pipeline_mmr_budget_ms * scale),
+            PackStage(settings.pipeline_context_budget_ms * scale, neighbor_window),
+        ]
+
+    candidates_budget = settings.pipeline_candidates_budget_ms
+    factor = settings.hybrid_candidate_factor
+    return {
+        "fast": RetrievalPipeline(
+            "fast",
+            stages(
+                CandidateStage(
+                    settings.pipeline_fast_candidates_budget_ms, ("vector", "keyword"), 2
+                ),
+                neighbor_window=0,
+            ),
+            rerank=False,
+            diversify=False,
+        ),
+        "vector": RetrievalPipeline(
+            "vector", stages(CandidateStage(candidates_budget, ("vector",)))
+        ),
+        "hybrid": RetrievalPipeline(
+            "hybrid", stages(CandidateStage(candidates_budget, CANDIDATE_BRANCHES, factor))
+        ),
+        "thorough": RetrievalPipeline(
+            "thorough",
+            stages(
+                CandidateStage(candidates_budget * 2, CANDIDATE_BRANCHES, factor * 2), scale=2.0
+            ),
+            rerank=True,
+            diversify=True,
+        ),
+    }
+
+
+PIPELINE_NAMES = ("fast", "vector", "hybrid", "thorough")
+
+
+def get_pipeline(name: str) -> Optional[RetrievalPipeline]:
+    return build_pipelines().get(name)
@@ -1,16 +1,102 @@
-from typing import List, Optional
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Dict, List, Optional, Tuple
+import numpy as np
 from sqlalchemy.orm import Session
 
 from src.services.embedding_service import EmbeddingService
-from src.services.vector_store import VectorStore, SearchResult
-from src.models.document import Document
+from src.services.vector_store import SearchResult, create_vector_store
+from src.services.async_vector_store import AsyncVectorStore
+from src.services.vector_replica import vector_replica
+from src.services.document_stats_service import DocumentStatsService
+from src.services.keyword_index import keyword_index
+from src.services.rank_fusion import reciprocal_rank_fusion
+from src.services.text_search import AsyncTextSearch, search_chunks_in_session
+from src.services.reranker_service import get_reranker_service
+from src.services.similarity import mmr_select
+from src.services.retrieval_cache import retrieval_cache
+from src.services.document_embeddings import document_embedding_store
+from src.models.document import Document, DocumentChunk
+from src.config import settings
+
+
+@dataclass
+class BranchTiming:
+    branch: str
+    elapsed_ms: float
+    status: str
+    results: int = 0
+
+
+# 单个检索分支：独立超时，超时或出错时返回空结果而不影响其它分支
+async def run_branch(
+    name: str, awaitable: Awaitable[list], timeout: float
+) -> Tuple[list, BranchTiming]:
+    started = time.perf_counter()
+    try:
+        results = await asyncio.wait_for(awaitable, timeout)
+        status = "ok"
+    except asyncio.TimeoutError:
+        print(f"检索分支 {name} 超时 ({timeout}s)，使用其它分支的结果")
+        results, status = [], "timeout"
+    except Exception as e:
+        print(f"检索分支 {name} 失败: {e}")
+        results, status = [], "error"
+    elapsed = round((time.perf_counter() - started) * 1000, 2)
+    return results, BranchTiming(name, elapsed, status, len(results))
+
+
+# 各阶段需要的候选池大小：重排和 MMR 都要从更宽的候选里挑 top_k，取两者中较大的倍数
+def candidate_pool_size(top_k: int, rerank: bool, diversify: bool) -> int:
+    factor = 1
+    if rerank:
+        factor = max(factor, settings.reranker_candidate_factor)
+    if diversify:
+        factor = max(factor, settings.mmr_candidate_factor)
+    return top_k * factor
+
+
+# 用 MMR 从候选池里选出 top_k 个：相关度取上游分数（向量相似度、RRF 或重排分数）在池内缩放到 [0, 1]，
+# 冗余度取候选向量间的余弦相似度，保持所选结果按入选顺序排列
+def diversify_results(
+    results: List[SearchResult],
+    embeddings: np.ndarray,
+    top_k: int,
+    lambda_mult: Optional[float] = None,
+) -> List[SearchResult]:
+    if len(results) <= 1:
+        return results[:top_k]
+    scores = np.array([r.score for r in results], dtype=np.float32)
+    spread = scores.max() - scores.min()
+    relevance = (scores - scores.min()) / spread if spread > 0 else np.ones_like(scores)
+    lambda_mult = settings.mmr_lambda if lambda_mult is None else lambda_mult
+    return [results[i] for i in mmr_select(relevance, embeddings, top_k, lambda_mult)]
+
+
+# 标题命中的文档：把其它分支召回的这些文档的分块按标题相似度排成第三路
+def metadata_ranking(
+    titles: List[int], result_lists: List[List[SearchResult]]
+) -> List[SearchResult]:
+    title_rank = {document_id: rank for rank, document_id in enumerate(titles)}
+    seen = set()
+    metadata_results = []
+    for results in result_lists:
+        for result in results:
+            if result.document_id in title_rank and result.chunk_id not in seen:
+                seen.add(result.chunk_id)
+                metadata_results.append(result)
+    metadata_results.sort(key=lambda r: title_rank[r.document_id])
+    return metadata_results
 
 
 class RetrieverService:
     def __init__(self, db: Session):
         self.db = db
         self.embedding_service = EmbeddingService()
-        self.vector_store = VectorStore(db)
+        self.vector_store = create_vector_store(db)
+        self.async_vector_store = AsyncVectorStore()
+        self.text_search = AsyncTextSearch()
 
     def retrieve_relevant_chunks(
         self,
@@ -18,25 +104,241 @@ class RetrieverService:
         top_k: int = 5,
         document_ids: Optional[List[int]] = None,
         min_score: float = 0.0,
+        rerank: Optional[bool] = None,
+        diversify: Optional[bool] = None,
     ) -> List[SearchResult]:
         if not query or not query.strip():
             return []
 
         query_embedding = self.embedding_service.embed_single_text(query)
-        if not query_embedding:
+        if query_embedding is None:
             return []
 
-        results = self.vector_store.search(
-            query_embedding=query_embedding,
-            top_k=top_k,
-            document_ids=document_ids,
+        rerank = settings.reranker_enabled if rerank is None else rerank
+        diversify = settings.mmr_enabled if diversify is None else diversify
+        fetch_k = candidate_pool_size(top_k, rerank, diversify)
+        # min_score 下推到各后端的检索中，低于阈值的分块不回传也不构造结果
+        results = self._search_replica(query_embedding, fetch_k, document_ids, min_score=min_score)
+        if results is None:
+            results = self.vector_store.search(
+                query_embedding=query_embedding,
+                top_k=fetch_k,
+                document_ids=document_ids,
+                min_score=min_score,
+            )
+
+        if rerank:
+            results = get_reranker_service().rerank(query, results, fetch_k if diversify else top_k)
+        if diversify:
+            results = self.diversify(results, top_k)
+        return results[:top_k]
+
+    async def retrieve_relevant_chunks_async(
+        self,
+        query: str,
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+        min_score: float = 0.0,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        rerank: Optional[bool] = None,
+        diversify: Optional[bool] = None,
+        query_embedding: Optional[np.ndarray] = None,
+        use_cache: bool = True,
+    ) -> List[SearchResult]:
+        if not query or not query.strip():
+            return []
+
+        rerank = settings.reranker_enabled if rerank is None else rerank
+        diversify = settings.mmr_enabled if diversify is None else diversify
+        cache_key = None
+        if use_cache and settings.retrieval_cache_enabled:
+            config = self.cache_config(
+                "vector", min_score=min_score, ef_search=ef_search, probes=probes,
+                rerank=rerank, diversify=diversify,
+            )
+            cache_key, cached = await self.cache_lookup(query, document_ids, top_k, config)
+            if cached is not None:
+                return cached
+
+        if query_embedding is None:
+            query_embedding = await self.embedding_service.embed_single_text_async(query)
+        if query_embedding is None:
+            return []
+
+        if settings.two_stage_retrieval_enabled:
+            document_ids = await self._select_documents(query_embedding, document_ids)
+
+        fetch_k = candidate_pool_size(top_k, rerank, diversify)
+        # 副本与 mmap 的检索是进程内的 CPU 计算，放到线程中执行，避免大规模扫描阻塞事件循环
+        results = await asyncio.to_thread(
+            self._search_replica, query_embedding, fetch_k, document_ids, ef_search, min_score
+        )
+        if results is None and settings.vector_store_backend == "mmap":
+            results = await asyncio.to_thread(
+                self.vector_store.search,
+                query_embedding, fetch_k, document_ids, min_score=min_score,
+            )
+        if results is None and settings.vector_store_backend == "sharded":
+            results = await self.vector_store.search_async(
+                query_embedding, fetch_k, document_ids, min_score=min_score
+            )
+        if results is None:
+            results = await self.async_vector_store.search(
+                query_embedding=query_embedding,
+                top_k=fetch_k,
+                document_ids=document_ids,
+                ef_search=ef_search,
+                probes=probes,
+                min_score=min_score,
+            )
+
+        if rerank:
+            results = await get_reranker_service().rerank_async(
+                query, results, fetch_k if diversify else top_k
+            )
+        if diversify:
+            results = await self.diversify_async(results, top_k)
+        results = results[:top_k]
+        if cache_key:
+            await retrieval_cache.put(cache_key, results)
+        return results
+
+    def retrieve_many(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+        min_score: float = 0.0,
+    ) -> List[List[SearchResult]]:
+        positions = [i for i, query in enumerate(queries) if query and query.strip()]
+        results: List[List[SearchResult]] = [[] for _ in queries]
+        if not positions:
+            return results
+
+        # 查询向量不写入分块嵌入缓存，避免临时查询挤掉文档分块
+        embeddings = self.embedding_service.embed_texts(
+            [queries[i] for i in positions], use_cache=False
         )
+        if embeddings is None:
+            return results
 
-        if min_score > 0:
-            results = [r for r in results if r.score >= min_score]
+        found = None
+        if vector_replica.is_ready:
+            found = vector_replica.search_many(embeddings, top_k, document_ids)
+        if found is None:
+            found = self.vector_store.search_many(embeddings, top_k, document_ids)
 
+        for position, query_results in zip(positions, found):
+            results[position] = [r for r in query_results if r.score >= min_score]
         return results
 
+    async def retrieve_many_async(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+        min_score: float = 0.0,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+    ) -> List[List[SearchResult]]:
+        positions = [i for i, query in enumerate(queries) if query and query.strip()]
+        results: List[List[SearchResult]] = [[] for _ in queries]
+        if not positions:
+            return results
+
+        embeddings = await asyncio.to_thread(
+            self.embedding_service.embed_texts, [queries[i] for i in positions], use_cache=False
+        )
+        if embeddings is None:
+            return results
+
+        found = None
+        if vector_replica.is_ready:
+            found = await asyncio.to_thread(
+                vector_replica.search_many, embeddings, top_k, document_ids, ef_search
+            )
+        if found is None and settings.vector_store_backend == "mmap":
+            found = await asyncio.to_thread(
+                self.vector_store.search_many, embeddings, top_k, document_ids
+            )
+        if found is None and settings.vector_store_backend == "sharded":
+            found = await asyncio.to_thread(
+                self.vector_store.search_many, embeddings, top_k, document_ids
+            )
+        if found is None:
+            found = await self.async_vector_store.search_many(
+                embeddings, top_k, document_ids, ef_search, probes
+            )
+
+        for position, query_results in zip(positions, found):
+            results[position] = [r for r in query_results if r.score >= min_score]
+        return results
+
+    @staticmethod
+    def _search_replica(
+        query_embedding,
+        top_k: int,
+        document_ids: Optional[List[int]],
+        ef_search: Optional[int] = None,
+        min_score: float = 0.0,
+    ) -> Optional[List[SearchResult]]:
+        if not vector_replica.is_ready:
+            return None
+        return vector_replica.search(query_embedding, top_k, document_ids, ef_search, min_score)
+
+    # 候选向量优先取库中已存的嵌入（副本、mmap 或向量表一次查询），取不到的再对分块内容重新编码
+    def _candidate_embeddings(self, results: List[SearchResult]) -> Optional[np.ndarray]:
+        chunk_ids = [r.chunk_id for r in results]
+        if vector_replica.is_ready:
+            found = vector_replica.get_embeddings(chunk_ids)
+        else:
+            found = self.vector_store.get_embeddings(chunk_ids)
+        return self._fill_embeddings(results, found)
+
+    async def _candidate_embeddings_async(
+        self, results: List[SearchResult]
+    ) -> Optional[np.ndarray]:
+        chunk_ids = [r.chunk_id for r in results]
+        if vector_replica.is_ready:
+            found = vector_replica.get_embeddings(chunk_ids)
+        elif settings.vector_store_backend == "mmap":
+            found = self.vector_store.get_embeddings(chunk_ids)
+        elif settings.vector_store_backend == "sharded":
+            found = await asyncio.to_thread(self.vector_store.get_embeddings, chunk_ids)
+        else:
+            found = await self.async_vector_store.get_embeddings(chunk_ids)
+        if len(found) < len(chunk_ids):
+            return await asyncio.to_thread(self._fill_embeddings, results, found)
+        return self._fill_embeddings(results, found)
+
+    def _fill_embeddings(
+        self, results: List[SearchResult], found: Dict[int, np.ndarray]
+    ) -> Optional[np.ndarray]:
+        missing = [r for r in results if r.chunk_id not in found]
+        if missing:
+            embedded = self.embedding_service.embed_texts([r.content for r in missing])
+            if embedded is None:
+                return None
+            found.update(zip([r.chunk_id for r in missing], embedded))
+        return np.stack([found[r.chunk_id] for r in results])
+
+    def diversify(self, results: List[SearchResult], top_k: int) -> List[SearchResult]:
+        if len(results) <= top_k:
+            return results
+        embeddings = self._candidate_embeddings(results)
+        if embeddings is None:
+            return results[:top_k]
+        return diversify_results(results, embeddings, top_k)
+
+    async def diversify_async(self, results: List[SearchResult], top_k: int) -> List[SearchResult]:
+        if len(results) <= top_k:
+            return results
+        embeddings = await self._candidate_embeddings_async(results)
+        if embeddings is None:
+            return results[:top_k]
+        return diversify_results(results, embeddings, top_k)
+
     def retrieve_with_context(
         self,
         query: str,
@@ -69,22 +371,7 @@ class RetrieverService:
         }
 
     def get_available_documents(self) -> List[dict]:
-        documents = (
-            self.db.query(Document)
-            .filter(Document.status == "COMPLETED")
-            .order_by(Document.created_at.desc())
-            .all()
-        )
-
-        return [
-            {
-                "id": doc.id,
-                "title": doc.title,
-                "created_at": doc.created_at.isoformat() if doc.created_at else None,
-                "vector_count": self.vector_store.get_document_vector_count(doc.id),
-            }
-            for doc in documents
-        ]
+        return DocumentStatsService(self.db).list_completed_documents()
 
     def search(
         self,
@@ -93,16 +380,51 @@ class RetrieverService:
         document_ids: Optional[List[int]] = None,
     ) -> List[dict]:
         results = self.retrieve_relevant_chunks(query, top_k, document_ids)
-        return [
-            {
-                "id": r.chunk_id,
-                "document_id": r.document_id,
-                "document_title": r.document_title,
-                "content": r.content,
-                "similarity": r.score,
-            }
-            for r in results
-        ]
+        return [self._to_dict(r) for r in results]
+
+    async def search_async(
+        self,
+        query: str,
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        rerank: Optional[bool] = None,
+        diversify: Optional[bool] = None,
+        query_embedding: Optional[np.ndarray] = None,
+    ) -> List[dict]:
+        results = await self.retrieve_relevant_chunks_async(
+            query, top_k, document_ids, ef_search=ef_search, probes=probes,
+            rerank=rerank, diversify=diversify, query_embedding=query_embedding,
+        )
+        return [self._to_dict(r) for r in results]
+
+    async def search_hybrid_async(
+        self,
+        query: str,
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        rerank: Optional[bool] = None,
+        diversify: Optional[bool] = None,
+        query_embedding: Optional[np.ndarray] = None,
+    ) -> Tuple[List[dict], List[BranchTiming]]:
+        results, timings = await self.hybrid_search_async(
+            query, top_k, document_ids, ef_search=ef_search, probes=probes,
+            rerank=rerank, diversify=diversify, query_embedding=query_embedding,
+        )
+        return [self._to_dict(r) for r in results], timings
+
+    @staticmethod
+    def _to_dict(result: SearchResult) -> dict:
+        return {
+            "id": result.chunk_id,
+            "document_id": result.document_id,
+            "document_title": result.document_title,
+            "content": result.content,
+            "similarity": result.score,
+        }
 
     def hybrid_search(
         self,
@@ -111,21 +433,165 @@ class RetrieverService:
         document_ids: Optional[List[int]] = None,
         keyword_weight: float = 0.3,
     ) -> List[SearchResult]:
-        vector_results = self.retrieve_relevant_chunks(query, top_k * 2, document_ids)
+        candidates = top_k * settings.hybrid_candidate_factor
+        vector_results = self.retrieve_relevant_chunks(query, candidates, document_ids)
+        keyword_results = self.retrieve_keyword_chunks(
+            query, candidates, document_ids, vector_results
+        )
 
-        query_lower = query.lower()
-        keyword_scores = {}
+        # 权重以 0.5 为均衡点，各路最多放大到 2 倍
+        weights = [2 * (1 - keyword_weight), 2 * keyword_weight]
+        return reciprocal_rank_fusion([vector_results, keyword_results], top_k, weights)
 
-        for result in vector_results:
-            content_lower = result.content.lower()
-            keyword_count = content_lower.count(query_lower)
-            keyword_scores[result.chunk_id] = min(keyword_count / 10, 1.0)
+    # 向量、关键词、标题三路检索由 hybrid 检索流水线执行（只检索不组装上下文），
+    # 三路并发、超时的分支按空结果参与融合。返回融合结果和各阶段耗时
+    async def hybrid_search_async(
+        self,
+        query: str,
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+        keyword_weight: float = 0.3,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        rerank: Optional[bool] = None,
+        diversify: Optional[bool] = None,
+        query_embedding: Optional[np.ndarray] = None,
+        use_cache: bool = True,
+    ) -> Tuple[List[SearchResult], List[BranchTiming]]:
+        # 流水线模块依赖本模块，在这里导入避免循环引用
+        from src.services.retrieval_pipeline import RetrievalState, get_pipeline
 
-        for result in vector_results:
-            vector_score = result.score
-            keyword_score = keyword_scores.get(result.chunk_id, 0)
-            result.score = (1 - keyword_weight) * vector_score + keyword_weight * keyword_score
+        state = RetrievalState(
+            query=query,
+            top_k=top_k,
+            document_ids=document_ids,
+            ef_search=ef_search,
+            probes=probes,
+            rerank=rerank,
+            diversify=diversify,
+            keyword_weight=keyword_weight,
+            query_embedding=query_embedding,
+        )
+        state = await get_pipeline("hybrid").run(self, state, pack=False, use_cache=use_cache)
+        return state.results, state.timings
+
+    # 两阶段检索第一阶段：从文档向量表选出最相关的 two_stage_documents 篇文档，分块检索限定在其中。
+    # 给定范围本身不超过这么多篇、或语料不足这么多篇时保持原范围，文档向量查询失败时也回退到原范围
+    async def _select_documents(
+        self,
+        query_embedding: np.ndarray,
+        document_ids: Optional[List[int]],
+    ) -> Optional[List[int]]:
+        limit = settings.two_stage_documents
+        if document_ids and len(document_ids) <= limit:
+            return document_ids
+        candidates = await document_embedding_store.select_documents(
+            query_embedding, limit, document_ids
+        )
+        return candidates or document_ids
+
+    # 检索配置指纹：后端、模型、融合和重排参数等任何影响结果的设置变化都会换一个缓存键
+    @staticmethod
+    def cache_config(mode: str, **options) -> dict:
+        return {
+            "mode": mode,
+            "backend": settings.vector_store_backend,
+            "storage": settings.vector_storage_mode,
+            "embedding_model": settings.embedding_model,
+            "replica": vector_replica.is_ready,
+            "reranker_model": settings.reranker_model if options.get("rerank") else None,
+            "mmr_lambda": settings.mmr_lambda if options.get("diversify") else None,
+            "candidate_factors": [
+                settings.hybrid_candidate_factor,
+                settings.reranker_candidate_factor,
+                settings.mmr_candidate_factor,
+            ],
+            "rrf_k": settings.rrf_k,
+            "metadata_weight": settings.retrieval_metadata_weight,
+            "two_stage": (
+                settings.two_stage_documents if settings.two_stage_retrieval_enabled else None
+            ),
+            **options,
+        }
+
+    # 读不到语料版本（Redis 不可用）时不使用缓存，返回 (None, None)
+    async def cache_lookup(
+        self,
+        query: str,
+        document_ids: Optional[List[int]],
+        top_k: int,
+        config: dict,
+    ) -> Tuple[Optional[str], Optional[List[SearchResult]]]:
+        try:
+            version = await retrieval_cache.corpus_version()
+        except Exception as e:
+            print(f"读取检索缓存版本失败: {e}")
+            return None, None
+        key = retrieval_cache.make_key(version, query, document_ids, top_k, config)
+        try:
+            return key, await retrieval_cache.get(key, self.text_search.load_chunks)
+        except Exception as e:
+            print(f"检索缓存回表失败: {e}")
+            return key, None
+
+    # 关键词分支：进程内 BM25 索引就绪时使用它并回表取内容，否则回退到 Postgres pg_trgm
+    async def keyword_branch(
+        self,
+        query: str,
+        top_k: int,
+        document_ids: Optional[List[int]],
+    ) -> List[SearchResult]:
+        if not keyword_index.is_ready:
+            return await self.text_search.search_chunks(query, top_k, document_ids)
 
-        vector_results.sort(key=lambda x: x.score, reverse=True)
+        hits = await asyncio.to_thread(keyword_index.search, query, top_k, document_ids)
+        loaded = await self.text_search.load_chunks([chunk_id for chunk_id, _, _ in hits])
+        return [
+            SearchResult(chunk_id, document_id, loaded[chunk_id][0], score, loaded[chunk_id][1])
+            for chunk_id, document_id, score in hits
+            if chunk_id in loaded
+        ]
 
-        return vector_results[:top_k]
+    def retrieve_keyword_chunks(
+        self,
+        query: str,
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+        known: Optional[List[SearchResult]] = None,
+    ) -> List[SearchResult]:
+        if not query or not query.strip():
+            return []
+        if not keyword_index.is_ready:
+            # 与异步关键词分支一致，索引未启用时回退到 pg_trgm
+            try:
+                return search_chunks_in_session(self.db, query, top_k, document_ids)
+            except Exception as e:
+                print(f"关键词检索失败: {e}")
+                self.db.rollback()
+                return []
+
+        hits = keyword_index.search(query, top_k, document_ids)
+        known_by_id = {r.chunk_id: r for r in known or []}
+        missing = [chunk_id for chunk_id, _, _ in hits if chunk_id not in known_by_id]
+
+        # 只为向量结果里没有的分块回表取内容和标题，一次查询
+        loaded = {}
+        if missing:
+            rows = (
+                self.db.query(DocumentChunk.id, DocumentChunk.content, Document.title)
+                .join(Document, Document.id == DocumentChunk.document_id)
+                .filter(DocumentChunk.id.in_(missing))
+                .all()
+            )
+            loaded = {row[0]: (row[1], row[2]) for row in rows}
+
+        results = []
+        for chunk_id, document_id, score in hits:
+            if chunk_id in known_by_id:
+                content, title = known_by_id[chunk_id].content, known_by_id[chunk_id].document_title
+            elif chunk_id in loaded:
+                content, title = loaded[chunk_id]
+            else:
+                continue
+            results.append(SearchResult(chunk_id, document_id, content, score, title))
+        return results
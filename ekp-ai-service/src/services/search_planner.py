@@ -0,0 +1,87 @@
+import math
+from dataclasses import dataclass, replace
+from typing import Optional
+
+from src.config import settings
+from src.services.vector_schema import VectorSchema
+
+# HNSW 的 ef_search 上限（pgvector 限制为 1000）
+MAX_EF_SEARCH = 1000
+
+
+@dataclass(frozen=True)
+class SearchPlan:
+    strategy: str
+    fetch_k: int
+    ef_search: Optional[int]
+    scoped_rows: int
+    selectivity: float
+
+
+# 按 document_ids 过滤的检索计划：范围内向量不多时对过滤后的集合做精确扫描（走 document_id 索引，
+# 不碰 ANN 索引）；范围较大时按选择率放大 ANN 候选数再过滤，结果不足时由调用方逐步扩大
+def plan_search(
+    top_k: int,
+    scoped_rows: int,
+    total_rows: int,
+    ef_search: Optional[int] = None,
+) -> SearchPlan:
+    selectivity = scoped_rows / max(total_rows, scoped_rows, 1)
+    if scoped_rows <= settings.vector_planner_exact_max_rows:
+        return SearchPlan("exact", top_k, ef_search, scoped_rows, selectivity)
+
+    expected_fetch = top_k / selectivity
+    if expected_fetch > settings.vector_planner_max_fetch:
+        return SearchPlan("exact", top_k, ef_search, scoped_rows, selectivity)
+
+    fetch_k = min(
+        max(math.ceil(expected_fetch * settings.vector_planner_overfetch), top_k),
+        settings.vector_planner_max_fetch,
+    )
+    return SearchPlan(
+        "ann",
+        fetch_k,
+        min(max(ef_search or 0, fetch_k), MAX_EF_SEARCH),
+        scoped_rows,
+        selectivity,
+    )
+
+
+def widen_plan(plan: SearchPlan, top_k: int) -> SearchPlan:
+    if plan.strategy == "exact":
+        return plan
+    if plan.fetch_k >= settings.vector_planner_max_fetch:
+        return replace(plan, strategy="exact", fetch_k=top_k)
+
+    fetch_k = min(plan.fetch_k * 2, settings.vector_planner_max_fetch)
+    ef_search = min(max(plan.ef_search or 0, fetch_k), MAX_EF_SEARCH)
+    return replace(plan, fetch_k=fetch_k, ef_search=ef_search)
+
+
+# 结果不足 top_k 时是否扩大 ANN 候选：只有文档过滤裁掉了结果才值得扩大。
+# 带距离阈值时，若候选中最远的一条（horizon）已超出阈值，更大的候选集合只会多出更远的向量，不再扩大
+def needs_widening(
+    plan: Optional[SearchPlan],
+    found: int,
+    top_k: int,
+    horizon: Optional[float] = None,
+    max_distance: Optional[float] = None,
+) -> bool:
+    if plan is None or plan.strategy == "exact" or found >= top_k:
+        return False
+    return max_distance is None or horizon is None or horizon <= max_distance
+
+
+def max_distance_for(min_score: float) -> Optional[float]:
+    return 1 - min_score if min_score > 0 else None
+
+
+# 范围内向量数取自 document_stats（入库时维护），总数取表的 reltuples 估计值，都不扫描向量表
+def scope_stats_sql(schema: VectorSchema, document_ids: str) -> str:
+    return f"""
+        SELECT
+            (SELECT GREATEST(reltuples, 0)::bigint FROM pg_class
+             WHERE oid = '{schema.table}'::regclass) AS total_rows,
+            (SELECT COALESCE(SUM(vector_count), 0)::bigint FROM document_stats
+             WHERE document_id = ANY({document_ids})) AS scoped_rows
+    """
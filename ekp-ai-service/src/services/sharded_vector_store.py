@@ -0,0 +1,490 @@
+import argparse
+import asyncio
+import heapq
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from psycopg2.pool import ThreadedConnectionPool
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.models.document import Document, DocumentChunk
+from src.services.vector_codec import (
+    VectorLike,
+    as_matrix,
+    copy_binary_stream,
+    encode_int8,
+    encode_text,
+    from_pgvector_text,
+    to_pgvector_binary,
+    to_pgvector_text,
+)
+from src.services.text_search import AsyncTextSearch
+from src.services.vector_store import SearchResult
+
+
+# Jump 一致性哈希：分片数从 N 变为 N+1 时只有约 1/(N+1) 的文档需要迁移
+def shard_for(document_id: int, shard_count: int) -> int:
+    key = document_id & 0xFFFFFFFFFFFFFFFF
+    bucket, candidate = -1, 0
+    while candidate < shard_count:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return bucket
+
+
+def merge_top_k(result_lists: Iterable[List[SearchResult]], top_k: int) -> List[SearchResult]:
+    return heapq.nlargest(top_k, itertools.chain.from_iterable(result_lists), key=lambda r: r.score)
+
+
+SHARD_SEARCH_SQL = """
+    SELECT chunk_id, document_id, content, 1 - (embedding <=> %(embedding)s::vector) AS score
+    FROM document_vectors
+    ORDER BY embedding <=> %(embedding)s::vector
+    LIMIT %(limit)s
+"""
+
+# 分片上的文档过滤走物化 CTE 精确扫描，避免 ANN 索引后过滤导致结果不足
+SHARD_SEARCH_SCOPED_SQL = """
+    WITH scoped AS MATERIALIZED (
+        SELECT chunk_id, document_id, content, embedding
+        FROM document_vectors
+        WHERE document_id = ANY(%(document_ids)s)
+    )
+    SELECT chunk_id, document_id, content, 1 - (embedding <=> %(embedding)s::vector) AS score
+    FROM scoped
+    ORDER BY embedding <=> %(embedding)s::vector
+    LIMIT %(limit)s
+"""
+
+
+# 单个向量分片：独立的 Postgres 实例，document_vectors 自带分块文本且不依赖主库外键
+# （建表见 ekp-infra/init-db-shard）。方法与 MmapVectorIndex 一致，测试中可用后者代替
+class PostgresVectorShard:
+    def __init__(self, dsn: str, pool_size: Optional[int] = None):
+        self.dsn = dsn
+        self._pool = ThreadedConnectionPool(1, pool_size or settings.vector_shard_pool_size, dsn)
+
+    def _run(self, func):
+        conn = self._pool.getconn()
+        try:
+            with conn:
+                with conn.cursor() as cursor:
+                    return func(cursor)
+        finally:
+            self._pool.putconn(conn)
+
+    def add(
+        self,
+        document_id: int,
+        chunk_ids: Sequence[int],
+        contents: Sequence[str],
+        embeddings: np.ndarray,
+        document_title: Optional[str] = None,
+    ) -> int:
+        stream = copy_binary_stream(
+            (
+                encode_int8(document_id),
+                encode_int8(chunk_id),
+                encode_text(content),
+                to_pgvector_binary(embedding),
+            )
+            for chunk_id, content, embedding in zip(chunk_ids, contents, as_matrix(embeddings))
+        )
+
+        # 先删后写在同一事务内，重复入库或迁移重试都不会产生重复向量
+        def write(cursor) -> int:
+            cursor.execute("DELETE FROM document_vectors WHERE document_id = %s", (document_id,))
+            cursor.copy_expert(
+                "COPY document_vectors (document_id, chunk_id, content, embedding) "
+                "FROM STDIN WITH (FORMAT binary)",
+                stream,
+            )
+            return len(chunk_ids)
+
+        return self._run(write)
+
+    def remove_document(self, document_id: int) -> int:
+        def delete(cursor) -> int:
+            cursor.execute("DELETE FROM document_vectors WHERE document_id = %s", (document_id,))
+            return cursor.rowcount
+
+        return self._run(delete)
+
+    def search(
+        self,
+        query_embedding: VectorLike,
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+        min_score: float = 0.0,
+    ) -> List[SearchResult]:
+        params = {"embedding": to_pgvector_text(query_embedding), "limit": top_k}
+        query = SHARD_SEARCH_SQL
+        if document_ids:
+            params["document_ids"] = document_ids
+            query = SHARD_SEARCH_SCOPED_SQL
+        if min_score > 0:
+            params["min_score"] = min_score
+            query = f"SELECT * FROM ({query}) hits WHERE hits.score >= %(min_score)s"
+
+        def fetch(cursor) -> List[SearchResult]:
+            cursor.execute(query, params)
+            return [
+                SearchResult(
+                    chunk_id=row[0], document_id=row[1], content=row[2], score=float(row[3])
+                )
+                for row in cursor.fetchall()
+            ]
+
+        return self._run(fetch)
+
+    def search_many(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+    ) -> List[List[SearchResult]]:
+        return [self.search(query, top_k, document_ids) for query in as_matrix(query_embeddings)]
+
+    def document_vector_count(self, document_id: int) -> int:
+        def count(cursor) -> int:
+            cursor.execute(
+                "SELECT COUNT(*) FROM document_vectors WHERE document_id = %s", (document_id,)
+            )
+            return cursor.fetchone()[0]
+
+        return self._run(count)
+
+    def document_ids(self) -> List[int]:
+        def fetch(cursor) -> List[int]:
+            cursor.execute("SELECT DISTINCT document_id FROM document_vectors")
+            return [row[0] for row in cursor.fetchall()]
+
+        return self._run(fetch)
+
+    def export_document(self, document_id: int) -> Tuple[List[int], List[str], np.ndarray]:
+        def fetch(cursor):
+            cursor.execute(
+                "SELECT chunk_id, content, embedding::text FROM document_vectors "
+                "WHERE document_id = %s ORDER BY id",
+                (document_id,),
+            )
+            return cursor.fetchall()
+
+        rows = self._run(fetch)
+        embeddings = np.stack([from_pgvector_text(row[2]) for row in rows]) if rows else (
+            np.empty((0, settings.embedding_dimension), dtype=np.float32)
+        )
+        return [row[0] for row in rows], [row[1] for row in rows], embeddings
+
+    def get_embeddings(self, chunk_ids: List[int]) -> Dict[int, np.ndarray]:
+        def fetch(cursor):
+            cursor.execute(
+                "SELECT chunk_id, embedding::text FROM document_vectors WHERE chunk_id = ANY(%s)",
+                (list(chunk_ids),),
+            )
+            return cursor.fetchall()
+
+        return {row[0]: from_pgvector_text(row[1]) for row in self._run(fetch)}
+
+    def close(self) -> None:
+        self._pool.closeall()
+
+
+# 文档是否都已位于当前分片数下的归属分片。增减节点后、rebalance 完成前，部分文档仍在旧分片上，
+# 限定文档范围的检索需要扇出到所有分片。核对要扫描每个分片，由启动时的 watch 在线程里完成，
+# 检索路径只读取结果；未就位时按间隔重新核对，就位后分片数不变便不会再失配
+class ShardPlacement:
+    def __init__(self, shards: List):
+        self.shards = shards
+        self._settled = False
+
+    def is_settled(self) -> bool:
+        return self._settled
+
+    def check(self) -> bool:
+        try:
+            self._settled = not any(
+                shard_for(document_id, len(self.shards)) != index
+                for index, shard in enumerate(self.shards)
+                for document_id in shard.document_ids()
+            )
+        except Exception as e:
+            print(f"核对分片归属失败: {e}")
+        return self._settled
+
+    async def watch(self) -> None:
+        while not await asyncio.to_thread(self.check):
+            await asyncio.sleep(settings.vector_shard_placement_check_interval)
+        print("分片归属已就位，限定文档范围的检索只访问归属分片")
+
+    def mark_settled(self) -> None:
+        self._settled = True
+
+
+_shards: Optional[List[PostgresVectorShard]] = None
+_placement: Optional[ShardPlacement] = None
+_shards_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_vector_shards() -> List[PostgresVectorShard]:
+    global _shards, _placement
+    if _shards is None:
+        with _shards_lock:
+            if _shards is None:
+                urls = [url.strip() for url in settings.vector_shard_urls.split(",") if url.strip()]
+                if not urls:
+                    raise ValueError("分片模式需要配置 VECTOR_SHARD_URLS")
+                _placement = ShardPlacement([PostgresVectorShard(url) for url in urls])
+                _shards = _placement.shards
+    return _shards
+
+
+def get_shard_placement() -> ShardPlacement:
+    get_vector_shards()
+    return _placement
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _shards_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(4, len(settings.vector_shard_urls.split(",")) * 2),
+                    thread_name_prefix="vector-shard",
+                )
+    return _executor
+
+
+# 按 document_id 哈希把文档放到 N 个分片上：写入只发往所属分片，检索并发扇出后用堆合并 top-k，
+# 限定文档范围的检索在文档都已就位时只访问持有这些文档的分片
+class ShardedVectorStore:
+    # 各分片在自己的连接上提交，不随主库事务回滚
+    transactional = False
+
+    def __init__(self, db: Optional[Session] = None, shards: Optional[List] = None):
+        self.db = db
+        self.text_search = AsyncTextSearch()
+        if shards is None:
+            self.shards = get_vector_shards()
+            self.placement = get_shard_placement()
+        else:
+            self.shards = shards
+            self.placement = ShardPlacement(shards)
+
+    def shard_for(self, document_id: int) -> int:
+        return shard_for(document_id, len(self.shards))
+
+    def _target_shards(self, document_ids: Optional[List[int]]) -> List:
+        if not document_ids or not self.placement.is_settled():
+            return self.shards
+        owners = sorted({self.shard_for(document_id) for document_id in document_ids})
+        return [self.shards[i] for i in owners]
+
+    def _scatter(self, shards: List, method: str, *args) -> List:
+        if len(shards) == 1:
+            return [getattr(shards[0], method)(*args)]
+        futures = [_get_executor().submit(getattr(shard, method), *args) for shard in shards]
+        return [future.result() for future in futures]
+
+    async def _scatter_async(self, shards: List, method: str, *args) -> List:
+        return await asyncio.gather(
+            *(asyncio.to_thread(getattr(shard, method), *args) for shard in shards)
+        )
+
+    def add_vectors(
+        self,
+        document_id: int,
+        chunks: List[DocumentChunk],
+        embeddings: np.ndarray,
+        commit: bool = True,
+    ) -> int:
+        if len(chunks) != len(embeddings):
+            raise ValueError("chunks和embeddings数量不匹配")
+        if not chunks:
+            return 0
+
+        shard = self.shards[self.shard_for(document_id)]
+        try:
+            added = shard.add(
+                document_id,
+                [chunk.id for chunk in chunks],
+                [chunk.content for chunk in chunks],
+                embeddings,
+            )
+            if commit and self.db is not None:
+                self.db.commit()
+            return added
+        except Exception as e:
+            print(f"批量写入向量失败: {e}")
+            if self.db is not None:
+                self.db.rollback()
+            return 0
+
+    def search(
+        self,
+        query_embedding: VectorLike,
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        min_score: float = 0.0,
+    ) -> List[SearchResult]:
+        try:
+            partials = self._scatter(
+                self._target_shards(document_ids), "search", query_embedding, top_k, document_ids,
+                min_score,
+            )
+        except Exception as e:
+            print(f"向量搜索失败: {e}")
+            return []
+        return self._fill_titles(merge_top_k(partials, top_k))
+
+    async def search_async(
+        self,
+        query_embedding: VectorLike,
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        min_score: float = 0.0,
+    ) -> List[SearchResult]:
+        try:
+            partials = await self._scatter_async(
+                self._target_shards(document_ids), "search", query_embedding, top_k, document_ids,
+                min_score,
+            )
+        except Exception as e:
+            print(f"向量搜索失败: {e}")
+            return []
+        return await self._fill_titles_async(merge_top_k(partials, top_k))
+
+    def search_many(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+    ) -> List[List[SearchResult]]:
+        queries = as_matrix(query_embeddings)
+        try:
+            partials = self._scatter(
+                self._target_shards(document_ids), "search_many", queries, top_k, document_ids
+            )
+        except Exception as e:
+            print(f"批量向量搜索失败: {e}")
+            return [[] for _ in queries]
+
+        merged = [
+            merge_top_k((shard_results[i] for shard_results in partials), top_k)
+            for i in range(len(queries))
+        ]
+        self._fill_titles(list(itertools.chain.from_iterable(merged)))
+        return merged
+
+    def search_by_text(
+        self,
+        query: str,
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+    ) -> List[SearchResult]:
+        from src.services.embedding_service import EmbeddingService
+
+        query_embedding = EmbeddingService().embed_single_text(query)
+        if query_embedding is None:
+            return []
+        return self.search(query_embedding, top_k, document_ids)
+
+    # 文档可能还留在扩容前的分片上（尚未 rebalance），删除时发往所有分片
+    def delete_document_vectors(self, document_id: int) -> int:
+        try:
+            return sum(self._scatter(self.shards, "remove_document", document_id))
+        except Exception as e:
+            print(f"删除向量失败: {e}")
+            return 0
+
+    # 分片不在主库中，删除文档时的外键级联删不到分片上的向量，需要订阅删除事件自行清理
+    def on_document_removed(self, document_id: int) -> None:
+        self.delete_document_vectors(document_id)
+
+    def get_document_vector_count(self, document_id: int) -> int:
+        return self.shards[self.shard_for(document_id)].document_vector_count(document_id)
+
+    def get_embeddings(self, chunk_ids: List[int]) -> Dict[int, np.ndarray]:
+        if not chunk_ids:
+            return {}
+        try:
+            found = {}
+            for shard_embeddings in self._scatter(self.shards, "get_embeddings", chunk_ids):
+                found.update(shard_embeddings)
+            return found
+        except Exception as e:
+            print(f"读取分块向量失败: {e}")
+            return {}
+
+    def get_all_document_ids(self) -> List[int]:
+        partials = self._scatter(self.shards, "document_ids")
+        return sorted(set(itertools.chain.from_iterable(partials)))
+
+    def rebalance(self, dry_run: bool = False) -> Dict[str, int]:
+        moved, vectors = 0, 0
+        for index, shard in enumerate(self.shards):
+            for document_id in shard.document_ids():
+                owner = self.shard_for(document_id)
+                if owner == index:
+                    continue
+
+                chunk_ids, contents, embeddings = shard.export_document(document_id)
+                print(f"迁移文档 {document_id}: 分片 {index} -> {owner}, {len(chunk_ids)} 条向量")
+                if not dry_run:
+                    self.shards[owner].add(document_id, chunk_ids, contents, embeddings)
+                    shard.remove_document(document_id)
+                moved += 1
+                vectors += len(chunk_ids)
+
+        if not dry_run:
+            self.placement.mark_settled()
+
+        print(f"分片重平衡{'（预演）' if dry_run else ''}完成: 迁移 {moved} 篇文档, {vectors} 条向量")
+        return {"documents": moved, "vectors": vectors}
+
+    def _fill_titles(self, results: List[SearchResult]) -> List[SearchResult]:
+        if self.db is None or not results:
+            return results
+        document_ids = {r.document_id for r in results}
+        titles = dict(
+            self.db.query(Document.id, Document.title).filter(Document.id.in_(document_ids)).all()
+        )
+        for result in results:
+            result.document_title = titles.get(result.document_id)
+        return results
+
+    # 异步路径走 asyncpg 连接池读标题，不在线程里碰请求的同步 Session
+    async def _fill_titles_async(self, results: List[SearchResult]) -> List[SearchResult]:
+        if self.db is None or not results:
+            return results
+        titles = await self.text_search.load_titles({r.document_id for r in results})
+        for result in results:
+            result.document_title = titles.get(result.document_id)
+        return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="向量分片管理")
+    parser.add_argument("command", choices=["rebalance"])
+    parser.add_argument("--dry-run", action="store_true", help="只列出需要迁移的文档")
+    args = parser.parse_args()
+
+    if args.command == "rebalance":
+        ShardedVectorStore().rebalance(dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import asyncpg
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.config import settings
+from src.services.async_vector_store import VectorPool
+from src.services.vector_store import SearchResult
+
+# pg_trgm 的 word_similarity 按查询在分块中最相似的连续片段打分，中文按字三元组匹配；
+# 依赖 Flyway V4 在 document_chunks.content / documents.title 上建的 GIN 索引
+TRGM_CHUNK_SEARCH_SQL = """
+    SELECT dc.id, dc.document_id, dc.content, word_similarity($1, dc.content) AS score, d.title
+    FROM document_chunks dc
+    JOIN documents d ON d.id = dc.document_id
+    WHERE $1 <% dc.content
+      AND ($3::bigint[] IS NULL OR dc.document_id = ANY($3::bigint[]))
+    ORDER BY score DESC
+    LIMIT $2
+"""
+
+# 同一查询的 SQLAlchemy 版本，供同步检索路径在请求的 Session 上执行
+TRGM_CHUNK_SEARCH_SESSION_SQL = text("""
+    SELECT dc.id, dc.document_id, dc.content, word_similarity(:query, dc.content) AS score, d.title
+    FROM document_chunks dc
+    JOIN documents d ON d.id = dc.document_id
+    WHERE :query <% dc.content
+      AND (CAST(:document_ids AS bigint[]) IS NULL
+           OR dc.document_id = ANY(CAST(:document_ids AS bigint[])))
+    ORDER BY score DESC
+    LIMIT :limit
+""")
+
+TRGM_THRESHOLD_SESSION_SQL = text(
+    "SELECT set_config('pg_trgm.word_similarity_threshold', :threshold, true)"
+)
+
+TRGM_TITLE_SEARCH_SQL = """
+    SELECT id, word_similarity($1, title) AS score
+    FROM documents
+    WHERE status = 'COMPLETED'
+      AND $1 <% title
+      AND ($3::bigint[] IS NULL OR id = ANY($3::bigint[]))
+    ORDER BY score DESC
+    LIMIT $2
+"""
+
+CHUNKS_BY_ID_SQL = """
+    SELECT dc.id, dc.content, d.title
+    FROM document_chunks dc
+    JOIN documents d ON d.id = dc.document_id
+    WHERE dc.id = ANY($1::bigint[])
+"""
+
+DOCUMENT_TITLES_SQL = """
+    SELECT id, title FROM documents WHERE id = ANY($1::bigint[])
+"""
+
+# 命中分块及其同文档 chunk_index ± window 的相邻分块，一次查询取回；依赖 Flyway V5 的 (document_id, chunk_index) 索引
+NEIGHBOR_CHUNKS_SQL = """
+    SELECT DISTINCT dc.id, dc.document_id, dc.chunk_index, dc.content, dc.token_count
+    FROM document_chunks hit
+    JOIN document_chunks dc
+      ON dc.document_id = hit.document_id
+     AND dc.chunk_index BETWEEN hit.chunk_index - $2 AND hit.chunk_index + $2
+    WHERE hit.id = ANY($1::bigint[])
+"""
+
+
+# 关键词索引未启用时同步混合检索的关键词分支：阈值只在当前事务内生效
+def search_chunks_in_session(
+    db: Session,
+    query: str,
+    top_k: int = 5,
+    document_ids: Optional[List[int]] = None,
+) -> List[SearchResult]:
+    db.execute(TRGM_THRESHOLD_SESSION_SQL, {"threshold": str(settings.retrieval_trgm_threshold)})
+    rows = db.execute(
+        TRGM_CHUNK_SEARCH_SESSION_SQL,
+        {"query": query, "limit": top_k, "document_ids": document_ids},
+    ).all()
+    return [
+        SearchResult(
+            chunk_id=row.id,
+            document_id=row.document_id,
+            content=row.content,
+            score=float(row.score),
+            document_title=row.title,
+        )
+        for row in rows
+    ]
+
+
+# 检索分支里直接访问 Postgres 的文本查询，走 asyncpg 连接池，不占用请求的同步 Session
+class AsyncTextSearch:
+    def __init__(self, pool: Optional[asyncpg.Pool] = None):
+        self._pool = pool
+
+    async def _get_pool(self) -> asyncpg.Pool:
+        if self._pool is not None:
+            return self._pool
+        return await VectorPool.get_pool()
+
+    async def _fetch_trgm(self, sql: str, *args) -> List:
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                threshold = float(settings.retrieval_trgm_threshold)
+                await conn.execute(f"SET LOCAL pg_trgm.word_similarity_threshold = {threshold}")
+                return await conn.fetch(sql, *args)
+
+    async def search_chunks(
+        self,
+        query: str,
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+    ) -> List[SearchResult]:
+        rows = await self._fetch_trgm(TRGM_CHUNK_SEARCH_SQL, query, top_k, document_ids)
+        return [
+            SearchResult(
+                chunk_id=row["id"],
+                document_id=row["document_id"],
+                content=row["content"],
+                score=float(row["score"]),
+                document_title=row["title"],
+            )
+            for row in rows
+        ]
+
+    async def match_titles(
+        self,
+        query: str,
+        limit: int = 5,
+        document_ids: Optional[List[int]] = None,
+    ) -> List[int]:
+        rows = await self._fetch_trgm(TRGM_TITLE_SEARCH_SQL, query, limit, document_ids)
+        return [row["id"] for row in rows]
+
+    async def load_chunks(self, chunk_ids: Sequence[int]) -> Dict[int, Tuple[str, Optional[str]]]:
+        if not chunk_ids:
+            return {}
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(CHUNKS_BY_ID_SQL, list(chunk_ids))
+        return {row["id"]: (row["content"], row["title"]) for row in rows}
+
+    async def load_titles(self, document_ids: Iterable[int]) -> Dict[int, Optional[str]]:
+        document_ids = list(document_ids)
+        if not document_ids:
+            return {}
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(DOCUMENT_TITLES_SQL, document_ids)
+        return {row["id"]: row["title"] for row in rows}
+
+    async def load_neighbors(self, chunk_ids: Sequence[int], window: int = 1) -> List:
+        if not chunk_ids:
+            return []
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            return await conn.fetch(NEIGHBOR_CHUNKS_SQL, list(chunk_ids), window)
@@ -0,0 +1,89 @@
+import io
+import struct
+from functools import lru_cache
+from typing import Iterable, Optional, Sequence, Union
+
+import numpy as np
+
+VectorLike = Union[np.ndarray, Sequence[float]]
+
+_BINARY_HEADER = struct.Struct(">HH")
+_COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+_COPY_TRAILER = struct.pack(">h", -1)
+_INT8 = struct.Struct(">q")
+
+
+def as_vector(embedding: VectorLike) -> np.ndarray:
+    vector = np.ascontiguousarray(embedding, dtype=np.float32)
+    if vector.ndim != 1:
+        raise ValueError(f"向量应为一维，实际为 {vector.ndim} 维")
+    return vector
+
+
+def as_matrix(embeddings: Union[np.ndarray, Sequence[VectorLike]]) -> np.ndarray:
+    matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if matrix.ndim != 2:
+        raise ValueError(f"向量矩阵应为二维，实际为 {matrix.ndim} 维")
+    return matrix
+
+
+@lru_cache(maxsize=8)
+def _text_template(dimension: int) -> str:
+    return "[" + ",".join(["%.9g"] * dimension) + "]"
+
+
+# psycopg2 只能以文本发送参数：按维度缓存格式模板，一次 % 运算完成整条向量的格式化
+def to_pgvector_text(embedding: VectorLike) -> str:
+    vector = as_vector(embedding)
+    return _text_template(vector.shape[0]) % tuple(vector.tolist())
+
+
+def from_pgvector_text(value: str) -> np.ndarray:
+    return np.array(value[1:-1].split(","), dtype=np.float32)
+
+
+# pgvector 二进制格式：int16 维度 + int16 保留位 + 大端 float32 数组
+def to_pgvector_binary(embedding: VectorLike) -> bytes:
+    vector = as_vector(embedding)
+    return _BINARY_HEADER.pack(vector.shape[0], 0) + vector.astype(">f4").tobytes()
+
+
+def from_pgvector_binary(value: bytes) -> np.ndarray:
+    dimension, _ = _BINARY_HEADER.unpack_from(value)
+    return np.frombuffer(value, dtype=">f4", count=dimension, offset=4).astype(np.float32)
+
+
+# halfvec 二进制格式与 vector 相同，元素为大端 float16
+def to_halfvec_binary(embedding: VectorLike) -> bytes:
+    vector = as_vector(embedding)
+    return _BINARY_HEADER.pack(vector.shape[0], 0) + vector.astype(">f2").tobytes()
+
+
+def from_halfvec_binary(value: bytes) -> np.ndarray:
+    dimension, _ = _BINARY_HEADER.unpack_from(value)
+    return np.frombuffer(value, dtype=">f2", count=dimension, offset=4).astype(np.float32)
+
+
+def encode_int8(value: int) -> bytes:
+    return _INT8.pack(value)
+
+
+def encode_text(value: str) -> bytes:
+    return value.encode("utf-8")
+
+
+# 构造 COPY ... FROM STDIN WITH (FORMAT binary) 的数据流，每个字段需已编码为 bytes（None 表示 NULL）
+def copy_binary_stream(rows: Iterable[Sequence[Optional[bytes]]]) -> io.BytesIO:
+    buffer = io.BytesIO()
+    buffer.write(_COPY_SIGNATURE)
+    for row in rows:
+        buffer.write(struct.pack(">h", len(row)))
+        for field in row:
+            if field is None:
+                buffer.write(struct.pack(">i", -1))
+            else:
+                buffer.write(struct.pack(">i", len(field)))
+                buffer.write(field)
+    buffer.write(_COPY_TRAILER)
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,242 @@
+import math
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+
+import psycopg2
+from psycopg2 import sql
+
+from src.config import settings
+from src.services.vector_schema import VectorSchema, get_vector_schema
+
+INDEX_METHODS = ("hnsw", "ivfflat")
+
+
+@dataclass
+class VectorIndexInfo:
+    name: str
+    method: str
+    is_valid: bool
+    is_ready: bool
+    size_bytes: int
+    scans: int
+    definition: str
+
+
+def search_settings_sql(
+    ef_search: Optional[int] = None,
+    probes: Optional[int] = None,
+) -> Optional[str]:
+    ef_search = ef_search or settings.vector_search_ef_search
+    probes = probes or settings.vector_search_probes
+
+    statements = []
+    if ef_search:
+        statements.append(f"SET LOCAL hnsw.ef_search = {int(ef_search)}")
+    if probes:
+        statements.append(f"SET LOCAL ivfflat.probes = {int(probes)}")
+    return "; ".join(statements) if statements else None
+
+
+def default_ivfflat_lists(row_count: int) -> int:
+    if row_count <= 1_000_000:
+        return max(10, row_count // 1000)
+    return int(math.sqrt(row_count))
+
+
+# 当前存储模式下向量表（document_vectors / document_vectors_half）上 ANN 索引的创建 / 重建 / 删除与状态查询。
+# CONCURRENTLY 操作不能放在事务中，因此使用独立的 autocommit 连接
+class VectorIndexService:
+    COLUMN = "embedding"
+
+    def __init__(self, database_url: Optional[str] = None, schema: Optional[VectorSchema] = None):
+        self.database_url = database_url or settings.database_url
+        schema = schema or get_vector_schema()
+        self.table = schema.table
+        self.opclass = schema.opclass
+
+    def _connect(self):
+        conn = psycopg2.connect(self.database_url)
+        conn.autocommit = True
+        return conn
+
+    def default_index_name(self, method: str) -> str:
+        return f"idx_{self.table}_{self.COLUMN}_{method}"
+
+    def build_create_sql(
+        self,
+        method: str,
+        name: str,
+        m: Optional[int] = None,
+        ef_construction: Optional[int] = None,
+        lists: Optional[int] = None,
+    ) -> sql.Composed:
+        if method == "hnsw":
+            options = sql.SQL("m = {}, ef_construction = {}").format(
+                sql.Literal(int(m or settings.hnsw_m)),
+                sql.Literal(int(ef_construction or settings.hnsw_ef_construction)),
+            )
+        elif method == "ivfflat":
+            options = sql.SQL("lists = {}").format(sql.Literal(int(lists)))
+        else:
+            raise ValueError(f"不支持的索引类型: {method}，可选: {', '.join(INDEX_METHODS)}")
+
+        return sql.SQL(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} "
+            "USING {method} ({column} {opclass}) WITH ({options})"
+        ).format(
+            name=sql.Identifier(name),
+            table=sql.Identifier(self.table),
+            method=sql.SQL(method),
+            column=sql.Identifier(self.COLUMN),
+            opclass=sql.SQL(self.opclass),
+            options=options,
+        )
+
+    def create_index(
+        self,
+        method: str = None,
+        name: Optional[str] = None,
+        m: Optional[int] = None,
+        ef_construction: Optional[int] = None,
+        lists: Optional[int] = None,
+    ) -> str:
+        method = method or settings.vector_index_method
+        name = name or self.default_index_name(method)
+
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            if method == "ivfflat" and not lists:
+                lists = default_ivfflat_lists(self._estimate_rows(cursor))
+            cursor.execute(
+                sql.SQL("SET maintenance_work_mem = {}").format(
+                    sql.Literal(settings.vector_index_maintenance_work_mem)
+                )
+            )
+            print(f"开始创建向量索引 {name} ({method})")
+            cursor.execute(self.build_create_sql(method, name, m, ef_construction, lists))
+            print(f"向量索引 {name} 创建完成")
+            return name
+        finally:
+            cursor.close()
+            conn.close()
+
+    def rebuild_index(self, name: str) -> None:
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            print(f"开始重建向量索引 {name}")
+            cursor.execute(
+                sql.SQL("SET maintenance_work_mem = {}").format(
+                    sql.Literal(settings.vector_index_maintenance_work_mem)
+                )
+            )
+            cursor.execute(sql.SQL("REINDEX INDEX CONCURRENTLY {}").format(sql.Identifier(name)))
+            print(f"向量索引 {name} 重建完成")
+        finally:
+            cursor.close()
+            conn.close()
+
+    def drop_index(self, name: str) -> None:
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(sql.Identifier(name))
+            )
+        finally:
+            cursor.close()
+            conn.close()
+
+    def list_indexes(self) -> List[VectorIndexInfo]:
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT
+                    c.relname,
+                    am.amname,
+                    i.indisvalid,
+                    i.indisready,
+                    pg_relation_size(c.oid),
+                    COALESCE(s.idx_scan, 0),
+                    pg_get_indexdef(c.oid)
+                FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indexrelid
+                JOIN pg_class t ON t.oid = i.indrelid
+                JOIN pg_am am ON am.oid = c.relam
+                LEFT JOIN pg_stat_user_indexes s ON s.indexrelid = i.indexrelid
+                WHERE t.relname = %s AND am.amname = ANY(%s)
+                ORDER BY c.relname
+            """, (self.table, list(INDEX_METHODS)))
+            return [
+                VectorIndexInfo(
+                    name=row[0],
+                    method=row[1],
+                    is_valid=row[2],
+                    is_ready=row[3],
+                    size_bytes=row[4],
+                    scans=row[5],
+                    definition=row[6],
+                )
+                for row in cursor.fetchall()
+            ]
+        finally:
+            cursor.close()
+            conn.close()
+
+    def status(self) -> Dict:
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            row_estimate = self._estimate_rows(cursor)
+            cursor.execute("""
+                SELECT
+                    p.pid,
+                    c.relname,
+                    p.command,
+                    p.phase,
+                    p.blocks_done,
+                    p.blocks_total,
+                    p.tuples_done,
+                    p.tuples_total
+                FROM pg_stat_progress_create_index p
+                LEFT JOIN pg_class c ON c.oid = p.index_relid
+                WHERE p.relid = %s::regclass
+            """, (self.table,))
+            builds = [
+                {
+                    "pid": row[0],
+                    "index_name": row[1],
+                    "command": row[2],
+                    "phase": row[3],
+                    "blocks_done": row[4],
+                    "blocks_total": row[5],
+                    "tuples_done": row[6],
+                    "tuples_total": row[7],
+                }
+                for row in cursor.fetchall()
+            ]
+        finally:
+            cursor.close()
+            conn.close()
+
+        return {
+            "table": self.table,
+            "row_estimate": row_estimate,
+            "indexes": [asdict(index) for index in self.list_indexes()],
+            "builds": builds,
+        }
+
+    def ensure_default_index(self) -> Optional[str]:
+        if any(index.is_valid for index in self.list_indexes()):
+            return None
+        return self.create_index()
+
+    def _estimate_rows(self, cursor) -> int:
+        cursor.execute(
+            "SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = %s::regclass",
+            (self.table,),
+        )
+        row = cursor.fetchone()
+        return int(row[0]) if row else 0
@@ -0,0 +1,175 @@
+from typing import Optional
+
+import numpy as np
+
+from src.services.vector_codec import as_matrix, as_vector
+
+QUANTIZATION_KINDS = ("pq", "sq8")
+
+
+def kmeans(
+    data: np.ndarray,
+    clusters: int,
+    iterations: int = 15,
+    seed: int = 0,
+) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    clusters = min(clusters, len(data))
+    centroids = data[rng.choice(len(data), clusters, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments = _nearest(data, centroids)
+        counts = np.bincount(assignments, minlength=clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, data)
+
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+    return centroids
+
+
+def _nearest(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    distances = (centroids ** 2).sum(axis=1)[None, :] - 2 * data @ centroids.T
+    return distances.argmin(axis=1)
+
+
+# 乘积量化：把向量切成 subspaces 段，每段用 256 个中心点编码成 1 字节。
+# 检索时先算查询与每段中心点的内积查找表 (ADC)，再按编码查表求和得到近似分数
+class ProductQuantizer:
+    kind = "pq"
+
+    def __init__(self, dimension: int, subspaces: int = 128, centroids: int = 256):
+        if dimension % subspaces != 0:
+            raise ValueError(f"向量维度 {dimension} 不能被子空间数 {subspaces} 整除")
+        if centroids > 256:
+            raise ValueError("每个子空间最多 256 个中心点")
+        self.dimension = dimension
+        self.subspaces = subspaces
+        self.centroids = centroids
+        self.sub_dimension = dimension // subspaces
+        self.codebooks: Optional[np.ndarray] = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.codebooks is not None
+
+    @property
+    def code_size(self) -> int:
+        return self.subspaces
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        return vectors.reshape(len(vectors), self.subspaces, self.sub_dimension)
+
+    def train(self, sample: np.ndarray, iterations: int = 15) -> None:
+        parts = self._split(as_matrix(sample))
+        self.codebooks = np.stack([
+            kmeans(np.ascontiguousarray(parts[:, j]), self.centroids, iterations, seed=j)
+            for j in range(self.subspaces)
+        ]).astype(np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        parts = self._split(as_matrix(vectors))
+        codes = np.empty((len(parts), self.subspaces), dtype=np.uint8)
+        for j in range(self.subspaces):
+            codes[:, j] = _nearest(parts[:, j], self.codebooks[j])
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        parts = self.codebooks[np.arange(self.subspaces), codes]
+        return parts.reshape(len(codes), self.dimension)
+
+    def scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        query_parts = as_vector(query).reshape(self.subspaces, self.sub_dimension)
+        table = np.einsum("jcd,jd->jc", self.codebooks, query_parts)
+        columns = codes.T
+        scores = np.zeros(len(codes), dtype=np.float32)
+        for j in range(self.subspaces):
+            scores += table[j].take(columns[j])
+        return scores
+
+    def save(self, path: str) -> None:
+        np.savez(path, kind=self.kind, codebooks=self.codebooks)
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "ProductQuantizer":
+        codebooks = arrays["codebooks"]
+        subspaces, centroids, sub_dimension = codebooks.shape
+        quantizer = cls(subspaces * sub_dimension, subspaces, centroids)
+        quantizer.codebooks = codebooks
+        return quantizer
+
+
+# int8 标量量化：每一维按训练样本的最小值 / 跨度线性映射到 [-128, 127]，压缩 4 倍
+class ScalarQuantizer:
+    kind = "sq8"
+    SCORE_BLOCK = 256
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self.offset: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.scale is not None
+
+    @property
+    def code_size(self) -> int:
+        return self.dimension
+
+    def train(self, sample: np.ndarray, iterations: int = 0) -> None:
+        sample = as_matrix(sample)
+        low, high = sample.min(axis=0), sample.max(axis=0)
+        self.scale = np.maximum((high - low) / 255.0, 1e-12).astype(np.float32)
+        self.offset = (low + 128.0 * self.scale).astype(np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint((as_matrix(vectors) - self.offset) / self.scale)
+        return np.clip(codes, -128, 127).astype(np.int8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32) * self.scale + self.offset
+
+    # 每次只把 SCORE_BLOCK 行编码转成 float32（约 1MB，留在缓存内）再做矩阵向量乘，
+    # 避免整个编码矩阵上转换成 4 倍大小的临时数组
+    def scores(self, query: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        query = as_vector(query)
+        weights = (query * self.scale).astype(np.float32)
+        scores = np.empty(len(codes), dtype=np.float32)
+        block = np.empty((min(self.SCORE_BLOCK, len(codes)), self.dimension), dtype=np.float32)
+        for start in range(0, len(codes), self.SCORE_BLOCK):
+            part = codes[start:start + self.SCORE_BLOCK]
+            buffer = block[:len(part)]
+            np.copyto(buffer, part, casting="unsafe")
+            np.dot(buffer, weights, out=scores[start:start + len(part)])
+        return scores + float(self.offset @ query)
+
+    def save(self, path: str) -> None:
+        np.savez(path, kind=self.kind, offset=self.offset, scale=self.scale)
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "ScalarQuantizer":
+        quantizer = cls(len(arrays["scale"]))
+        quantizer.offset = arrays["offset"]
+        quantizer.scale = arrays["scale"]
+        return quantizer
+
+
+def create_quantizer(kind: str, dimension: int, subspaces: int = 128):
+    if kind == "pq":
+        return ProductQuantizer(dimension, subspaces)
+    if kind == "sq8":
+        return ScalarQuantizer(dimension)
+    raise ValueError(f"不支持的量化方式: {kind}，可选: {', '.join(QUANTIZATION_KINDS)}")
+
+
+def load_quantizer(path: str):
+    with np.load(path) as arrays:
+        kind = str(arrays["kind"])
+        if kind == "pq":
+            return ProductQuantizer.from_arrays(arrays)
+        if kind == "sq8":
+            return ScalarQuantizer.from_arrays(arrays)
+    raise ValueError(f"不支持的量化方式: {kind}")
@@ -0,0 +1,334 @@
+import asyncio
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Set
+
+import numpy as np
+
+from src.config import settings
+from src.services.corpus_events import DocumentIndexedEvent, corpus_events
+from src.services.search_planner import max_distance_for
+from src.services.vector_codec import VectorLike, as_matrix, as_vector
+from src.services.vector_schema import VectorSchema, get_vector_schema
+from src.services.vector_store import SearchResult
+
+
+def replica_rows_sql(schema: VectorSchema) -> str:
+    if schema.has_content:
+        content, join = "dv.content", ""
+    else:
+        content, join = "dc.content", "JOIN document_chunks dc ON dc.id = dv.chunk_id"
+    return f"""
+        SELECT dv.id, dv.document_id, dv.chunk_id, {content} AS content, dv.embedding, d.title
+        FROM {schema.table} dv
+        {join}
+        LEFT JOIN documents d ON dv.document_id = d.id
+        WHERE dv.id > $1
+        ORDER BY dv.id
+    """
+
+
+# 只核对副本中已有的文档，按 document_stats 主键查找；文档删除或分块清空时统计行随之删除
+LIVE_DOCUMENTS_SQL = """
+    SELECT document_id FROM document_stats WHERE document_id = ANY($1::bigint[])
+"""
+
+
+# document_vectors 的进程内 HNSW 副本（hnswlib）：启动时全量构建，之后通过
+# 语料事件和按 id 水位的轮询增量同步。Postgres 仍是唯一数据源，副本不可用时回退到数据库检索
+class VectorReplica:
+    def __init__(self, dimension: Optional[int] = None):
+        self.dimension = dimension or settings.embedding_dimension
+        self._lock = threading.RLock()
+        self._index = None
+        self._chunks: Dict[int, tuple] = {}
+        self._document_chunks: Dict[int, Set[int]] = {}
+        self._titles: Dict[int, Optional[str]] = {}
+        self._max_vector_id = 0
+        self._last_synced_at: Optional[float] = None
+        self._ready = False
+        self._sync_task: Optional[asyncio.Task] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def _ensure_index(self, extra: int) -> bool:
+        if self._index is None:
+            try:
+                import hnswlib
+            except ImportError:
+                print("未安装 hnswlib，进程内向量副本不可用")
+                return False
+
+            self._index = hnswlib.Index(space="cosine", dim=self.dimension)
+            self._index.init_index(
+                max_elements=max(settings.vector_replica_initial_capacity, extra),
+                ef_construction=settings.hnsw_ef_construction,
+                M=settings.hnsw_m,
+                allow_replace_deleted=True,
+            )
+            return True
+
+        needed = self._index.get_current_count() + extra
+        if needed > self._index.get_max_elements():
+            self._index.resize_index(max(needed, self._index.get_max_elements() * 2))
+        return True
+
+    def add(
+        self,
+        chunk_ids: Sequence[int],
+        document_ids: Sequence[int],
+        contents: Sequence[str],
+        embeddings: np.ndarray,
+        titles: Optional[Dict[int, Optional[str]]] = None,
+    ) -> int:
+        embeddings = as_matrix(embeddings)
+        with self._lock:
+            keep = [i for i, chunk_id in enumerate(chunk_ids) if chunk_id not in self._chunks]
+            if not keep or not self._ensure_index(len(keep)):
+                return 0
+
+            labels = np.array([chunk_ids[i] for i in keep], dtype=np.int64)
+            self._index.add_items(embeddings[keep], labels, replace_deleted=True)
+            for i in keep:
+                self._chunks[chunk_ids[i]] = (document_ids[i], contents[i])
+                self._document_chunks.setdefault(document_ids[i], set()).add(chunk_ids[i])
+            if titles:
+                self._titles.update(titles)
+            return len(keep)
+
+    def remove_document(self, document_id: int) -> int:
+        with self._lock:
+            chunk_ids = self._document_chunks.pop(document_id, set())
+            for chunk_id in chunk_ids:
+                self._index.mark_deleted(chunk_id)
+                self._chunks.pop(chunk_id, None)
+            self._titles.pop(document_id, None)
+            return len(chunk_ids)
+
+    def search(
+        self,
+        query_embedding: VectorLike,
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+        ef_search: Optional[int] = None,
+        min_score: float = 0.0,
+    ) -> Optional[List[SearchResult]]:
+        vector = as_vector(query_embedding)
+        with self._lock:
+            if self._index is None:
+                return None
+
+            query_filter = None
+            candidates = len(self._chunks)
+            if document_ids:
+                scope = set(document_ids)
+                candidates = sum(len(self._document_chunks.get(d, ())) for d in scope)
+                chunks = self._chunks
+
+                def in_scope(label: int) -> bool:
+                    return chunks[label][0] in scope
+
+                query_filter = in_scope
+
+            k = min(top_k, candidates)
+            if k <= 0:
+                return []
+
+            self._index.set_ef(max(ef_search or settings.vector_search_ef_search or 40, k))
+            try:
+                labels, distances = self._index.knn_query(
+                    vector, k=k, num_threads=1, filter=query_filter
+                )
+            except RuntimeError as e:
+                print(f"向量副本检索失败，回退到数据库: {e}")
+                return None
+
+            return self._to_results(labels[0], distances[0], max_distance_for(min_score))
+
+    def search_many(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+        ef_search: Optional[int] = None,
+    ) -> Optional[List[List[SearchResult]]]:
+        queries = as_matrix(query_embeddings)
+        with self._lock:
+            if self._index is None:
+                return None
+
+            query_filter = None
+            candidates = len(self._chunks)
+            if document_ids:
+                scope = set(document_ids)
+                candidates = sum(len(self._document_chunks.get(d, ())) for d in scope)
+                chunks = self._chunks
+
+                def in_scope(label: int) -> bool:
+                    return chunks[label][0] in scope
+
+                query_filter = in_scope
+
+            k = min(top_k, candidates)
+            if k <= 0 or len(queries) == 0:
+                return [[] for _ in queries]
+
+            self._index.set_ef(max(ef_search or settings.vector_search_ef_search or 40, k))
+            try:
+                labels, distances = self._index.knn_query(
+                    queries, k=k, num_threads=1, filter=query_filter
+                )
+            except RuntimeError as e:
+                print(f"向量副本检索失败，回退到数据库: {e}")
+                return None
+
+            return [
+                self._to_results(query_labels, query_distances)
+                for query_labels, query_distances in zip(labels, distances)
+            ]
+
+    # hnswlib 的 cosine 空间存的是归一化后的向量
+    def get_embeddings(self, chunk_ids: List[int]) -> Dict[int, np.ndarray]:
+        with self._lock:
+            labels = [chunk_id for chunk_id in chunk_ids if chunk_id in self._chunks]
+            if self._index is None or not labels:
+                return {}
+            vectors = np.asarray(self._index.get_items(labels), dtype=np.float32)
+            return dict(zip(labels, vectors))
+
+    # knn_query 按距离升序返回，超出阈值的尾部直接截掉，不构造结果
+    def _to_results(
+        self,
+        labels: np.ndarray,
+        distances: np.ndarray,
+        max_distance: Optional[float] = None,
+    ) -> List[SearchResult]:
+        if max_distance is not None:
+            keep = int(np.searchsorted(distances, max_distance, side="right"))
+            labels, distances = labels[:keep], distances[:keep]
+        results = []
+        for label, distance in zip(labels, distances):
+            document_id, content = self._chunks[int(label)]
+            results.append(
+                SearchResult(
+                    chunk_id=int(label),
+                    document_id=document_id,
+                    content=content,
+                    score=float(1 - distance),
+                    document_title=self._titles.get(document_id),
+                )
+            )
+        return results
+
+    def on_document_indexed(self, event: DocumentIndexedEvent) -> None:
+        if self._index is None:
+            return
+        self.remove_document(event.document_id)
+        self.add(
+            event.chunk_ids,
+            [event.document_id] * len(event.chunk_ids),
+            event.contents,
+            event.embeddings,
+            titles={event.document_id: event.document_title},
+        )
+
+    def on_document_removed(self, document_id: int) -> None:
+        if self._index is None:
+            return
+        self.remove_document(document_id)
+
+    async def sync(self, pool) -> int:
+        schema = get_vector_schema()
+        added = 0
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                batch: List = []
+                async for row in conn.cursor(replica_rows_sql(schema), self._max_vector_id):
+                    batch.append(row)
+                    if len(batch) >= settings.vector_replica_batch_size:
+                        added += await asyncio.to_thread(self._apply_rows, batch)
+                        batch = []
+                if batch:
+                    added += await asyncio.to_thread(self._apply_rows, batch)
+
+            with self._lock:
+                held = list(self._document_chunks)
+            live_documents = set()
+            if held:
+                live_documents = {
+                    row["document_id"] for row in await conn.fetch(LIVE_DOCUMENTS_SQL, held)
+                }
+
+        stale = [d for d in held if d not in live_documents]
+        for document_id in stale:
+            self.remove_document(document_id)
+
+        self._last_synced_at = time.time()
+        # 空表启动时索引要等到首次同步到数据才建立，此后才可对外服务
+        self._ready = self._index is not None
+        return added
+
+    def _apply_rows(self, rows: List) -> int:
+        added = self.add(
+            [row["chunk_id"] for row in rows],
+            [row["document_id"] for row in rows],
+            [row["content"] for row in rows],
+            np.stack([row["embedding"] for row in rows]),
+            titles={row["document_id"]: row["title"] for row in rows},
+        )
+        with self._lock:
+            self._max_vector_id = max(self._max_vector_id, rows[-1]["id"])
+        return added
+
+    async def start(self, pool) -> None:
+        corpus_events.subscribe(self)
+        started = time.time()
+        try:
+            await self.sync(pool)
+        except Exception as e:
+            print(f"向量副本构建失败: {e}")
+            return
+
+        print(f"向量副本构建完成: {len(self)} 条向量, 耗时 {time.time() - started:.1f}s")
+        self._sync_task = asyncio.create_task(self._sync_loop(pool))
+
+    async def _sync_loop(self, pool) -> None:
+        while True:
+            await asyncio.sleep(settings.vector_replica_sync_interval)
+            try:
+                await self.sync(pool)
+            except Exception as e:
+                print(f"向量副本增量同步失败: {e}")
+
+    async def stop(self) -> None:
+        corpus_events.unsubscribe(self)
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            try:
+                await self._sync_task
+            except asyncio.CancelledError:
+                pass
+            self._sync_task = None
+        self._ready = False
+
+    def status(self) -> Dict:
+        staleness = None
+        if self._last_synced_at is not None:
+            staleness = round(time.time() - self._last_synced_at, 3)
+        return {
+            "enabled": settings.vector_replica_enabled,
+            "ready": self._ready,
+            "vectors": len(self._chunks),
+            "documents": len(self._document_chunks),
+            "max_vector_id": self._max_vector_id,
+            "last_synced_at": self._last_synced_at,
+            "staleness_seconds": staleness,
+        }
+
+
+vector_replica = VectorReplica()
@@ -0,0 +1,217 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from src.config import settings
+from src.services.vector_codec import (
+    VectorLike,
+    to_halfvec_binary,
+    to_pgvector_binary,
+)
+
+STORAGE_MODES = ("full", "compact")
+
+
+@dataclass(frozen=True)
+class VectorSchema:
+    mode: str
+    table: str
+    vector_type: str
+    opclass: str
+    has_content: bool
+
+    def encode_binary(self, embedding: VectorLike) -> bytes:
+        if self.vector_type == "halfvec":
+            return to_halfvec_binary(embedding)
+        return to_pgvector_binary(embedding)
+
+
+# full: document_vectors，float32 向量并冗余保存分块文本；
+# compact: document_vectors_half，halfvec 向量且不存文本，只为最终 top-k 从 document_chunks 取内容
+FULL_SCHEMA = VectorSchema("full", "document_vectors", "vector", "vector_cosine_ops", True)
+COMPACT_SCHEMA = VectorSchema(
+    "compact", "document_vectors_half", "halfvec", "halfvec_cosine_ops", False
+)
+
+
+def get_vector_schema(mode: Optional[str] = None) -> VectorSchema:
+    mode = mode or settings.vector_storage_mode
+    if mode == "full":
+        return FULL_SCHEMA
+    if mode == "compact":
+        return COMPACT_SCHEMA
+    raise ValueError(f"不支持的向量存储模式: {mode}，可选: {', '.join(STORAGE_MODES)}")
+
+
+def _columns(schema: VectorSchema, vector: str) -> str:
+    selected = "dv.chunk_id, dv.document_id, dv.content" if schema.has_content else (
+        "dv.chunk_id, dv.document_id"
+    )
+    return f"{selected}, dv.embedding <=> {vector} AS distance"
+
+
+def _nearest_sql(
+    schema: VectorSchema,
+    vector: str,
+    limit: str,
+    document_ids: Optional[str],
+    strategy: str,
+    fetch_limit: Optional[str],
+    max_distance: Optional[str] = None,
+) -> str:
+    columns = _columns(schema, vector)
+
+    # 距离上界放在 ANN 子查询外层过滤，不改变索引扫描计划，只是不再返回阈值以外的行
+    if not document_ids:
+        nearest = f"""
+            SELECT {columns}
+            FROM {schema.table} dv
+            ORDER BY dv.embedding <=> {vector}
+            LIMIT {limit}
+        """
+        if max_distance is None:
+            return nearest
+        return f"""
+            SELECT * FROM ({nearest}) candidates
+            WHERE candidates.distance <= {max_distance}
+        """
+    if strategy == "exact":
+        bound = f"WHERE dv.embedding <=> {vector} <= {max_distance}" if max_distance else ""
+        return f"""
+            SELECT {columns}
+            FROM scoped dv
+            {bound}
+            ORDER BY distance
+            LIMIT {limit}
+        """
+    return f"""
+        SELECT * FROM (
+            SELECT {columns}
+            FROM {schema.table} dv
+            ORDER BY dv.embedding <=> {vector}
+            LIMIT {fetch_limit or limit}
+        ) candidates
+        WHERE candidates.document_id = ANY({document_ids})
+        ORDER BY candidates.distance
+        LIMIT {limit}
+    """
+
+
+# 带阈值的 ann 范围检索：horizon 为未经过滤的候选集合中最远的距离，调用方据此判断结果不足是
+# 文档过滤还是阈值造成的。horizon 单独聚合后 LEFT JOIN 过滤结果，阈值裁掉全部候选时仍返回一行
+# 只带 horizon 的结果（chunk_id 为 NULL），由调用方丢弃
+def _bounded_scoped_sql(
+    schema: VectorSchema,
+    vector: str,
+    limit: str,
+    document_ids: str,
+    fetch_limit: Optional[str],
+    max_distance: str,
+) -> str:
+    content, join = _content_join(schema)
+    return f"""
+        WITH fetched AS MATERIALIZED (
+            SELECT {_columns(schema, vector)}
+            FROM {schema.table} dv
+            ORDER BY dv.embedding <=> {vector}
+            LIMIT {fetch_limit or limit}
+        )
+        SELECT
+            nearest.chunk_id,
+            nearest.document_id,
+            {content},
+            1 - nearest.distance AS score,
+            d.title AS document_title,
+            bounds.horizon
+        FROM (SELECT MAX(distance) AS horizon FROM fetched) bounds
+        LEFT JOIN (
+            SELECT * FROM fetched
+            WHERE fetched.document_id = ANY({document_ids})
+              AND fetched.distance <= {max_distance}
+            ORDER BY fetched.distance
+            LIMIT {limit}
+        ) nearest ON true
+        {"LEFT " + join if join else ""}
+        LEFT JOIN documents d ON d.id = nearest.document_id
+        ORDER BY nearest.distance
+    """
+
+
+def _scope_cte(schema: VectorSchema, document_ids: Optional[str], strategy: str) -> str:
+    if not document_ids or strategy != "exact":
+        return ""
+    content = ", content" if schema.has_content else ""
+    return f"""
+        WITH scoped AS MATERIALIZED (
+            SELECT chunk_id, document_id, embedding{content}
+            FROM {schema.table}
+            WHERE document_id = ANY({document_ids})
+        )
+    """
+
+
+def _content_join(schema: VectorSchema):
+    if schema.has_content:
+        return "nearest.content", ""
+    return "dc.content", "JOIN document_chunks dc ON dc.id = nearest.chunk_id"
+
+
+# 生成向量检索 SQL，占位符由调用方给出（psycopg2 用 %(name)s，asyncpg 用 $n）。
+# strategy 为 exact 时在物化的过滤结果上精确排序；为 ann 时先取 ANN 前 fetch_limit 条再按文档过滤。
+# 给出 max_distance（1 - min_score）时在 SQL 中按距离过滤，阈值以下的分块不回传
+def build_search_sql(
+    schema: VectorSchema,
+    embedding: str,
+    limit: str,
+    document_ids: Optional[str] = None,
+    strategy: str = "ann",
+    fetch_limit: Optional[str] = None,
+    max_distance: Optional[str] = None,
+) -> str:
+    vector = f"{embedding}::{schema.vector_type}"
+    if document_ids and strategy != "exact" and max_distance:
+        return _bounded_scoped_sql(schema, vector, limit, document_ids, fetch_limit, max_distance)
+
+    nearest = _nearest_sql(schema, vector, limit, document_ids, strategy, fetch_limit, max_distance)
+    content, join = _content_join(schema)
+    return f"""
+        {_scope_cte(schema, document_ids, strategy)}
+        SELECT
+            nearest.chunk_id,
+            nearest.document_id,
+            {content},
+            1 - nearest.distance AS score,
+            d.title AS document_title
+        FROM ({nearest}) nearest
+        {join}
+        LEFT JOIN documents d ON d.id = nearest.document_id
+        ORDER BY nearest.distance
+    """
+
+
+# 一条语句完成多条查询：unnest 查询向量数组，对每条查询向量 LATERAL 执行与单条检索相同的子查询
+def build_batch_search_sql(
+    schema: VectorSchema,
+    embeddings: str,
+    limit: str,
+    document_ids: Optional[str] = None,
+    strategy: str = "ann",
+    fetch_limit: Optional[str] = None,
+) -> str:
+    nearest = _nearest_sql(schema, "q.embedding", limit, document_ids, strategy, fetch_limit)
+    content, join = _content_join(schema)
+    queries = f"unnest({embeddings}::{schema.vector_type}[]) WITH ORDINALITY"
+    return f"""
+        {_scope_cte(schema, document_ids, strategy)}
+        SELECT
+            q.query_index - 1 AS query_index,
+            nearest.chunk_id,
+            nearest.document_id,
+            {content},
+            1 - nearest.distance AS score,
+            d.title AS document_title
+        FROM {queries} AS q(embedding, query_index)
+        CROSS JOIN LATERAL ({nearest}) nearest
+        {join}
+        LEFT JOIN documents d ON d.id = nearest.document_id
+        ORDER BY q.query_index, nearest.distance
+    """
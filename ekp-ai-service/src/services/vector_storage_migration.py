@@ -0,0 +1,128 @@
+import argparse
+import time
+from typing import Dict, Optional, Tuple
+
+import psycopg2
+
+from src.config import settings
+from src.services.vector_schema import COMPACT_SCHEMA, FULL_SCHEMA
+
+COPY_BATCH_SQL = f"""
+    WITH batch AS (
+        SELECT id, document_id, chunk_id, embedding, created_at
+        FROM {FULL_SCHEMA.table}
+        WHERE id > %s
+        ORDER BY id
+        LIMIT %s
+    ), inserted AS (
+        INSERT INTO {COMPACT_SCHEMA.table} (document_id, chunk_id, embedding, created_at)
+        SELECT document_id, chunk_id, embedding::halfvec, created_at FROM batch
+        ON CONFLICT (chunk_id) DO NOTHING
+        RETURNING 1
+    )
+    SELECT (SELECT max(id) FROM batch), (SELECT count(*) FROM inserted)
+"""
+
+
+# 把 document_vectors 在线迁移到 compact 存储（document_vectors_half）：按 id 水位分批复制，
+# 每批独立提交，不长时间持锁；重复执行是幂等的，切换 VECTOR_STORAGE_MODE 后再跑一次即可补齐期间写入的数据
+class VectorStorageMigrator:
+    def __init__(self, database_url: Optional[str] = None):
+        self.database_url = database_url or settings.database_url
+
+    def _connect(self):
+        return psycopg2.connect(self.database_url)
+
+    @staticmethod
+    def copy_batch(conn, after_id: int, batch_size: int) -> Tuple[Optional[int], int]:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(COPY_BATCH_SQL, (after_id, batch_size))
+            last_id, copied = cursor.fetchone()
+            conn.commit()
+            return last_id, copied
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def migrate(
+        self,
+        start_after: int = 0,
+        batch_size: Optional[int] = None,
+        pause: float = 0.0,
+        conn=None,
+    ) -> int:
+        batch_size = batch_size or settings.vector_storage_migration_batch_size
+        own_connection = conn is None
+        conn = conn or self._connect()
+
+        watermark, total = start_after, 0
+        started = time.time()
+        try:
+            while True:
+                last_id, copied = self.copy_batch(conn, watermark, batch_size)
+                if last_id is None:
+                    break
+                watermark = last_id
+                total += copied
+                print(f"向量迁移进度: 已复制 {total} 条, 水位 id={watermark}")
+                if pause:
+                    time.sleep(pause)
+        finally:
+            if own_connection:
+                conn.close()
+
+        print(f"向量迁移完成: 共复制 {total} 条, 耗时 {time.time() - started:.1f}s, "
+              f"续跑可使用 --start-after {watermark}")
+        return total
+
+    def verify(self) -> Dict:
+        conn = self._connect()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT COUNT(*) FROM {FULL_SCHEMA.table}")
+            source = cursor.fetchone()[0]
+            cursor.execute(f"SELECT COUNT(*) FROM {COMPACT_SCHEMA.table}")
+            target = cursor.fetchone()[0]
+            cursor.execute(f"""
+                SELECT COUNT(*) FROM {FULL_SCHEMA.table} dv
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM {COMPACT_SCHEMA.table} h WHERE h.chunk_id = dv.chunk_id
+                )
+            """)
+            missing = cursor.fetchone()[0]
+            cursor.execute("""
+                SELECT pg_total_relation_size(%s::regclass), pg_total_relation_size(%s::regclass)
+            """, (FULL_SCHEMA.table, COMPACT_SCHEMA.table))
+            source_bytes, target_bytes = cursor.fetchone()
+            return {
+                "source_rows": source,
+                "target_rows": target,
+                "missing_rows": missing,
+                "source_bytes": source_bytes,
+                "target_bytes": target_bytes,
+            }
+        finally:
+            cursor.close()
+            conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="迁移 document_vectors 到 halfvec 紧凑存储")
+    parser.add_argument("--start-after", type=int, default=0, help="从该 id 之后开始复制")
+    parser.add_argument("--batch-size", type=int, default=None, help="每批复制的行数")
+    parser.add_argument("--pause", type=float, default=0.0, help="每批之间暂停的秒数")
+    parser.add_argument("--verify", action="store_true", help="只校验迁移结果")
+    args = parser.parse_args()
+
+    migrator = VectorStorageMigrator()
+    if not args.verify:
+        migrator.migrate(args.start_after, args.batch_size, args.pause)
+    for key, value in migrator.verify().items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,35 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from dataclasses import dataclass
+import numpy as np
 from sqlalchemy.orm import Session
 import psycopg2
 from psycopg2 import sql
 
 from src.models.document import DocumentVector, DocumentChunk
 from src.services.embedding_service import EmbeddingService
+from src.services.vector_codec import (
+    VectorLike,
+    as_matrix,
+    copy_binary_stream,
+    encode_int8,
+    encode_text,
+    from_pgvector_text,
+    to_pgvector_text,
+)
+from src.services.vector_index_service import search_settings_sql
+from src.services.vector_schema import (
+    build_batch_search_sql,
+    build_search_sql,
+    get_vector_schema,
+)
+from src.services.search_planner import (
+    SearchPlan,
+    max_distance_for,
+    needs_widening,
+    plan_search,
+    scope_stats_sql,
+    widen_plan,
+)
 from src.config import settings
 
 
@@ -19,9 +43,13 @@ class SearchResult:
 
 
 class VectorStore:
+    # 向量与分块写在同一个主库事务中，入库失败时随 rollback 一起撤销
+    transactional = True
+
     def __init__(self, db: Session):
         self.db = db
         self.embedding_service = EmbeddingService()
+        self.schema = get_vector_schema()
         self._conn = None
 
     def _get_connection(self):
@@ -35,19 +63,26 @@ class VectorStore:
         chunk_id: int,
         document_id: int,
         content: str,
-        embedding: List[float],
+        embedding: VectorLike,
     ) -> Optional[dict]:
         conn = self._get_connection()
         cursor = conn.cursor()
         
-        embedding_str = "[" + ",".join(str(x) for x in embedding) + "]"
+        embedding_str = to_pgvector_text(embedding)
         
         try:
-            cursor.execute("""
-                INSERT INTO document_vectors (document_id, chunk_id, content, embedding)
-                VALUES (%s, %s, %s, %s::vector)
-                RETURNING id, document_id, chunk_id, content, created_at
-            """, (document_id, chunk_id, content, embedding_str))
+            if self.schema.has_content:
+                cursor.execute("""
+                    INSERT INTO document_vectors (document_id, chunk_id, content, embedding)
+                    VALUES (%s, %s, %s, %s::vector)
+                    RETURNING id, document_id, chunk_id, created_at
+                """, (document_id, chunk_id, content, embedding_str))
+            else:
+                cursor.execute("""
+                    INSERT INTO document_vectors_half (document_id, chunk_id, embedding)
+                    VALUES (%s, %s, %s::halfvec)
+                    RETURNING id, document_id, chunk_id, created_at
+                """, (document_id, chunk_id, embedding_str))
             
             result = cursor.fetchone()
             conn.commit()
@@ -55,8 +90,8 @@ class VectorStore:
                 "id": result[0],
                 "document_id": result[1],
                 "chunk_id": result[2],
-                "content": result[3],
-                "created_at": result[4]
+                "content": content,
+                "created_at": result[3]
             }
         except Exception as e:
             print(f"添加向量失败: {e}")
@@ -69,75 +104,107 @@ class VectorStore:
         self,
         document_id: int,
         chunks: List[DocumentChunk],
-        embeddings: List[List[float]],
+        embeddings: np.ndarray,
+        commit: bool = True,
     ) -> int:
         if len(chunks) != len(embeddings):
             raise ValueError("chunks和embeddings数量不匹配")
+        if not chunks:
+            return 0
 
-        added_count = 0
-        for chunk, embedding in zip(chunks, embeddings):
-            result = self.add_vector(
-                chunk_id=chunk.id,
-                document_id=document_id,
-                content=chunk.content,
-                embedding=embedding,
+        embeddings = as_matrix(embeddings)
+        schema = self.schema
+        if schema.has_content:
+            columns = "document_id, chunk_id, content, embedding"
+            rows = (
+                (
+                    encode_int8(document_id),
+                    encode_int8(chunk.id),
+                    encode_text(chunk.content),
+                    schema.encode_binary(embedding),
+                )
+                for chunk, embedding in zip(chunks, embeddings)
             )
-            if result:
-                added_count += 1
+        else:
+            columns = "document_id, chunk_id, embedding"
+            rows = (
+                (encode_int8(document_id), encode_int8(chunk.id), schema.encode_binary(embedding))
+                for chunk, embedding in zip(chunks, embeddings)
+            )
+        stream = copy_binary_stream(rows)
 
-        return added_count
+        # 与分块写入共用 Session 的事务：一次 COPY + 一次提交，整篇文档要么全部写入要么全部回滚
+        cursor = self.db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {schema.table} ({columns}) FROM STDIN WITH (FORMAT binary)",
+                stream,
+            )
+            if commit:
+                self.db.commit()
+            return len(chunks)
+        except Exception as e:
+            print(f"批量写入向量失败: {e}")
+            self.db.rollback()
+            return 0
+        finally:
+            cursor.close()
 
     def search(
         self,
-        query_embedding: List[float],
+        query_embedding: VectorLike,
         top_k: int = 5,
         document_ids: Optional[List[int]] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+        min_score: float = 0.0,
     ) -> List[SearchResult]:
         conn = self._get_connection()
         cursor = conn.cursor()
         
-        embedding_str = "[" + ",".join(str(x) for x in query_embedding) + "]"
+        embedding_str = to_pgvector_text(query_embedding)
+        max_distance = max_distance_for(min_score)
+        bound = "%(max_distance)s" if max_distance is not None else None
         
         try:
-            if document_ids:
-                cursor.execute("""
-                    SELECT 
-                        dv.id,
-                        dv.document_id,
-                        dv.chunk_id,
-                        dv.content,
-                        1 - (dv.embedding <=> %s::vector) as score,
-                        d.title as document_title
-                    FROM document_vectors dv
-                    LEFT JOIN documents d ON dv.document_id = d.id
-                    WHERE dv.document_id = ANY(%s)
-                    ORDER BY dv.embedding <=> %s::vector
-                    LIMIT %s
-                """, (embedding_str, document_ids, embedding_str, top_k))
-            else:
-                cursor.execute("""
-                    SELECT 
-                        dv.id,
-                        dv.document_id,
-                        dv.chunk_id,
-                        dv.content,
-                        1 - (dv.embedding <=> %s::vector) as score,
-                        d.title as document_title
-                    FROM document_vectors dv
-                    LEFT JOIN documents d ON dv.document_id = d.id
-                    ORDER BY dv.embedding <=> %s::vector
-                    LIMIT %s
-                """, (embedding_str, embedding_str, top_k))
+            plan = self._plan_scoped_search(cursor, top_k, document_ids, ef_search)
+            while True:
+                index_settings = search_settings_sql(plan.ef_search if plan else ef_search, probes)
+                if index_settings:
+                    cursor.execute(index_settings)
+
+                params = {"embedding": embedding_str, "limit": top_k, "max_distance": max_distance}
+                if plan:
+                    params.update(document_ids=document_ids, fetch_limit=plan.fetch_k)
+                    query = build_search_sql(
+                        self.schema, "%(embedding)s", "%(limit)s", "%(document_ids)s",
+                        plan.strategy, "%(fetch_limit)s", bound,
+                    )
+                else:
+                    query = build_search_sql(
+                        self.schema, "%(embedding)s", "%(limit)s", max_distance=bound
+                    )
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+
+                # 带阈值的 ann 范围检索总会有一行携带 horizon，阈值裁掉全部候选时该行 chunk_id 为 NULL
+                horizon = None
+                if bound and plan and plan.strategy != "exact":
+                    horizon = rows[0][5] if rows else None
+                    rows = [row for row in rows if row[0] is not None]
+                if not needs_widening(plan, len(rows), top_k, horizon, max_distance):
+                    break
+                plan = widen_plan(plan, top_k)
             
             search_results = []
-            for row in cursor.fetchall():
+            for row in rows:
                 search_results.append(
                     SearchResult(
-                        chunk_id=row[2],
+                        chunk_id=row[0],
                         document_id=row[1],
-                        content=row[3],
-                        score=float(row[4]) if row[4] else 0.0,
-                        document_title=row[5],
+                        content=row[2],
+                        score=float(row[3]) if row[3] else 0.0,
+                        document_title=row[4],
                     )
                 )
 
@@ -147,6 +214,100 @@ class VectorStore:
             return []
         finally:
             cursor.close()
+            conn.rollback()
+
+    def search_many(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int = 5,
+        document_ids: Optional[List[int]] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+    ) -> List[List[SearchResult]]:
+        embeddings = as_matrix(query_embeddings)
+        if len(embeddings) == 0:
+            return []
+
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        vectors = [to_pgvector_text(embedding) for embedding in embeddings]
+
+        try:
+            plan = self._plan_scoped_search(cursor, top_k, document_ids, ef_search)
+            while True:
+                index_settings = search_settings_sql(plan.ef_search if plan else ef_search, probes)
+                if index_settings:
+                    cursor.execute(index_settings)
+
+                params = {"embeddings": vectors, "limit": top_k}
+                if plan:
+                    params.update(document_ids=document_ids, fetch_limit=plan.fetch_k)
+                    query = build_batch_search_sql(
+                        self.schema, "%(embeddings)s", "%(limit)s", "%(document_ids)s",
+                        plan.strategy, "%(fetch_limit)s",
+                    )
+                else:
+                    query = build_batch_search_sql(self.schema, "%(embeddings)s", "%(limit)s")
+                cursor.execute(query, params)
+
+                grouped = [[] for _ in embeddings]
+                for row in cursor.fetchall():
+                    grouped[row[0]].append(
+                        SearchResult(
+                            chunk_id=row[1],
+                            document_id=row[2],
+                            content=row[3],
+                            score=float(row[4]) if row[4] else 0.0,
+                            document_title=row[5],
+                        )
+                    )
+
+                if plan is None or plan.strategy == "exact":
+                    break
+                if all(len(results) >= top_k for results in grouped):
+                    break
+                plan = widen_plan(plan, top_k)
+
+            return grouped
+        except Exception as e:
+            print(f"批量向量搜索失败: {e}")
+            return [[] for _ in embeddings]
+        finally:
+            cursor.close()
+            conn.rollback()
+
+    def get_embeddings(self, chunk_ids: List[int]) -> Dict[int, np.ndarray]:
+        if not chunk_ids:
+            return {}
+        conn = self._get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(
+                f"SELECT chunk_id, embedding::text FROM {self.schema.table} "
+                "WHERE chunk_id = ANY(%s)",
+                (list(chunk_ids),),
+            )
+            return {row[0]: from_pgvector_text(row[1]) for row in cursor.fetchall()}
+        except Exception as e:
+            print(f"读取分块向量失败: {e}")
+            return {}
+        finally:
+            cursor.close()
+            conn.rollback()
+
+    def _plan_scoped_search(
+        self,
+        cursor,
+        top_k: int,
+        document_ids: Optional[List[int]],
+        ef_search: Optional[int],
+    ) -> Optional[SearchPlan]:
+        if not document_ids:
+            return None
+        cursor.execute(scope_stats_sql(self.schema, "%s"), (document_ids,))
+        total_rows, scoped_rows = cursor.fetchone()
+        return plan_search(top_k, scoped_rows, total_rows, ef_search)
 
     def search_by_text(
         self,
@@ -155,7 +316,7 @@ class VectorStore:
         document_ids: Optional[List[int]] = None,
     ) -> List[SearchResult]:
         query_embedding = self.embedding_service.embed_single_text(query)
-        if not query_embedding:
+        if query_embedding is None:
             return []
 
         return self.search(query_embedding, top_k, document_ids)
@@ -166,7 +327,7 @@ class VectorStore:
         
         try:
             cursor.execute(
-                "DELETE FROM document_vectors WHERE document_id = %s",
+                f"DELETE FROM {self.schema.table} WHERE document_id = %s",
                 (document_id,)
             )
             deleted = cursor.rowcount
@@ -185,7 +346,7 @@ class VectorStore:
         
         try:
             cursor.execute(
-                "SELECT COUNT(*) FROM document_vectors WHERE document_id = %s",
+                f"SELECT COUNT(*) FROM {self.schema.table} WHERE document_id = %s",
                 (document_id,)
             )
             return cursor.fetchone()[0]
@@ -197,7 +358,19 @@ class VectorStore:
         cursor = conn.cursor()
         
         try:
-            cursor.execute("SELECT DISTINCT document_id FROM document_vectors")
+            cursor.execute(f"SELECT DISTINCT document_id FROM {self.schema.table}")
             return [row[0] for row in cursor.fetchall()]
         finally:
             cursor.close()
+
+
+def create_vector_store(db: Optional[Session] = None):
+    if settings.vector_store_backend == "mmap":
+        from src.services.mmap_vector_store import MmapVectorStore
+
+        return MmapVectorStore(db)
+    if settings.vector_store_backend == "sharded":
+        from src.services.sharded_vector_store import ShardedVectorStore
+
+        return ShardedVectorStore(db)
+    return VectorStore(db)
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.context_assembler import (
+    CONTEXT_SEPARATOR,
+    ChunkPosition,
+    ContextAssembler,
+    merge_adjacent,
+)
+from src.services.rank_fusion import reciprocal_rank_fusion
+from src.services.vector_store import SearchResult
+
+
+def chunk(chunk_id, document_id, chunk_index, tokens=100):
+    return ChunkPosition(chunk_id, document_id, chunk_index, f"分块{chunk_id}", tokens)
+
+
+class FakeTextSearch:
+    def __init__(self, rows=None, fail=False):
+        self.rows = rows or []
+        self.fail = fail
+        self.calls = []
+
+    async def load_neighbors(self, chunk_ids, window=1):
+        self.calls.append((list(chunk_ids), window))
+        if self.fail:
+            raise RuntimeError("db down")
+        return self.rows
+
+
+class TestContextAssembler:
+    def test_adjacent_hits_and_neighbors_merge_into_one_block(self):
+        positions = {
+            c.chunk_id: c
+            for c in [chunk(1, 1, 0), chunk(2, 1, 1), chunk(3, 1, 2), chunk(9, 2, 5)]
+        }
+        hits = [
+            SearchResult(2, 1, "分块2", 0.9, "手册"),
+            SearchResult(9, 2, "分块9", 0.8),
+            SearchResult(3, 1, "分块3", 0.7),
+        ]
+
+        assembler = ContextAssembler(FakeTextSearch(), token_budget=1000, min_score_ratio=0)
+        assembled = assembler.pack(hits, positions)
+
+        assert [block.chunk_ids for block in assembled.blocks] == [[1, 2, 3], [9]]
+        assert assembled.blocks[0].document_title == "手册"
+        assert assembled.blocks[0].content == "分块1\n\n分块2\n\n分块3"
+        assert [r.chunk_id for r in assembled.sources] == [2, 9, 3]
+        assert assembled.text.count(CONTEXT_SEPARATOR) == 1
+
+    def test_budget_prefers_hits_over_neighbors_and_skips_what_does_not_fit(self):
+        positions = {
+            c.chunk_id: c
+            for c in [
+                chunk(1, 1, 0, 300),
+                chunk(2, 1, 1, 300),
+                chunk(5, 3, 0, 500),
+                chunk(6, 4, 0, 150),
+                chunk(7, 4, 1, 100),
+            ]
+        }
+        hits = [
+            SearchResult(2, 1, "分块2", 0.9),
+            SearchResult(5, 3, "分块5", 0.8),
+            SearchResult(6, 4, "分块6", 0.7),
+        ]
+
+        assembler = ContextAssembler(FakeTextSearch(), token_budget=600, min_score_ratio=0)
+        assembled = assembler.pack(hits, positions)
+
+        selected = sorted(c for block in assembled.blocks for c in block.chunk_ids)
+        assert selected == [2, 6, 7]
+        assert [r.chunk_id for r in assembled.sources] == [2, 6]
+
+    def test_oversized_first_hit_is_truncated(self):
+        hits = [SearchResult(1, 1, "长" * 1000, 0.9)]
+
+        assembled = ContextAssembler(FakeTextSearch(), token_budget=200).pack(hits, {})
+
+        assert len(assembled.blocks[0].content) == 200
+        assert assembled.token_count == 200
+
+    def test_assemble_trims_tail_and_fetches_neighbors_once(self):
+        rows = [
+            {"id": 1, "document_id": 1, "chunk_index": 0, "content": "前文", "token_count": None},
+            {"id": 2, "document_id": 1, "chunk_index": 1, "content": "命中", "token_count": 2},
+        ]
+        text_search = FakeTextSearch(rows)
+        assembler = ContextAssembler(
+            text_search, token_budget=100, neighbor_window=1, min_score_ratio=0.5
+        )
+        results = [SearchResult(2, 1, "命中", 0.8), SearchResult(30, 3, "噪声", 0.2)]
+
+        assembled = asyncio.run(assembler.assemble(results))
+
+        assert text_search.calls == [([2], 1)]
+        assert assembled.text == "前文\n\n命中"
+        assert [r.chunk_id for r in assembled.sources] == [2]
+
+    def test_fused_scores_are_not_trimmed_by_ratio(self):
+        vector = [SearchResult(i, i, f"v{i}", 1 - i / 10) for i in (1, 2, 3, 4, 5)]
+        keyword = [SearchResult(i, i, f"k{i}", 10.0 - i) for i in (1, 9, 8)]
+        fused = reciprocal_rank_fusion([vector, keyword], 10, normalize=True)
+        assembler = ContextAssembler(FakeTextSearch(), min_score_ratio=0.5)
+
+        # 两路都召回的分块满分，只被一路召回的最多约 0.5，按比例裁剪会只剩第一个
+        assert [r.chunk_id for r in assembler.trim(fused)] == [1]
+        kept = assembler.trim(fused, cosine_scores=False)
+        assert {r.chunk_id for r in kept} == {1, 2, 3, 4, 5, 8, 9}
+
+    def test_neighbor_lookup_failure_falls_back_to_hits(self):
+        assembler = ContextAssembler(FakeTextSearch(fail=True), token_budget=100)
+        results = [SearchResult(1, 1, "甲", 0.9), SearchResult(2, 2, "乙", 0.8)]
+
+        assembled = asyncio.run(assembler.assemble(results))
+
+        assert assembled.text == "甲" + CONTEXT_SEPARATOR + "乙"
+
+    def test_overlapping_chunks_are_deduplicated(self):
+        shared = "重叠的二十个字符重叠的二十个字符重叠的二"
+        assert merge_adjacent("开头" + shared, shared + "结尾") == "开头" + shared + "结尾"
+        assert merge_adjacent("甲。", "甲。乙") == "甲。\n\n甲。乙"
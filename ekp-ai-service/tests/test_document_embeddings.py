@@ -0,0 +1,125 @@
+import asyncio
+import os
+import sys
+from contextlib import asynccontextmanager
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import settings
+from src.services import retriever_service
+from src.services.document_embeddings import (
+    DocumentEmbeddingStore,
+    document_ef_search,
+    document_embedding,
+    recall_at_k,
+    two_stage_applies,
+)
+from src.services.retriever_service import RetrieverService
+
+
+class FakeDocumentStore:
+    def __init__(self, candidates, document_count=100):
+        self.candidates = candidates
+        self.document_count = document_count
+        self.calls = []
+
+    async def select_documents(self, query_embedding, limit, document_ids=None):
+        self.calls.append((limit, document_ids))
+        if not two_stage_applies(document_count=self.document_count, limit=limit):
+            return None
+        return self.candidates[:limit]
+
+
+class FakeConnection:
+    def __init__(self, document_count, rows):
+        self.document_count = document_count
+        self.rows = rows
+        self.statements = []
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def fetchval(self, sql, *args):
+        self.statements.append(sql)
+        return self.document_count
+
+    async def execute(self, sql, *args):
+        self.statements.append(sql)
+
+    async def fetch(self, sql, *args):
+        self.statements.append(sql)
+        return [{"document_id": document_id} for document_id in self.rows[: args[1]]]
+
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.conn
+
+
+class TestDocumentEmbeddings:
+    def test_centroid_of_normalized_chunks_blended_with_title(self):
+        chunks = np.array([[2, 0, 0], [0, 3, 0]], dtype=np.float32)
+
+        centroid = document_embedding(chunks)
+        titled = document_embedding(chunks, title_embedding=[0, 0, 5], title_weight=0.5)
+
+        assert np.allclose(centroid, [np.sqrt(0.5), np.sqrt(0.5), 0], atol=1e-6)
+        assert centroid.dtype == np.float32
+        assert np.isclose(np.linalg.norm(titled), 1.0)
+        assert np.isclose(titled[2], np.sqrt(0.5), atol=1e-6)
+
+    def test_small_corpus_falls_back_to_flat_search(self):
+        assert two_stage_applies(51, 50)
+        assert not two_stage_applies(50, 50)
+        assert not two_stage_applies(None, 50)
+        assert recall_at_k([1, 2, 3, 4], [2, 4, 9]) == 0.5
+        assert recall_at_k([], [1]) == 1.0
+
+    def test_select_documents_scopes_chunk_search(self, monkeypatch):
+        monkeypatch.setattr(settings, "two_stage_documents", 3)
+        store = FakeDocumentStore([7, 5, 9, 1])
+        monkeypatch.setattr(retriever_service, "document_embedding_store", store)
+        retriever = RetrieverService.__new__(RetrieverService)
+        query = np.ones(4, dtype=np.float32)
+
+        async def scenario():
+            return (
+                await retriever._select_documents(query, None),
+                await retriever._select_documents(query, [1, 2]),
+                await retriever._select_documents(query, [1, 2, 3, 4, 5]),
+            )
+
+        corpus_wide, narrow, wide = asyncio.run(scenario())
+        assert corpus_wide == [7, 5, 9]
+        assert narrow == [1, 2]
+        assert wide == [7, 5, 9]
+        assert store.calls == [(3, None), (3, [1, 2, 3, 4, 5])]
+
+        store.document_count = 3
+        assert asyncio.run(retriever._select_documents(query, None)) is None
+
+    def test_document_search_raises_ef_search_to_limit(self, monkeypatch):
+        monkeypatch.setattr(settings, "vector_search_ef_search", None)
+        assert document_ef_search(10) == 40
+        assert document_ef_search(200) == 200
+        assert document_ef_search(5000) == 1000
+
+        conn = FakeConnection(document_count=500, rows=list(range(300)))
+        store = DocumentEmbeddingStore(pool=FakePool(conn))
+        selected = asyncio.run(store.select_documents(np.ones(4, dtype=np.float32), 200))
+
+        # 默认 ef_search = 40 时 HNSW 只返回 40 篇，必须在同一事务内调高
+        assert selected == list(range(200))
+        assert "SET LOCAL hnsw.ef_search = 200" in conn.statements
+
+        small = FakeConnection(document_count=150, rows=list(range(150)))
+        store = DocumentEmbeddingStore(pool=FakePool(small))
+        assert asyncio.run(store.select_documents(np.ones(4, dtype=np.float32), 200)) is None
+        assert len(small.statements) == 1
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.document_processor import DocumentProcessor
+from src.services.mmap_vector_store import MmapVectorIndex, MmapVectorStore
+from src.services.sharded_vector_store import ShardedVectorStore
+
+
+class FakeQuery:
+    def __init__(self, document):
+        self.document = document
+
+    def filter(self, *args):
+        return self
+
+    def first(self):
+        return self.document
+
+
+class FakeSession:
+    def __init__(self, document):
+        self.document = document
+        self.rollbacks = 0
+        self._next_chunk_id = 1
+
+    def query(self, model):
+        return FakeQuery(self.document)
+
+    def add_all(self, chunks):
+        for chunk in chunks:
+            chunk.id = self._next_chunk_id
+            self._next_chunk_id += 1
+
+    def flush(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class FakeEmbeddingService:
+    def embed_texts(self, texts):
+        return np.random.default_rng(0).standard_normal((len(texts), 8)).astype(np.float32)
+
+    def embed_single_text(self, text):
+        return None
+
+
+class FailingDocumentEmbeddings:
+    def save(self, *args):
+        raise RuntimeError("document_embeddings 写入失败")
+
+
+class FakeStats:
+    def record_indexed(self, *args):
+        pass
+
+
+def make_processor(vector_store, document):
+    processor = DocumentProcessor.__new__(DocumentProcessor)
+    processor.db = FakeSession(document)
+    processor.chunker = SimpleNamespace(
+        chunk_text=lambda text: [
+            SimpleNamespace(chunk_index=i, content=part, token_count=1)
+            for i, part in enumerate(text.split())
+        ]
+    )
+    processor.embedding_service = FakeEmbeddingService()
+    processor.vector_store = vector_store
+    processor.stats_service = FakeStats()
+    processor.document_embeddings = FailingDocumentEmbeddings()
+
+    async def extract_text(file_path):
+        return "alpha beta gamma"
+
+    processor._extract_text = extract_text
+    return processor
+
+
+def run_failing_ingest(vector_store):
+    document = SimpleNamespace(id=7, title="文档", file_path="doc.txt", status="PENDING",
+                               error_message=None)
+    processor = make_processor(vector_store, document)
+
+    assert asyncio.run(processor.process_document_async(7)) is False
+    assert processor.db.rollbacks == 1
+    return document
+
+
+class TestDocumentProcessorFailure:
+    def test_mmap_vectors_removed_when_ingest_fails_after_write(self, tmp_path):
+        index = MmapVectorIndex(str(tmp_path), dimension=8)
+
+        document = run_failing_ingest(MmapVectorStore(index=index))
+
+        assert document.status == "FAILED"
+        assert index.document_vector_count(7) == 0
+        assert index.search(np.ones(8, dtype=np.float32), top_k=10) == []
+
+    def test_shard_vectors_removed_when_ingest_fails_after_write(self, tmp_path):
+        shards = [MmapVectorIndex(str(tmp_path / f"shard{i}"), dimension=8) for i in range(2)]
+
+        document = run_failing_ingest(ShardedVectorStore(shards=shards))
+
+        assert document.status == "FAILED"
+        assert all(shard.document_vector_count(7) == 0 for shard in shards)
+        assert all(len(shard) == 0 for shard in shards)
@@ -0,0 +1,89 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models.document import Document, DocumentChunk, DocumentStats, User
+from src.services.document_stats_service import DocumentStatsService
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    for model in (User, Document, DocumentChunk, DocumentStats):
+        model.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def _add_document(db, title, status="COMPLETED", chunk_tokens=(10, 20)):
+    # SQLite 不会为 BIGINT 主键自增，测试中显式分配 id
+    document_id = db.query(Document).count() + 1
+    document = Document(id=document_id, title=title, status=status)
+    db.add(document)
+    db.flush()
+    first_chunk_id = db.query(DocumentChunk).count() + 1
+    chunks = [
+        DocumentChunk(
+            id=first_chunk_id + i,
+            document_id=document.id,
+            chunk_index=i,
+            content="x",
+            token_count=tokens,
+        )
+        for i, tokens in enumerate(chunk_tokens)
+    ]
+    db.add_all(chunks)
+    db.flush()
+    return document, chunks
+
+
+class TestDocumentStatsService:
+    def test_record_indexed_upserts(self, db):
+        service = DocumentStatsService(db)
+        document, chunks = _add_document(db, "a")
+
+        service.record_indexed(document.id, chunks, vector_count=2)
+        service.record_indexed(document.id, chunks[:1], vector_count=1)
+        db.commit()
+
+        stats = db.get(DocumentStats, document.id)
+        assert (stats.vector_count, stats.chunk_count, stats.token_count) == (1, 1, 10)
+        assert stats.last_indexed_at is not None
+
+    def test_list_completed_documents_is_one_query(self, db):
+        service = DocumentStatsService(db)
+        for i in range(5):
+            document, chunks = _add_document(db, f"doc{i}")
+            service.record_indexed(document.id, chunks, vector_count=len(chunks))
+        _add_document(db, "pending", status="PROCESSING")
+        _add_document(db, "no stats")
+        db.commit()
+
+        statements = []
+        event.listen(db.get_bind(), "before_cursor_execute",
+                     lambda *args: statements.append(args[2]))
+        documents = service.list_completed_documents()
+
+        assert len(statements) == 1
+        assert len(documents) == 6
+        by_title = {d["title"]: d for d in documents}
+        assert by_title["doc0"]["vector_count"] == 2
+        assert by_title["doc0"]["token_count"] == 30
+        assert by_title["no stats"]["vector_count"] == 0
+
+    def test_clear(self, db):
+        service = DocumentStatsService(db)
+        first, chunks = _add_document(db, "a")
+        second, _ = _add_document(db, "b")
+        service.record_indexed(first.id, chunks, vector_count=2)
+        service.record_indexed(second.id, chunks, vector_count=7)
+
+        service.clear(first.id)
+        assert db.get(DocumentStats, first.id) is None
+        assert db.get(DocumentStats, second.id).vector_count == 7
@@ -0,0 +1,83 @@
+import asyncio
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.embedding_batcher import EmbeddingBatcher
+
+
+class FakeEncoder:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        time.sleep(self.delay)
+        return [[float(len(t))] for t in texts]
+
+
+class TestEmbeddingBatcher:
+    def test_concurrent_requests_share_one_encode(self):
+        encoder = FakeEncoder()
+        batcher = EmbeddingBatcher(encoder, max_batch_size=64, max_wait_ms=20)
+
+        async def run():
+            texts = ["a" * (i + 1) for i in range(10)]
+            results = await asyncio.gather(*(batcher.embed(t) for t in texts))
+            await batcher.close()
+            return results
+
+        results = asyncio.run(run())
+        assert results == [[float(i + 1)] for i in range(10)]
+        assert len(encoder.calls) == 1
+
+    def test_batch_size_cap(self):
+        encoder = FakeEncoder()
+        batcher = EmbeddingBatcher(encoder, max_batch_size=4, max_wait_ms=20)
+
+        async def run():
+            results = await asyncio.gather(*(batcher.embed("x") for _ in range(10)))
+            await batcher.close()
+            return results
+
+        results = asyncio.run(run())
+        assert len(results) == 10
+        assert all(len(call) <= 4 for call in encoder.calls)
+        assert sum(len(call) for call in encoder.calls) == 10
+
+    def test_encode_failure_resolves_none(self):
+        def failing(texts):
+            raise RuntimeError("boom")
+
+        batcher = EmbeddingBatcher(failing, max_batch_size=8, max_wait_ms=1)
+
+        async def run():
+            result = await batcher.embed("x")
+            await batcher.close()
+            return result
+
+        assert asyncio.run(run()) is None
+
+    def test_event_loop_not_blocked_during_encode(self):
+        encoder = FakeEncoder(delay=0.2)
+        batcher = EmbeddingBatcher(encoder, max_batch_size=8, max_wait_ms=1)
+
+        async def run():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            task = asyncio.create_task(ticker())
+            await batcher.embed("x")
+            task.cancel()
+            await batcher.close()
+            return ticks
+
+        assert asyncio.run(run()) >= 5
@@ -0,0 +1,110 @@
+import sys
+import os
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.embedding_cache import EmbeddingCache
+
+
+def make_vectors(n: int, dim: int = 8) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return rng.random((n, dim), dtype=np.float32)
+
+
+class TestEmbeddingCache:
+    def test_miss_then_hit(self, tmp_path):
+        cache = EmbeddingCache("test-model", 8, cache_dir=str(tmp_path), max_entries=10)
+        vectors = make_vectors(2)
+
+        assert cache.get_many(["甲", "乙"]) == [None, None]
+        cache.put_many(["甲", "乙"], vectors)
+
+        hits = cache.get_many(["乙", "丙", "甲"])
+        assert hits[1] is None
+        np.testing.assert_array_equal(hits[0], vectors[1])
+        np.testing.assert_array_equal(hits[2], vectors[0])
+
+    def test_lru_eviction(self, tmp_path):
+        cache = EmbeddingCache("test-model", 8, cache_dir=str(tmp_path), max_entries=2)
+        vectors = make_vectors(3)
+
+        cache.put_many(["a", "b"], vectors[:2])
+        cache.get_many(["a"])
+        cache.put_many(["c"], vectors[2:])
+
+        a, b, c = cache.get_many(["a", "b", "c"])
+        assert b is None
+        np.testing.assert_array_equal(a, vectors[0])
+        np.testing.assert_array_equal(c, vectors[2])
+        assert len(cache) == 2
+
+    def test_persists_across_instances(self, tmp_path):
+        vectors = make_vectors(3)
+        cache = EmbeddingCache("test-model", 8, cache_dir=str(tmp_path), max_entries=10)
+        cache.put_many(["x", "y", "z"], vectors)
+        cache.close()
+
+        reopened = EmbeddingCache("test-model", 8, cache_dir=str(tmp_path), max_entries=10)
+        assert len(reopened) == 3
+        np.testing.assert_array_equal(np.stack(reopened.get_many(["x", "y", "z"])), vectors)
+
+        reopened.put_many(["w"], make_vectors(1))
+        assert all(v is not None for v in reopened.get_many(["x", "y", "z", "w"]))
+
+    def test_models_are_isolated(self, tmp_path):
+        EmbeddingCache("model-a", 8, cache_dir=str(tmp_path)).put_many(["x"], make_vectors(1))
+        other = EmbeddingCache("model-b", 8, cache_dir=str(tmp_path))
+        assert other.get_many(["x"]) == [None]
+
+    def test_index_is_append_only_until_compaction(self, tmp_path):
+        cache = EmbeddingCache("test-model", 8, cache_dir=str(tmp_path), max_entries=10)
+        index_path = os.path.join(cache.directory, EmbeddingCache.INDEX_FILE)
+        snapshot = os.path.getmtime(index_path), os.path.getsize(index_path)
+
+        cache.put_many(["a", "b"], make_vectors(2))
+        cache.put_many(["c"], make_vectors(1))
+
+        assert (os.path.getmtime(index_path), os.path.getsize(index_path)) == snapshot
+        assert cache.stats()["log_entries"] == 3
+
+        cache.MIN_COMPACT_ENTRIES = 2
+        cache.put_many(["d", "a"], make_vectors(2))
+        assert cache.stats()["log_entries"] == 0
+        cache.close()
+
+        reopened = EmbeddingCache("test-model", 8, cache_dir=str(tmp_path), max_entries=10)
+        assert all(v is not None for v in reopened.get_many(["a", "b", "c", "d"]))
+
+    def test_second_process_is_read_only_and_follows_writer(self, tmp_path):
+        writer = EmbeddingCache("test-model", 8, cache_dir=str(tmp_path), max_entries=2)
+        reader = EmbeddingCache("test-model", 8, cache_dir=str(tmp_path), max_entries=2)
+        vectors = make_vectors(3)
+        assert writer.writable and not reader.writable
+
+        reader.put_many(["a"], vectors[:1])
+        assert writer.get_many(["a"]) == [None]
+
+        writer.put_many(["a", "b"], vectors[:2])
+        np.testing.assert_array_equal(reader.get_many(["b"])[0], vectors[1])
+
+        # 写进程淘汰 a 并复用其槽位后，只读进程不再命中 a
+        writer.put_many(["c"], vectors[2:])
+        a, c = reader.get_many(["a", "c"])
+        assert a is None
+        np.testing.assert_array_equal(c, vectors[2])
+
+    def test_batch_larger_than_max_entries_keeps_reader_consistent(self, tmp_path):
+        writer = EmbeddingCache("test-model", 8, cache_dir=str(tmp_path), max_entries=2)
+        reader = EmbeddingCache("test-model", 8, cache_dir=str(tmp_path), max_entries=2)
+        vectors = make_vectors(5)
+
+        writer.put_many(["a", "b", "c", "d", "e"], vectors)
+
+        # 本批先写入的 a、b、c 已被淘汰，只读进程回放日志后不能把它们映射到复用的槽位
+        assert reader.get_many(["a", "b", "c"]) == [None, None, None]
+        d, e = reader.get_many(["d", "e"])
+        np.testing.assert_array_equal(d, vectors[3])
+        np.testing.assert_array_equal(e, vectors[4])
+        assert len(reader) == 2
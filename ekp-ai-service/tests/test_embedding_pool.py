@@ -0,0 +1,78 @@
+import hashlib
+import sys
+import os
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services import embedding_pool
+from src.services.embedding_pool import EmbeddingProcessPool, plan_shards
+
+DIMENSION = 8
+
+
+class FakeModel:
+    def encode(self, texts, batch_size=32, convert_to_numpy=True):
+        rows = []
+        for text in texts:
+            seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+            rows.append(np.random.default_rng(seed).random(DIMENSION, dtype=np.float32))
+        return np.stack(rows)
+
+
+# 工作进程以 spawn 启动，按模块路径导入本函数，用假模型代替 SentenceTransformer
+def init_fake_worker(model_name, threads):
+    embedding_pool._worker_model = FakeModel()
+
+
+class TestPlanShards:
+    def test_empty(self):
+        assert plan_shards(0, 4, 512) == []
+
+    def test_spreads_small_input_across_workers(self):
+        shards = plan_shards(100, 4, 512)
+        assert len(shards) == 4
+        assert shards[0] == (0, 25)
+        assert shards[-1] == (75, 100)
+
+    def test_respects_shard_size(self):
+        shards = plan_shards(10000, 4, 512)
+        assert all(end - start <= 512 for start, end in shards)
+        assert shards[0][0] == 0
+        assert shards[-1][1] == 10000
+        assert all(a[1] == b[0] for a, b in zip(shards, shards[1:]))
+
+
+class TestEmbeddingProcessPool:
+    def test_encode_matches_single_process_and_unlinks_shared_memory(self, monkeypatch):
+        created = []
+        shared_memory = embedding_pool.shared_memory
+
+        class RecordingSharedMemory(shared_memory.SharedMemory):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                created.append(self.name)
+
+        monkeypatch.setattr(embedding_pool, "_init_worker", init_fake_worker)
+        monkeypatch.setattr(
+            embedding_pool.shared_memory, "SharedMemory", RecordingSharedMemory
+        )
+        texts = [f"文本 {i}" for i in range(23)]
+
+        pool = EmbeddingProcessPool(
+            "fake-model", DIMENSION, workers=2, shard_size=5, threads_per_worker=1
+        )
+        try:
+            output = pool.encode(texts, batch_size=4)
+        finally:
+            pool.shutdown()
+
+        assert output.shape == (len(texts), DIMENSION)
+        assert output.dtype == np.float32
+        np.testing.assert_array_equal(output, FakeModel().encode(texts))
+        assert len(created) == 1
+        monkeypatch.undo()
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=created[0])
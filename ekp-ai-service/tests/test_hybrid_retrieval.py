@@ -0,0 +1,173 @@
+import asyncio
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import settings
+from src.services.retriever_service import RetrieverService, run_branch
+from src.services.vector_store import SearchResult
+
+
+# 检索结果缓存单独测试，这里每次都走实际检索
+@pytest.fixture(autouse=True)
+def no_retrieval_cache(monkeypatch):
+    monkeypatch.setattr(settings, "retrieval_cache_enabled", False)
+
+
+class FakeTextSearch:
+    def __init__(self, keyword_delay=0.0, title_delay=0.0, titles=None):
+        self.keyword_delay = keyword_delay
+        self.title_delay = title_delay
+        self.titles = titles or []
+
+    async def search_chunks(self, query, top_k, document_ids):
+        await asyncio.sleep(self.keyword_delay)
+        return [SearchResult(30, 3, "关键词命中", 0.8), SearchResult(11, 1, "b", 0.5)]
+
+    async def match_titles(self, query, limit, document_ids):
+        await asyncio.sleep(self.title_delay)
+        return self.titles
+
+
+class FakeEmbeddingService:
+    async def embed_single_text_async(self, text):
+        return np.ones(4, dtype=np.float32)
+
+
+class FakeRetriever(RetrieverService):
+    def __init__(self, text_search, vector_delay=0.0):
+        self.embedding_service = FakeEmbeddingService()
+        self.text_search = text_search
+        self.vector_delay = vector_delay
+
+    async def retrieve_relevant_chunks_async(self, query, top_k=5, document_ids=None, **kwargs):
+        await asyncio.sleep(self.vector_delay)
+        return [
+            SearchResult(10, 1, "a", 0.9),
+            SearchResult(11, 1, "b", 0.8),
+            SearchResult(20, 2, "c", 0.7),
+        ]
+
+
+class TestHybridRetrieval:
+    def test_branches_run_concurrently(self):
+        retriever = FakeRetriever(
+            FakeTextSearch(keyword_delay=0.2, title_delay=0.2), vector_delay=0.2
+        )
+
+        results, timings = asyncio.run(retriever.hybrid_search_async("问题", top_k=3))
+
+        by_branch = {t.branch: t for t in timings}
+        # 由 hybrid 流水线执行，只检索不组装上下文
+        assert [t.branch for t in timings] == [
+            "embed", "vector", "keyword", "metadata", "candidates", "fusion", "total",
+        ]
+        assert all(t.status == "ok" for t in timings)
+        assert by_branch["total"].elapsed_ms < 450
+        assert results[0].chunk_id == 11
+        assert 0 < results[0].score <= 1
+
+    def test_slow_branch_returns_partial_results(self, monkeypatch):
+        monkeypatch.setattr(settings, "retrieval_keyword_timeout", 0.05)
+        retriever = FakeRetriever(FakeTextSearch(keyword_delay=1.0))
+
+        results, timings = asyncio.run(retriever.hybrid_search_async("问题", top_k=3))
+
+        by_branch = {t.branch: t for t in timings}
+        assert by_branch["keyword"].status == "timeout"
+        assert by_branch["keyword"].results == 0
+        assert by_branch["total"].elapsed_ms < 500
+        assert [r.chunk_id for r in results] == [10, 11, 20]
+
+    def test_title_match_boosts_document(self):
+        retriever = FakeRetriever(FakeTextSearch(titles=[2]))
+
+        results, _ = asyncio.run(retriever.hybrid_search_async("问题", top_k=4))
+
+        plain, _ = asyncio.run(FakeRetriever(FakeTextSearch()).hybrid_search_async("问题", top_k=4))
+        boosted_rank = [r.chunk_id for r in results].index(20)
+        assert boosted_rank < [r.chunk_id for r in plain].index(20)
+
+    def test_hybrid_search_reports_mmr_stage(self):
+        class DiverseRetriever(FakeRetriever):
+            async def _candidate_embeddings_async(self, results):
+                vectors = {10: [1, 0], 11: [1, 0.01], 20: [0, 1], 30: [0.7, 0.7]}
+                return np.array([vectors[r.chunk_id] for r in results], dtype=np.float32)
+
+        retriever = DiverseRetriever(FakeTextSearch())
+
+        plain, _ = asyncio.run(retriever.hybrid_search_async("问题", top_k=2))
+        results, timings = asyncio.run(
+            retriever.hybrid_search_async("问题", top_k=2, diversify=True)
+        )
+
+        assert [r.chunk_id for r in plain] == [11, 10]
+        assert [t.branch for t in timings][-2:] == ["mmr", "total"]
+        assert len(results) == 2
+        assert 10 not in [r.chunk_id for r in results]
+
+    def test_branch_error_is_reported(self):
+        async def failing():
+            raise RuntimeError("boom")
+
+        results, timing = asyncio.run(run_branch("metadata", failing(), 1.0))
+        assert results == []
+        assert timing.status == "error"
+
+    def test_sync_hybrid_search_falls_back_to_trgm(self, monkeypatch):
+        from src.services import retriever_service
+
+        calls = []
+
+        def search_chunks_in_session(db, query, top_k, document_ids):
+            calls.append((query, top_k, document_ids))
+            return [SearchResult(30, 3, "关键词命中", 0.8), SearchResult(11, 1, "b", 0.5)]
+
+        monkeypatch.setattr(retriever_service, "search_chunks_in_session", search_chunks_in_session)
+        monkeypatch.setattr(retriever_service.keyword_index, "_ready", False)
+        retriever = RetrieverService.__new__(RetrieverService)
+        retriever.db = None
+        retriever.retrieve_relevant_chunks = lambda query, top_k, document_ids: [
+            SearchResult(10, 1, "a", 0.9),
+            SearchResult(11, 1, "b", 0.8),
+        ]
+
+        results = retriever.hybrid_search("问题", top_k=3, document_ids=[1, 3])
+
+        assert calls == [("问题", 3 * settings.hybrid_candidate_factor, [1, 3])]
+        assert 30 in [r.chunk_id for r in results]
+
+
+class RecordingEmbeddingService:
+    def __init__(self):
+        self.use_cache = []
+
+    def embed_texts(self, texts, use_cache=True):
+        self.use_cache.append(use_cache)
+        return np.ones((len(texts), 4), dtype=np.float32)
+
+
+class FakeVectorStore:
+    def search_many(self, embeddings, top_k, document_ids, *args):
+        return [[SearchResult(10, 1, "a", 0.9)] for _ in embeddings]
+
+
+class FakeAsyncVectorStore(FakeVectorStore):
+    async def search_many(self, embeddings, top_k, document_ids, *args):
+        return super().search_many(embeddings, top_k, document_ids)
+
+
+class TestRetrieveMany:
+    def test_query_embeddings_bypass_chunk_cache(self):
+        retriever = RetrieverService.__new__(RetrieverService)
+        retriever.embedding_service = RecordingEmbeddingService()
+        retriever.vector_store = FakeVectorStore()
+        retriever.async_vector_store = FakeAsyncVectorStore()
+
+        assert len(retriever.retrieve_many(["甲", "", "乙"])[2]) == 1
+        assert len(asyncio.run(retriever.retrieve_many_async(["甲", "乙"]))[1]) == 1
+        assert retriever.embedding_service.use_cache == [False, False]
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import random
+import sys
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.corpus_events import CorpusEvents, DocumentIndexedEvent
+from src.services.keyword_index import KeywordIndex, tokenize
+from src.services.rank_fusion import reciprocal_rank_fusion
+from src.services.vector_store import SearchResult
+
+
+def _index():
+    index = KeywordIndex()
+    index.add(1, [10, 11], ["员工请假需提前三天申请", "年假天数按工龄计算"])
+    index.add(2, [20, 21], ["保单号 PL-2023-0815 的理赔流程", "理赔材料需在三十天内提交"])
+    index.add(3, [30], ["Travel expense policy for employees"])
+    return index
+
+
+class TestTokenize:
+    def test_chinese_bigrams_and_ascii_words(self):
+        assert tokenize("年假天数") == ["年假", "假天", "天数"]
+        assert tokenize("第3条") == ["第", "3", "条"]
+        assert tokenize("Expense Policy") == ["expense", "policy"]
+
+    def test_identifier_kept_whole_and_split(self):
+        assert tokenize("PL-2023-0815") == ["pl-2023-0815", "pl", "2023", "0815"]
+
+
+class TestKeywordIndex:
+    def test_exact_identifier_ranks_first(self):
+        results = _index().search("PL-2023-0815 怎么理赔", top_k=2)
+        assert [r[0] for r in results] == [20, 21]
+        assert results[0][1] == 2
+
+    def test_document_filter(self):
+        results = _index().search("理赔 请假", top_k=5, document_ids=[1])
+        assert [r[0] for r in results] == [10]
+
+    def test_remove_and_reindex(self):
+        index = _index()
+        index.remove_document(2)
+        assert index.search("理赔", top_k=5) == []
+        assert len(index) == 3
+
+        index.add(2, [22], ["新的理赔规定"])
+        assert [r[0] for r in index.search("理赔", top_k=5)] == [22]
+        assert [r[0] for r in index.search("expense", top_k=5)] == [30]
+
+    def test_document_events_update_index_off_the_event_loop(self, monkeypatch):
+        index = _index()
+        events = CorpusEvents()
+        events.subscribe(index)
+        threads = []
+        add = index.add
+
+        def recording_add(*args):
+            threads.append(threading.current_thread())
+            return add(*args)
+
+        monkeypatch.setattr(index, "add", recording_add)
+
+        async def publish():
+            events.document_indexed(
+                DocumentIndexedEvent(2, "理赔", [22], ["新的理赔规定"], np.zeros((1, 8)))
+            )
+            events.document_removed(3)
+            pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            await asyncio.gather(*pending)
+            return threading.current_thread()
+
+        loop_thread = asyncio.run(publish())
+
+        assert threads and all(thread is not loop_thread for thread in threads)
+        assert [r[0] for r in index.search("理赔", top_k=5)] == [22]
+        assert index.search("expense", top_k=5) == []
+
+    def test_compaction_keeps_results(self):
+        index = _index()
+        index.remove_document(1)
+        index.remove_document(3)
+        assert index.status()["tombstones"] == 0
+        assert {r[0] for r in index.search("理赔", top_k=5)} == {20, 21}
+
+    def test_pruned_top_k_matches_full_ranking(self):
+        rng = random.Random(0)
+        alphabet = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动"
+        index = KeywordIndex()
+        for document_id in range(40):
+            contents = ["".join(rng.choices(alphabet, k=40)) for _ in range(25)]
+            index.add(document_id, range(document_id * 100, document_id * 100 + 25), contents)
+        for document_id in range(0, 40, 5):
+            index.remove_document(document_id)
+
+        for _ in range(20):
+            query = "".join(rng.choices(alphabet, k=6))
+            full = index.search(query, top_k=1000)
+            assert [round(r[2], 4) for r in index.search(query, top_k=5)] == [
+                round(r[2], 4) for r in full[:5]
+            ]
+
+
+class TestReciprocalRankFusion:
+    def test_fuses_by_rank(self):
+        vector = [SearchResult(1, 1, "a", 0.9), SearchResult(2, 1, "b", 0.8)]
+        keyword = [SearchResult(3, 2, "c", 12.0), SearchResult(2, 1, "b", 7.5)]
+
+        fused = reciprocal_rank_fusion([vector, keyword], top_k=3, k=60)
+
+        assert [r.chunk_id for r in fused] == [2, 1, 3]
+        assert abs(fused[0].score - (1 / 62 + 1 / 62)) < 1e-9
+        assert vector[1].score == 0.8
@@ -0,0 +1,105 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.corpus_events import CorpusEvents
+from src.services.mmap_vector_store import MmapVectorIndex, MmapVectorStore
+
+
+def _random_vectors(count, dimension=8, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = MmapVectorIndex(str(tmp_path), dimension=8)
+    vectors = _random_vectors(30)
+    index.add(1, list(range(100, 110)), [f"a{i}" for i in range(10)], vectors[:10], "文档A")
+    index.add(2, list(range(200, 220)), [f"b{i}" for i in range(20)], vectors[10:], "文档B")
+    return index
+
+
+class TestMmapVectorIndex:
+    def test_search_matches_exact_ranking(self, index):
+        vectors = _random_vectors(30)
+        query = vectors[12] + 0.01
+        normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        expected = np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:5]
+
+        results = index.search(query, top_k=5)
+
+        chunk_ids = [100 + i if i < 10 else 200 + i - 10 for i in expected]
+        assert [r.chunk_id for r in results] == chunk_ids
+        assert results[0].chunk_id == 202
+        assert results[0].document_title == "文档B"
+        assert results[0].content == "b2"
+
+    def test_document_filter(self, index):
+        results = index.search(_random_vectors(30)[12], top_k=5, document_ids=[1])
+
+        assert len(results) == 5
+        assert all(r.document_id == 1 for r in results)
+
+    def test_min_score_prunes_before_top_k(self, index):
+        query = _random_vectors(30)[12]
+        ranked = index.search(query, top_k=30)
+        threshold = ranked[3].score
+
+        results = index.search(query, top_k=10, min_score=threshold)
+        scoped = index.search(query, top_k=10, document_ids=[1], min_score=threshold)
+
+        assert [r.chunk_id for r in results] == [r.chunk_id for r in ranked[:4]]
+        assert all(r.document_id == 1 and r.score >= threshold for r in scoped)
+
+    def test_top_k_larger_than_corpus(self, index):
+        assert len(index.search(_random_vectors(1, seed=5)[0], top_k=100)) == 30
+
+    def test_remove_document_and_compact(self, index):
+        assert index.remove_document(2) == 20
+        assert len(index) == 10
+        assert index.document_ids() == [1]
+
+        results = index.search(_random_vectors(30)[12], top_k=50)
+        assert {r.document_id for r in results} == {1}
+
+    def test_reload_from_disk(self, index, tmp_path):
+        index.remove_document(1)
+        reloaded = MmapVectorIndex(str(tmp_path), dimension=8)
+
+        assert len(reloaded) == 20
+        assert reloaded.document_vector_count(2) == 20
+        assert reloaded.search(_random_vectors(30)[12], top_k=1)[0].chunk_id == 202
+
+    def test_search_many_matches_single_queries(self, index):
+        queries = _random_vectors(4, seed=3)
+        batched = index.search_many(queries, top_k=3, document_ids=[2])
+
+        assert len(batched) == 4
+        for query, results in zip(queries, batched):
+            assert [r.chunk_id for r in results] == [
+                r.chunk_id for r in index.search(query, top_k=3, document_ids=[2])
+            ]
+
+
+class TestMmapVectorStore:
+    def test_same_interface_as_vector_store(self, index):
+        store = MmapVectorStore(index=index)
+
+        assert store.get_document_vector_count(1) == 10
+        assert sorted(store.get_all_document_ids()) == [1, 2]
+        assert len(store.search(_random_vectors(1)[0], top_k=3, ef_search=40)) == 3
+        assert store.delete_document_vectors(1) == 10
+
+    def test_removed_document_is_no_longer_searchable(self, index):
+        events = CorpusEvents()
+        events.subscribe(MmapVectorStore(index=index))
+
+        events.document_removed(2)
+
+        results = index.search(_random_vectors(30)[12], top_k=30)
+        assert {r.document_id for r in results} == {1}
+        assert index.document_vector_count(2) == 0
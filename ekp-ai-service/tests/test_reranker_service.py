@@ -0,0 +1,75 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import settings
+from src.services.reranker_service import PairScoreCache, RerankerService
+from src.services.vector_store import SearchResult
+
+
+class FakeCrossEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, pairs, batch_size=32):
+        self.calls.append(len(pairs))
+        return [1.0 if "年假" in content else 0.1 for _, content in pairs]
+
+
+def _results():
+    return [
+        SearchResult(1, 1, "报销流程", 0.9),
+        SearchResult(2, 1, "年假天数", 0.8),
+        SearchResult(3, 2, "差旅标准", 0.7),
+        SearchResult(4, 2, "年假申请", 0.6),
+    ]
+
+
+class TestRerankerService:
+    def test_reorders_with_one_batched_call(self):
+        model = FakeCrossEncoder()
+        reranker = RerankerService(model=model, cache=PairScoreCache(100))
+
+        reranked = reranker.rerank("年假有几天", _results(), top_k=3)
+
+        assert [r.chunk_id for r in reranked] == [2, 4, 1]
+        assert reranked[0].score == 1.0
+        assert model.calls == [4]
+
+    def test_cached_pairs_are_not_rescored(self):
+        model = FakeCrossEncoder()
+        reranker = RerankerService(model=model, cache=PairScoreCache(100))
+
+        reranker.rerank("年假有几天", _results()[:2], top_k=2)
+        reranker.rerank("年假有几天", _results(), top_k=2)
+        reranker.rerank("年假有几天", _results(), top_k=2)
+
+        assert model.calls == [2, 2]
+
+    def test_latency_budget_caps_candidates(self, monkeypatch):
+        monkeypatch.setattr(settings, "reranker_latency_budget_ms", 20.0)
+        monkeypatch.setattr(settings, "reranker_min_candidates", 2)
+        reranker = RerankerService(model=FakeCrossEncoder(), cache=PairScoreCache(100))
+        reranker._record_latency(elapsed_ms=40.0, pairs=4)
+
+        assert reranker.candidate_limit() == 2
+        reranked = reranker.rerank("年假有几天", _results(), top_k=4)
+        assert [r.chunk_id for r in reranked] == [2, 1, 3, 4]
+
+    def test_without_model_keeps_retrieval_order(self):
+        reranker = RerankerService(cache=PairScoreCache(100))
+        reranker._loaded = True
+
+        assert [r.chunk_id for r in reranker.rerank("q", _results(), top_k=2)] == [1, 2]
+
+
+class TestPairScoreCache:
+    def test_evicts_least_recently_used(self):
+        cache = PairScoreCache(max_entries=2)
+        cache.put_many("q", [1, 2], [0.1, 0.2])
+        cache.get_many("q", [1])
+        cache.put_many("q", [3], [0.3])
+
+        assert cache.get_many("q", [1, 2, 3]) == [0.1, None, 0.3]
+        assert cache.get_many("other", [1]) == [None]
@@ -0,0 +1,125 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services import retrieval_pipeline, retriever_service
+from src.services.retrieval_cache import RetrievalCache
+from src.services.retriever_service import RetrieverService
+from src.services.vector_store import SearchResult
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def setex(self, key, ttl, value):
+        self.values[key] = value
+        return True
+
+    async def incr(self, key):
+        self.values[key] = str(int(self.values.get(key, 0)) + 1)
+        return int(self.values[key])
+
+
+class FakeTextSearch:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.searches = 0
+
+    async def load_chunks(self, chunk_ids):
+        return {
+            chunk_id: self.chunks[chunk_id] for chunk_id in chunk_ids if chunk_id in self.chunks
+        }
+
+    async def search_chunks(self, query, top_k, document_ids):
+        self.searches += 1
+        return [SearchResult(1, 1, "年假规定", 0.8)]
+
+    async def match_titles(self, query, limit, document_ids):
+        return []
+
+
+class FakeEmbeddingService:
+    async def embed_single_text_async(self, text):
+        return [1.0, 0.0]
+
+
+class FakeRetriever(RetrieverService):
+    def __init__(self, text_search):
+        self.embedding_service = FakeEmbeddingService()
+        self.text_search = text_search
+
+    async def retrieve_relevant_chunks_async(self, query, top_k=5, document_ids=None, **kwargs):
+        return [SearchResult(2, 1, "请假流程", 0.9)]
+
+
+RESULTS = [SearchResult(1, 1, "年假规定", 0.9, "员工手册"), SearchResult(2, 1, "请假流程", 0.7, "员工手册")]
+CHUNKS = {1: ("年假规定", "员工手册"), 2: ("请假流程", "员工手册")}
+
+
+class TestRetrievalCache:
+    def test_key_ignores_case_whitespace_and_scope_order(self):
+        cache = RetrievalCache(FakeRedis())
+
+        key = cache.make_key(3, "年假 怎么算", [2, 1], 5, {"mode": "hybrid"})
+
+        assert cache.make_key(3, "  年假\t怎么算 ", [1, 2, 2], 5, {"mode": "hybrid"}) == key
+        assert cache.make_key(3, "ＡＢＣ", None, 5, {}) == cache.make_key(3, "abc", None, 5, {})
+        assert cache.make_key(4, "年假 怎么算", [1, 2], 5, {"mode": "hybrid"}) != key
+        assert cache.make_key(3, "年假 怎么算", [1, 2], 5, {"mode": "vector"}) != key
+
+    def test_other_instance_hydrates_from_redis_until_version_bump(self):
+        async def scenario():
+            redis = FakeRedis()
+            writer = RetrievalCache(redis)
+            reader = RetrievalCache(redis)
+            loader = FakeTextSearch(CHUNKS).load_chunks
+            key = writer.make_key(await writer.corpus_version(), "年假", None, 5, {})
+            await writer.put(key, RESULTS)
+
+            shared = await reader.get(key, loader)
+            await writer.bump_version()
+            reader._version = None
+            stale_key = reader.make_key(await reader.corpus_version(), "年假", None, 5, {})
+            return shared, stale_key != key, await reader.get(stale_key, loader)
+
+        shared, changed, stale = asyncio.run(scenario())
+        assert shared == RESULTS
+        assert changed
+        assert stale is None
+
+    def test_missing_chunk_is_a_miss_and_lru_evicts_oldest(self):
+        async def scenario():
+            cache = RetrievalCache(FakeRedis(), max_entries=2)
+            for name in ("a", "b", "c"):
+                await cache.put(name, RESULTS)
+            cache._local.pop("c")
+            partial = await cache.get("c", FakeTextSearch({1: CHUNKS[1]}).load_chunks)
+            return partial, list(cache._local), cache.status()
+
+        partial, local, status = asyncio.run(scenario())
+        assert partial is None
+        assert local == ["b"]
+        assert status["misses"] == 1
+
+    def test_repeated_hybrid_query_is_served_from_cache(self, monkeypatch):
+        cache = RetrievalCache(FakeRedis())
+        monkeypatch.setattr(retriever_service, "retrieval_cache", cache)
+        monkeypatch.setattr(retrieval_pipeline, "retrieval_cache", cache)
+        text_search = FakeTextSearch(CHUNKS)
+        retriever = FakeRetriever(text_search)
+
+        async def scenario():
+            first, _ = await retriever.hybrid_search_async("年假怎么算", top_k=2)
+            second, timings = await retriever.hybrid_search_async("年假怎么算 ", top_k=2)
+            return first, second, timings
+
+        first, second, timings = asyncio.run(scenario())
+        assert second == first
+        assert text_search.searches == 1
+        assert [(t.branch, t.status) for t in timings] == [("cache", "hit"), ("total", "ok")]
@@ -0,0 +1,153 @@
+import asyncio
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import settings
+from src.services import retrieval_pipeline
+from src.services.retrieval_pipeline import RetrievalState, get_pipeline
+from src.services.retriever_service import RetrieverService
+from src.services.vector_store import SearchResult
+
+
+@pytest.fixture(autouse=True)
+def no_retrieval_cache(monkeypatch):
+    monkeypatch.setattr(settings, "retrieval_cache_enabled", False)
+
+
+class FakeEmbeddingService:
+    def __init__(self, fail=False):
+        self.fail = fail
+
+    async def embed_single_text_async(self, text):
+        if self.fail:
+            raise RuntimeError("model down")
+        return np.ones(4, dtype=np.float32)
+
+
+class FakeTextSearch:
+    async def match_titles(self, query, limit, document_ids):
+        return [2]
+
+    async def load_neighbors(self, chunk_ids, window=1):
+        return []
+
+
+class FakeRetriever(RetrieverService):
+    def __init__(self, embed_fail=False, vector_delay=0.0):
+        self.embedding_service = FakeEmbeddingService(embed_fail)
+        self.text_search = FakeTextSearch()
+        self.vector_calls = 0
+        self.vector_delay = vector_delay
+
+    async def retrieve_relevant_chunks_async(self, query, top_k=5, document_ids=None, **kwargs):
+        self.vector_calls += 1
+        await asyncio.sleep(self.vector_delay)
+        return [
+            SearchResult(10, 1, "a", 0.9),
+            SearchResult(11, 1, "b", 0.8),
+            SearchResult(20, 2, "c", 0.7),
+        ]
+
+    async def keyword_branch(self, query, top_k, document_ids):
+        return [SearchResult(30, 3, "关键词命中", 0.8), SearchResult(11, 1, "b", 0.5)]
+
+
+class SlowReranker:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    async def rerank_async(self, query, results, top_k):
+        await asyncio.sleep(self.delay)
+        return list(reversed(results))[:top_k]
+
+
+def run(name, retriever, **options):
+    state = RetrievalState(query="年假怎么算", top_k=3, **options)
+    return asyncio.run(get_pipeline(name).run(retriever, state))
+
+
+class TestRetrievalPipeline:
+    def test_hybrid_pipeline_records_every_stage(self):
+        state = run("hybrid", FakeRetriever(), rerank=False, diversify=False)
+
+        assert [t.branch for t in state.timings] == [
+            "embed", "vector", "keyword", "metadata", "candidates", "fusion", "context", "total",
+        ]
+        assert all(t.status == "ok" for t in state.timings)
+        assert state.results[0].chunk_id == 11
+        assert len(state.results) == 3
+        assert state.context.sources[0].chunk_id == 11
+
+    def test_keyword_only_hit_survives_context_trim(self):
+        class SharedTopRetriever(FakeRetriever):
+            async def keyword_branch(self, query, top_k, document_ids):
+                return [SearchResult(10, 1, "a", 9.0), SearchResult(30, 3, "关键词命中", 5.0)]
+
+        state = RetrievalState(query="年假怎么算", top_k=5, rerank=False, diversify=False)
+        state = asyncio.run(get_pipeline("hybrid").run(SharedTopRetriever(), state))
+
+        # 两路都召回的 10 得满分，只被关键词召回的 30 不到其一半，融合分数不按比例裁剪
+        assert not state.cosine_scores
+        assert state.results[-1].chunk_id == 30
+        assert state.results[-1].score < 0.5 * state.results[0].score
+        assert 30 in [r.chunk_id for r in state.context.sources]
+
+    def test_stage_over_budget_degrades_and_pipeline_continues(self, monkeypatch):
+        monkeypatch.setattr(settings, "pipeline_rerank_budget_ms", 20.0)
+        monkeypatch.setattr(
+            retrieval_pipeline, "get_reranker_service", lambda: SlowReranker(delay=0.5)
+        )
+
+        state = run("hybrid", FakeRetriever(), rerank=True, diversify=False)
+
+        by_stage = {t.branch: t for t in state.timings}
+        assert by_stage["rerank"].status == "timeout"
+        assert by_stage["rerank"].elapsed_ms < 200
+        assert by_stage["context"].status == "ok"
+        assert state.results[0].chunk_id == 11
+
+    def test_slow_branch_keeps_finished_branches_when_stage_budget_runs_out(self, monkeypatch):
+        # 分支超时等于阶段预算，阶段的 wait_for 可能先于分支超时触发
+        monkeypatch.setattr(settings, "pipeline_fast_candidates_budget_ms", 200.0)
+        monkeypatch.setattr(settings, "retrieval_vector_timeout", 3.0)
+
+        state = run("fast", FakeRetriever(vector_delay=1.0))
+
+        by_stage = {t.branch: t for t in state.timings}
+        assert by_stage["keyword"].status == "ok"
+        assert by_stage["keyword"].results == 2
+        assert by_stage["vector"].status == "timeout"
+        assert by_stage["candidates"].elapsed_ms < 800
+        assert [r.chunk_id for r in state.results] == [30, 11]
+
+    def test_embedding_failure_falls_back_to_keyword_branch(self):
+        retriever = FakeRetriever(embed_fail=True)
+
+        state = run("fast", retriever)
+
+        by_stage = {t.branch: t for t in state.timings}
+        assert by_stage["embed"].status == "error"
+        assert "vector" not in by_stage
+        assert retriever.vector_calls == 0
+        assert [r.chunk_id for r in state.results] == [30, 11]
+
+    def test_pipeline_defaults_and_request_overrides(self, monkeypatch):
+        monkeypatch.setattr(settings, "reranker_enabled", True)
+        monkeypatch.setattr(retrieval_pipeline, "get_reranker_service", lambda: SlowReranker())
+
+        fast = run("fast", FakeRetriever(), query_embedding=np.ones(4, dtype=np.float32))
+        forced = run("fast", FakeRetriever(), rerank=True)
+
+        assert "embed" not in [t.branch for t in fast.timings]
+        assert "rerank" not in [t.branch for t in fast.timings]
+        assert "rerank" in [t.branch for t in forced.timings]
+        assert get_pipeline("unknown") is None
+
+    def test_stage_run_is_abstract(self):
+        with pytest.raises(TypeError):
+            retrieval_pipeline.Stage(10.0)
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import settings
+from src.services.async_vector_store import AsyncVectorStore
+from src.services.search_planner import needs_widening, plan_search, widen_plan
+from src.services.vector_schema import COMPACT_SCHEMA, FULL_SCHEMA, build_search_sql
+
+
+class TestSearchPlanner:
+    def test_narrow_scope_uses_exact_scan(self):
+        plan = plan_search(top_k=5, scoped_rows=300, total_rows=2_000_000)
+        assert plan.strategy == "exact"
+        assert plan.fetch_k == 5
+
+    def test_broad_scope_overfetches_ann(self):
+        plan = plan_search(top_k=5, scoped_rows=500_000, total_rows=1_000_000, ef_search=40)
+        assert plan.strategy == "ann"
+        assert plan.selectivity == 0.5
+        assert plan.fetch_k == 5 * 2 * settings.vector_planner_overfetch
+        assert plan.ef_search == 40
+
+    def test_ef_search_covers_fetch_k(self):
+        plan = plan_search(top_k=10, scoped_rows=100_000, total_rows=1_000_000)
+        assert plan.fetch_k == 200
+        assert plan.ef_search == 200
+
+    def test_low_selectivity_large_scope_falls_back_to_exact(self):
+        plan = plan_search(top_k=10, scoped_rows=50_000, total_rows=10_000_000)
+        assert plan.strategy == "exact"
+
+    def test_widen_doubles_then_switches_to_exact(self):
+        plan = plan_search(top_k=10, scoped_rows=100_000, total_rows=1_000_000)
+        wider = widen_plan(plan, 10)
+        assert wider.fetch_k == 400 and wider.ef_search == 400
+
+        widest = widen_plan(widen_plan(wider, 10), 10)
+        assert widest.fetch_k == settings.vector_planner_max_fetch
+        assert widen_plan(widest, 10).strategy == "exact"
+
+    def test_threshold_pruning_does_not_widen(self):
+        plan = plan_search(top_k=10, scoped_rows=100_000, total_rows=1_000_000)
+
+        assert needs_widening(plan, 3, 10)
+        assert needs_widening(plan, 3, 10, horizon=0.2, max_distance=0.3)
+        assert not needs_widening(plan, 3, 10, horizon=0.5, max_distance=0.3)
+        assert not needs_widening(plan, 10, 10)
+        assert not needs_widening(None, 0, 10)
+
+    def test_exact_sql_materializes_scope(self):
+        query = build_search_sql(COMPACT_SCHEMA, "$1", "$2", "$3::bigint[]", "exact", "$4")
+        assert "AS MATERIALIZED" in query
+        assert "WHERE document_id = ANY($3::bigint[])" in query
+        assert "$4" not in query
+
+    def test_ann_sql_filters_overfetched_candidates(self):
+        query = build_search_sql(FULL_SCHEMA, "$1", "$2", "$3::bigint[]", "ann", "$4")
+        assert "LIMIT $4" in query
+        assert "candidates.document_id = ANY($3::bigint[])" in query
+        assert "MATERIALIZED" not in query
+
+    def test_all_candidates_below_threshold_stop_without_widening(self):
+        conn = FakeConnection(
+            stats=(1_000_000, 100_000),
+            rows=[{"chunk_id": None, "document_id": None, "horizon": 0.6}],
+        )
+        store = AsyncVectorStore(pool=object(), schema=FULL_SCHEMA)
+
+        rows = asyncio.run(
+            store._search_planned(conn, np.ones(4, dtype=np.float32), 10, [1, 2], None, None, 0.3)
+        )
+
+        assert rows == []
+        assert len(conn.fetched) == 1
+        assert "bounds.horizon" in conn.fetched[0]
+
+
+class FakeConnection:
+    def __init__(self, stats, rows):
+        self.stats = stats
+        self.rows = rows
+        self.fetched = []
+
+    async def fetchrow(self, sql, *args):
+        return self.stats
+
+    async def execute(self, sql):
+        pass
+
+    async def fetch(self, sql, *args):
+        self.fetched.append(sql)
+        return self.rows
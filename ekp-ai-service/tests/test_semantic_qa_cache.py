@@ -0,0 +1,191 @@
+import asyncio
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.cache_service import SemanticQACache
+from src.services.corpus_events import corpus_events
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+        self.sets = {}
+        self.zsets = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def setex(self, key, ttl, value):
+        self.values[key] = value
+        return True
+
+    async def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    async def incr(self, key):
+        self.values[key] = str(int(self.values.get(key, 0)) + 1)
+        return int(self.values[key])
+
+    async def expire(self, key, ttl):
+        return True
+
+    async def delete(self, *keys):
+        removed = 0
+        for key in keys:
+            removed += self.values.pop(key, None) is not None
+            removed += self.sets.pop(key, None) is not None
+        return removed
+
+    async def sadd(self, key, *members):
+        self.sets.setdefault(key, set()).update(str(m) for m in members)
+
+    async def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+    async def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    async def zrem(self, key, *members):
+        for member in members:
+            self.zsets.get(key, {}).pop(member, None)
+
+    async def zremrangebyrank(self, key, start, stop):
+        members = sorted(self.zsets.get(key, {}).items(), key=lambda item: item[1])
+        stop = len(members) + stop if stop < 0 else stop
+        for member, _ in members[start:stop + 1]:
+            del self.zsets[key][member]
+
+    async def zrangebyscore(self, key, low, high):
+        low = float(low[1:]) if low.startswith("(") else float(low)
+        members = sorted(self.zsets.get(key, {}).items(), key=lambda item: item[1])
+        return [member for member, score in members if score > low]
+
+
+def unit(*values):
+    vector = np.zeros(8, dtype=np.float32)
+    vector[:len(values)] = values
+    return vector
+
+
+def sources(*document_ids):
+    return [
+        {
+            "chunk_id": i,
+            "document_id": d,
+            "document_title": None,
+            "content": "...",
+            "relevance_score": 0.9,
+        }
+        for i, d in enumerate(document_ids)
+    ]
+
+
+class TestSemanticQACache:
+    def test_similar_question_hits_within_scope(self):
+        async def scenario():
+            cache = SemanticQACache(FakeRedis(), dimension=8, threshold=0.9)
+            scope = SemanticQACache.scope_key("hybrid", None, 5)
+            await cache.store("年假怎么算？", unit(1, 0.1), scope, "按工龄计算", sources(1))
+
+            hit = await cache.lookup(unit(1, 0.15), scope)
+            far = await cache.lookup(unit(1, 1), scope)
+            other_scope = await cache.lookup(
+                unit(1, 0.1), SemanticQACache.scope_key("hybrid", [2], 5)
+            )
+            return hit, far, other_scope
+
+        hit, far, other_scope = asyncio.run(scenario())
+        assert hit["answer"] == "按工龄计算"
+        assert hit["similarity"] > 0.99
+        assert "embedding" not in hit
+        assert far is None
+        assert other_scope is None
+
+    def test_retrieval_options_are_part_of_scope(self):
+        async def scenario():
+            cache = SemanticQACache(FakeRedis(), dimension=8, threshold=0.9)
+            scope = SemanticQACache.scope_key("hybrid", None, 5, rerank=True, diversify=False)
+            await cache.store("年假怎么算？", unit(1, 0.1), scope, "按工龄计算", sources(1))
+
+            options = [
+                {"rerank": False, "diversify": False},
+                {"rerank": True, "diversify": True},
+                {"rerank": True, "diversify": False, "ef_search": 200},
+                {"rerank": True, "diversify": False, "probes": 20},
+            ]
+            misses = [
+                await cache.lookup(unit(1, 0.1), SemanticQACache.scope_key("hybrid", None, 5, **o))
+                for o in options
+            ]
+            same = SemanticQACache.scope_key("hybrid", None, 5, rerank=True, diversify=False)
+            return misses, await cache.lookup(unit(1, 0.1), same)
+
+        misses, hit = asyncio.run(scenario())
+        assert misses == [None] * 4
+        assert hit["answer"] == "按工龄计算"
+
+    def test_source_document_invalidation_is_shared_across_instances(self):
+        async def scenario():
+            redis = FakeRedis()
+            writer = SemanticQACache(redis, dimension=8, threshold=0.9)
+            reader = SemanticQACache(redis, dimension=8, threshold=0.9)
+            scope = SemanticQACache.scope_key("vector", None, 5)
+            await writer.store("问题一", unit(1), scope, "答案一", sources(1, 2))
+            await writer.store("问题二", unit(0, 1), scope, "答案二", sources(3))
+
+            before = await reader.lookup(unit(1), scope)
+            removed = await writer.invalidate_documents([2])
+            after = await reader.lookup(unit(1), scope)
+            untouched = await reader.lookup(unit(0, 1), scope)
+            return before, removed, after, untouched, len(reader)
+
+        before, removed, after, untouched, reader_entries = asyncio.run(scenario())
+        assert before["answer"] == "答案一"
+        assert removed == 1
+        assert after is None
+        assert untouched["answer"] == "答案二"
+        assert reader_entries == 1
+
+    def test_store_is_skipped_when_documents_changed_meanwhile(self):
+        async def scenario():
+            cache = SemanticQACache(FakeRedis(), dimension=8)
+            epoch = await cache.epoch()
+            await cache.invalidate_documents([7])
+            stored = await cache.store("问题", unit(1), "s", "旧答案", sources(1), epoch=epoch)
+            without_sources = await cache.store("问题", unit(1), "s", "答案", [])
+            return stored, without_sources
+
+        assert asyncio.run(scenario()) == (None, None)
+
+    def test_corpus_event_from_worker_thread_invalidates_entries(self):
+        async def scenario():
+            cache = SemanticQACache(FakeRedis(), dimension=8, threshold=0.9)
+            corpus_events.bind_loop(asyncio.get_running_loop())
+            await cache.start()
+            try:
+                await cache.store("问题", unit(1), "s", "答案", sources(4))
+                await asyncio.to_thread(corpus_events.document_removed, 4)
+                await asyncio.sleep(0.05)
+                return await cache.lookup(unit(1), "s")
+            finally:
+                corpus_events.unsubscribe(cache)
+                corpus_events.bind_loop(None)
+
+        assert asyncio.run(scenario()) is None
+
+    def test_capacity_keeps_newest_entries(self):
+        async def scenario():
+            cache = SemanticQACache(FakeRedis(), dimension=8, threshold=0.9, max_entries=64)
+            for i in range(100):
+                vector = np.random.default_rng(i).normal(size=8).astype(np.float32)
+                await cache.store(f"问题{i}", vector, "s", f"答案{i}", sources(i + 1))
+            newest = await cache.lookup(np.random.default_rng(99).normal(size=8), "s")
+            return len(cache), newest
+
+        entries, newest = asyncio.run(scenario())
+        assert entries <= 64
+        assert newest["answer"] == "答案99"
@@ -0,0 +1,189 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.corpus_events import CorpusEvents
+from src.services.mmap_vector_store import MmapVectorIndex
+from src.services.sharded_vector_store import ShardedVectorStore, merge_top_k, shard_for
+from src.services.vector_store import SearchResult
+
+
+def _random_vectors(count, dimension=8, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+
+
+def _chunks(document_id, count):
+    return [
+        SimpleNamespace(id=document_id * 100 + i, content=f"{document_id}-{i}")
+        for i in range(count)
+    ]
+
+
+class RequestSession:
+    def __getattr__(self, name):
+        raise AssertionError(f"异步检索不应使用请求的 Session: {name}")
+
+
+class FakeTextSearch:
+    def __init__(self, titles):
+        self.titles = titles
+
+    async def load_titles(self, document_ids):
+        return {d: self.titles[d] for d in document_ids if d in self.titles}
+
+
+def _store(tmp_path, shard_count):
+    shards = [MmapVectorIndex(str(tmp_path / f"shard{i}"), dimension=8) for i in range(shard_count)]
+    return ShardedVectorStore(shards=shards)
+
+
+class TestShardFor:
+    def test_growing_only_moves_documents_to_new_shard(self):
+        for document_id in range(1, 2000):
+            before, after = shard_for(document_id, 4), shard_for(document_id, 5)
+            assert 0 <= before < 4
+            assert after in (before, 4)
+
+        moved = sum(shard_for(d, 4) != shard_for(d, 5) for d in range(1, 2000))
+        assert 250 < moved < 550
+
+
+class TestShardedVectorStore:
+    def test_merge_top_k_orders_by_score(self):
+        partials = [
+            [SearchResult(1, 1, "a", 0.9), SearchResult(2, 1, "b", 0.3)],
+            [SearchResult(3, 2, "c", 0.7)],
+        ]
+        assert [r.chunk_id for r in merge_top_k(partials, 2)] == [1, 3]
+
+    def test_search_matches_single_index(self, tmp_path):
+        store = _store(tmp_path, 3)
+        reference = MmapVectorIndex(str(tmp_path / "reference"), dimension=8)
+        vectors = _random_vectors(60)
+        for document_id in range(1, 7):
+            chunks = _chunks(document_id, 10)
+            part = vectors[(document_id - 1) * 10:document_id * 10]
+            store.add_vectors(document_id, chunks, part)
+            reference.add(document_id, [c.id for c in chunks], [c.content for c in chunks], part)
+
+        query = vectors[33] + 0.05
+        assert [r.chunk_id for r in store.search(query, top_k=8)] == [
+            r.chunk_id for r in reference.search(query, top_k=8)
+        ]
+        batched = store.search_many(np.stack([query, vectors[5]]), top_k=8)
+        assert [r.chunk_id for r in batched[0]] == [r.chunk_id for r in reference.search(query, 8)]
+        assert sorted(store.get_all_document_ids()) == list(range(1, 7))
+
+    def test_scoped_search_only_queries_owner_shards(self, tmp_path):
+        store = _store(tmp_path, 3)
+        vectors = _random_vectors(40)
+        for document_id in range(1, 5):
+            part = vectors[(document_id - 1) * 10:document_id * 10]
+            store.add_vectors(document_id, _chunks(document_id, 10), part)
+
+        owner = store.shard_for(2)
+        assert store.shards[owner].document_vector_count(2) == 10
+        asyncio.run(store.placement.watch())
+        assert store._target_shards([2]) == [store.shards[owner]]
+
+        results = store.search(vectors[0], top_k=5, document_ids=[2])
+        assert len(results) == 5
+        assert {r.document_id for r in results} == {2}
+
+    def test_rebalance_after_adding_shard(self, tmp_path):
+        store = _store(tmp_path, 2)
+        vectors = _random_vectors(200)
+        for document_id in range(1, 21):
+            part = vectors[(document_id - 1) * 10:document_id * 10]
+            store.add_vectors(document_id, _chunks(document_id, 10), part)
+
+        grown = ShardedVectorStore(
+            shards=store.shards + [MmapVectorIndex(str(tmp_path / "shard2"), dimension=8)]
+        )
+        expected = sum(shard_for(d, 2) != shard_for(d, 3) for d in range(1, 21))
+        assert grown.rebalance(dry_run=True)["documents"] == expected
+        assert grown.rebalance() == {"documents": expected, "vectors": expected * 10}
+        assert grown.rebalance()["documents"] == 0
+
+        for document_id in range(1, 21):
+            assert grown.get_document_vector_count(document_id) == 10
+        results = grown.search(vectors[55], top_k=1)
+        assert results[0].chunk_id == 605
+
+    def test_scoped_search_finds_documents_not_yet_rebalanced(self, tmp_path):
+        store = _store(tmp_path, 2)
+        vectors = _random_vectors(200)
+        for document_id in range(1, 21):
+            part = vectors[(document_id - 1) * 10:document_id * 10]
+            store.add_vectors(document_id, _chunks(document_id, 10), part)
+
+        grown = ShardedVectorStore(
+            shards=store.shards + [MmapVectorIndex(str(tmp_path / "shard2"), dimension=8)]
+        )
+        moved = next(d for d in range(1, 21) if shard_for(d, 2) != shard_for(d, 3))
+        query = vectors[(moved - 1) * 10]
+
+        assert grown._target_shards([moved]) == grown.shards
+        results = grown.search(query, top_k=3, document_ids=[moved])
+        assert len(results) == 3 and {r.document_id for r in results} == {moved}
+
+        grown.rebalance()
+        assert grown._target_shards([moved]) == [grown.shards[grown.shard_for(moved)]]
+        assert len(grown.search(query, top_k=3, document_ids=[moved])) == 3
+
+    def test_removed_document_is_deleted_from_shards(self, tmp_path):
+        store = _store(tmp_path, 3)
+        vectors = _random_vectors(40)
+        for document_id in range(1, 5):
+            part = vectors[(document_id - 1) * 10:document_id * 10]
+            store.add_vectors(document_id, _chunks(document_id, 10), part)
+        events = CorpusEvents()
+        events.subscribe(store)
+
+        events.document_removed(3)
+
+        assert all(r.document_id != 3 for r in store.search(vectors[25], top_k=40))
+        assert store.search(vectors[25], top_k=5, document_ids=[3]) == []
+        assert sorted(store.get_all_document_ids()) == [1, 2, 4]
+
+    def test_placement_is_checked_off_the_request_path(self, tmp_path, monkeypatch):
+        store = _store(tmp_path, 2)
+        vectors = _random_vectors(30)
+        for document_id in range(1, 4):
+            part = vectors[(document_id - 1) * 10:document_id * 10]
+            store.add_vectors(document_id, _chunks(document_id, 10), part)
+        scans = []
+        for shard in store.shards:
+            def document_ids(original=shard.document_ids):
+                scans.append(1)
+                return original()
+
+            monkeypatch.setattr(shard, "document_ids", document_ids)
+
+        results = asyncio.run(store.search_async(vectors[0], top_k=3, document_ids=[1]))
+        assert {r.document_id for r in results} == {1}
+        assert store._target_shards([1]) == store.shards
+        assert scans == []
+
+        asyncio.run(store.placement.watch())
+        assert len(scans) == 2
+        assert store._target_shards([1]) == [store.shards[store.shard_for(1)]]
+
+    def test_search_async_loads_titles_without_the_session(self, tmp_path):
+        store = _store(tmp_path, 2)
+        vectors = _random_vectors(20)
+        for document_id in (1, 2):
+            part = vectors[(document_id - 1) * 10:document_id * 10]
+            store.add_vectors(document_id, _chunks(document_id, 10), part)
+        store.db = RequestSession()
+        store.text_search = FakeTextSearch({1: "文档一", 2: "文档二"})
+
+        results = asyncio.run(store.search_async(vectors[0], top_k=20))
+
+        assert len(results) == 20
+        assert all(r.document_title == {1: "文档一", 2: "文档二"}[r.document_id] for r in results)
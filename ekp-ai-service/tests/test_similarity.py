@@ -0,0 +1,69 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.mmap_vector_store import MmapVectorIndex
+from src.services.retriever_service import diversify_results
+from src.services.similarity import cosine_similarity_matrix, mmr_select
+from src.services.vector_store import SearchResult
+
+
+class TestSimilarity:
+    def test_similarity_matrix_matches_pairwise_cosine(self):
+        rng = np.random.default_rng(0)
+        a = rng.normal(size=(4, 16)).astype(np.float32)
+        b = rng.normal(size=(3, 16)).astype(np.float32)
+        b[1] = 0
+
+        matrix = cosine_similarity_matrix(a, b)
+
+        assert matrix.shape == (4, 3)
+        assert matrix.dtype == np.float32
+        expected = a[2] @ b[2] / (np.linalg.norm(a[2]) * np.linalg.norm(b[2]))
+        assert np.isclose(matrix[2, 2], expected, atol=1e-6)
+        assert np.all(matrix[:, 1] == 0)
+        assert np.allclose(np.diag(cosine_similarity_matrix(a)), 1.0, atol=1e-6)
+
+    def test_lambda_one_keeps_relevance_order(self):
+        rng = np.random.default_rng(1)
+        embeddings = rng.normal(size=(20, 8)).astype(np.float32)
+        relevance = rng.random(20)
+
+        selected = mmr_select(relevance, embeddings, 5, lambda_mult=1.0)
+
+        assert selected == list(np.argsort(-relevance)[:5])
+
+    def test_near_duplicate_is_skipped(self):
+        embeddings = np.array([[1, 0, 0], [0.99, 0.01, 0], [0, 1, 0], [0, 0, 1]], dtype=np.float32)
+        relevance = [1.0, 0.95, 0.7, 0.6]
+
+        assert mmr_select(relevance, embeddings, 3, lambda_mult=0.5) == [0, 2, 3]
+        assert mmr_select(relevance, embeddings, 10) == [0, 2, 3, 1]
+        assert mmr_select(relevance, embeddings, 0) == []
+
+    def test_diversify_results_uses_upstream_scores(self):
+        results = [
+            SearchResult(1, 1, "a", 0.9),
+            SearchResult(2, 1, "a'", 0.89),
+            SearchResult(3, 2, "b", 0.5),
+        ]
+        embeddings = np.array([[1, 0], [1, 0.01], [0, 1]], dtype=np.float32)
+
+        picked = diversify_results(results, embeddings, 2, lambda_mult=0.5)
+
+        assert [r.chunk_id for r in picked] == [1, 3]
+
+    def test_mmap_index_returns_stored_embeddings(self, tmp_path):
+        index = MmapVectorIndex(str(tmp_path), dimension=4)
+        embeddings = np.eye(4, dtype=np.float32) * 2
+        index.add(1, [10, 11], ["a", "b"], embeddings[:2])
+        index.add(2, [20], ["c"], embeddings[2:3])
+        index.remove_document(2)
+
+        found = index.get_embeddings([11, 20, 99])
+
+        assert list(found) == [11]
+        assert np.allclose(found[11], [0, 1, 0, 0])
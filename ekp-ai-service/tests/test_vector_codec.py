@@ -0,0 +1,59 @@
+import sys
+import os
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.vector_codec import (
+    as_matrix,
+    as_vector,
+    copy_binary_stream,
+    encode_int8,
+    encode_text,
+    from_halfvec_binary,
+    from_pgvector_binary,
+    from_pgvector_text,
+    to_halfvec_binary,
+    to_pgvector_binary,
+    to_pgvector_text,
+)
+
+
+class TestVectorCodec:
+    def test_text_roundtrip_is_exact_for_float32(self):
+        vector = np.random.default_rng(0).standard_normal(1024).astype(np.float32)
+        assert np.array_equal(from_pgvector_text(to_pgvector_text(vector)), vector)
+
+    def test_binary_layout(self):
+        encoded = to_pgvector_binary([1.0, -2.5])
+        assert encoded[:4] == b"\x00\x02\x00\x00"
+        assert len(encoded) == 4 + 2 * 4
+        assert np.array_equal(from_pgvector_binary(encoded), np.array([1.0, -2.5], np.float32))
+
+    def test_halfvec_binary_layout(self):
+        encoded = to_halfvec_binary([1.0, -2.5])
+        assert encoded == b"\x00\x02\x00\x00" + np.array([1.0, -2.5], ">f2").tobytes()
+        assert np.array_equal(from_halfvec_binary(encoded), np.array([1.0, -2.5], np.float32))
+
+    def test_as_vector_rejects_matrix(self):
+        with pytest.raises(ValueError):
+            as_vector(np.zeros((2, 3)))
+
+    def test_as_matrix_is_contiguous_float32(self):
+        matrix = as_matrix(np.arange(12, dtype=np.float64).reshape(3, 4)[:, ::2])
+        assert matrix.dtype == np.float32
+        assert matrix.flags["C_CONTIGUOUS"]
+
+    def test_copy_binary_stream_layout(self):
+        data = copy_binary_stream([(encode_int8(7), encode_text("中"), None)]).getvalue()
+        assert data.startswith(b"PGCOPY\n\xff\r\n\x00" + b"\x00" * 8)
+        body = data[19:]
+        assert body[:2] == b"\x00\x03"
+        assert body[2:6] == b"\x00\x00\x00\x08"
+        assert body[6:14] == (7).to_bytes(8, "big")
+        assert body[14:18] == b"\x00\x00\x00\x03"
+        assert body[18:21] == "中".encode("utf-8")
+        assert body[21:25] == b"\xff\xff\xff\xff"
+        assert body[25:] == b"\xff\xff"
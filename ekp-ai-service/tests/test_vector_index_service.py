@@ -0,0 +1,45 @@
+import sys
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.vector_schema import COMPACT_SCHEMA
+from src.services.vector_index_service import (
+    VectorIndexService,
+    default_ivfflat_lists,
+    search_settings_sql,
+)
+
+
+class TestVectorIndexService:
+    def test_search_settings_sql(self):
+        assert search_settings_sql() is None
+        assert search_settings_sql(ef_search=100) == "SET LOCAL hnsw.ef_search = 100"
+        assert search_settings_sql(ef_search=64, probes=8) == (
+            "SET LOCAL hnsw.ef_search = 64; SET LOCAL ivfflat.probes = 8"
+        )
+
+    def test_search_settings_sql_rejects_non_integer(self):
+        with pytest.raises(ValueError):
+            search_settings_sql(ef_search="10; DROP TABLE documents")
+
+    def test_default_ivfflat_lists(self):
+        assert default_ivfflat_lists(0) == 10
+        assert default_ivfflat_lists(500_000) == 500
+        assert default_ivfflat_lists(4_000_000) == 2000
+
+    def test_default_index_name(self):
+        service = VectorIndexService(database_url="postgresql://unused")
+        assert service.default_index_name("hnsw") == "idx_document_vectors_embedding_hnsw"
+
+    def test_compact_schema_uses_halfvec_opclass(self):
+        service = VectorIndexService(database_url="postgresql://unused", schema=COMPACT_SCHEMA)
+        assert service.default_index_name("hnsw") == "idx_document_vectors_half_embedding_hnsw"
+        assert service.opclass == "halfvec_cosine_ops"
+
+    def test_rejects_unknown_method(self):
+        service = VectorIndexService(database_url="postgresql://unused")
+        with pytest.raises(ValueError):
+            service.build_create_sql("diskann", "idx_x")
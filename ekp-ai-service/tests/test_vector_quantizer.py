@@ -0,0 +1,133 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import settings
+from src.services.mmap_vector_store import MmapVectorIndex
+from src.services.vector_quantizer import (
+    ProductQuantizer,
+    ScalarQuantizer,
+    create_quantizer,
+    load_quantizer,
+)
+
+
+def _vectors(count=500, dimension=16, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class TestProductQuantizer:
+    def test_encode_shape_and_scores_match_decoded(self):
+        vectors = _vectors()
+        quantizer = ProductQuantizer(16, subspaces=4, centroids=32)
+        quantizer.train(vectors, iterations=5)
+
+        codes = quantizer.encode(vectors)
+        assert codes.shape == (500, 4)
+        assert codes.dtype == np.uint8
+
+        query = vectors[0]
+        expected = quantizer.decode(codes) @ query
+        assert np.allclose(quantizer.scores(query, codes), expected, atol=1e-4)
+
+    def test_rejects_indivisible_dimension(self):
+        with pytest.raises(ValueError):
+            ProductQuantizer(10, subspaces=4)
+
+    def test_save_and_load(self, tmp_path):
+        quantizer = ProductQuantizer(16, subspaces=4, centroids=8)
+        quantizer.train(_vectors(), iterations=2)
+        path = str(tmp_path / "pq.npz")
+        quantizer.save(path)
+
+        loaded = load_quantizer(path)
+        assert isinstance(loaded, ProductQuantizer)
+        assert np.array_equal(loaded.encode(_vectors()), quantizer.encode(_vectors()))
+
+
+class TestScalarQuantizer:
+    def test_round_trip_error_is_small(self):
+        vectors = _vectors()
+        quantizer = create_quantizer("sq8", 16)
+        quantizer.train(vectors)
+
+        codes = quantizer.encode(vectors)
+        assert codes.dtype == np.int8
+        assert np.abs(quantizer.decode(codes) - vectors).max() < 0.01
+        assert isinstance(quantizer, ScalarQuantizer)
+
+    def test_blocked_scores_match_decoded(self):
+        vectors = _vectors(count=ScalarQuantizer.SCORE_BLOCK * 2 + 7)
+        quantizer = ScalarQuantizer(16)
+        quantizer.train(vectors)
+        codes = quantizer.encode(vectors)
+
+        expected = quantizer.decode(codes) @ vectors[3]
+        assert np.allclose(quantizer.scores(vectors[3], codes), expected, atol=1e-4)
+        assert quantizer.scores(vectors[3], codes[:0]).shape == (0,)
+
+    def test_unknown_kind(self):
+        with pytest.raises(ValueError):
+            create_quantizer("opq", 16)
+
+
+class TestQuantizedMmapIndex:
+    def test_rerank_returns_exact_scores(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "vector_quantization_min_rows", 400)
+        monkeypatch.setattr(settings, "vector_quantization_subspaces", 4)
+        vectors = _vectors()
+        index = MmapVectorIndex(str(tmp_path), 16, quantization="pq")
+        index.add(1, list(range(500)), [""] * 500, vectors)
+
+        assert index.stats()["code_bytes"] == 4
+        results = index.search(vectors[7], top_k=3)
+        assert results[0].chunk_id == 7
+        assert results[0].score == pytest.approx(1.0, abs=1e-5)
+
+        index.add(2, [900], [""], vectors[:1])
+        reloaded = MmapVectorIndex(str(tmp_path), 16, quantization="pq")
+        assert reloaded.stats()["quantization"] == "pq"
+        assert {r.chunk_id for r in reloaded.search(vectors[0], top_k=2)} == {0, 900}
+
+    def test_stats_report_scan_and_disk_bytes(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "vector_quantization_min_rows", 400)
+        vectors = _vectors()
+        exact = MmapVectorIndex(str(tmp_path / "exact"), 16)
+        exact.add(1, list(range(500)), [""] * 500, vectors)
+        quantized = MmapVectorIndex(str(tmp_path / "sq8"), 16, quantization="sq8")
+        quantized.add(1, list(range(500)), [""] * 500, vectors)
+
+        assert exact.stats()["scan_bytes"] == 500 * 16 * 4
+        assert quantized.stats()["scan_bytes"] == 500 * 16
+        # 全精度向量保留在磁盘上用于精排，量化后磁盘占用只增不减
+        assert quantized.stats()["disk_bytes"] > exact.stats()["disk_bytes"]
+
+    def test_sq8_codes_written_column_major_are_reencoded(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(settings, "vector_quantization_min_rows", 400)
+        vectors = _vectors()
+        index = MmapVectorIndex(str(tmp_path), 16, quantization="sq8")
+        index.add(1, list(range(500)), [""] * 500, vectors)
+        expected = [r.chunk_id for r in index.search(vectors[5], top_k=5)]
+
+        # 模拟早期版本：编码按列存储且 meta 中没有 codes_order
+        codes = np.array(index._codes)
+        fortran = np.memmap(index._path(index.CODES_FILE), dtype=np.int8, mode="r+",
+                            shape=codes.shape, order="F")
+        fortran[:] = codes
+        fortran.flush()
+        meta_path = index._path(index.META_FILE)
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        meta.pop("codes_order")
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        reloaded = MmapVectorIndex(str(tmp_path), 16, quantization="sq8")
+        assert np.array_equal(np.array(reloaded._codes[:500]), codes[:500])
+        assert [r.chunk_id for r in reloaded.search(vectors[5], top_k=5)] == expected
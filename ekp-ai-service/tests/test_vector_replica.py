@@ -0,0 +1,151 @@
+import asyncio
+import sys
+import os
+from contextlib import asynccontextmanager
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("hnswlib")
+
+from src.services.corpus_events import DocumentIndexedEvent
+from src.services.vector_replica import VectorReplica
+
+
+def random_unit_vectors(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class TestVectorReplica:
+    def make_replica(self, n: int = 200, dim: int = 16):
+        replica = VectorReplica(dimension=dim)
+        vectors = random_unit_vectors(n, dim)
+        chunk_ids = list(range(1, n + 1))
+        document_ids = [1 + i % 4 for i in range(n)]
+        replica.add(
+            chunk_ids,
+            document_ids,
+            [f"chunk {i}" for i in chunk_ids],
+            vectors,
+            titles={d: f"doc {d}" for d in set(document_ids)},
+        )
+        return replica, vectors, chunk_ids, document_ids
+
+    def test_finds_exact_match(self):
+        replica, vectors, chunk_ids, document_ids = self.make_replica()
+        results = replica.search(vectors[10], top_k=3)
+        assert results[0].chunk_id == chunk_ids[10]
+        assert results[0].document_id == document_ids[10]
+        assert results[0].document_title == f"doc {document_ids[10]}"
+        assert results[0].score == pytest.approx(1.0, abs=1e-4)
+
+    def test_document_filter(self):
+        replica, vectors, _, _ = self.make_replica()
+        results = replica.search(vectors[0], top_k=10, document_ids=[2])
+        assert len(results) == 10
+        assert all(r.document_id == 2 for r in results)
+
+    def test_search_many_matches_single_queries(self):
+        replica, vectors, _, _ = self.make_replica()
+        batched = replica.search_many(vectors[:3], top_k=4, document_ids=[1, 3])
+        assert len(batched) == 3
+        for query, results in zip(vectors[:3], batched):
+            single = replica.search(query, top_k=4, document_ids=[1, 3])
+            assert [r.chunk_id for r in results] == [r.chunk_id for r in single]
+
+    def test_remove_and_reindex_document(self):
+        replica, vectors, _, _ = self.make_replica()
+        assert replica.remove_document(1) == 50
+        assert all(r.document_id != 1 for r in replica.search(vectors[0], top_k=20))
+        assert replica.search(vectors[0], top_k=5, document_ids=[1]) == []
+
+        new_vectors = random_unit_vectors(3, 16, seed=1)
+        replica.on_document_indexed(
+            DocumentIndexedEvent(
+                document_id=1,
+                document_title="doc 1 v2",
+                chunk_ids=[1001, 1002, 1003],
+                contents=["a", "b", "c"],
+                embeddings=new_vectors,
+            )
+        )
+        results = replica.search(new_vectors[1], top_k=1, document_ids=[1])
+        assert results[0].chunk_id == 1002
+        assert results[0].document_title == "doc 1 v2"
+        assert len(replica) == 153
+
+    def test_duplicate_chunks_are_ignored(self):
+        replica, vectors, chunk_ids, document_ids = self.make_replica()
+        added = replica.add(chunk_ids[:5], document_ids[:5], ["x"] * 5, vectors[:5])
+        assert added == 0
+        assert len(replica) == 200
+
+    def test_sync_drops_documents_missing_from_stats(self):
+        replica, vectors, _, _ = self.make_replica()
+        conn = FakeConnection(live_documents=[1, 2, 4])
+        assert asyncio.run(replica.sync(FakePool(conn))) == 0
+
+        assert all(r.document_id != 3 for r in replica.search(vectors[2], top_k=20))
+        assert len(replica) == 150
+        # 只按副本持有的文档查 document_stats，不扫描向量表
+        sql, held = conn.fetched[0]
+        assert "document_stats" in sql and sorted(held) == [1, 2, 3, 4]
+
+    def test_becomes_ready_after_sync_on_empty_start(self):
+        replica = VectorReplica(dimension=16)
+        conn = FakeConnection(live_documents=[1])
+
+        async def scenario():
+            await replica.start(FakePool(conn))
+            assert not replica.is_ready
+
+            vectors = random_unit_vectors(3, 16)
+            conn.rows = [
+                {
+                    "id": i + 1,
+                    "chunk_id": i + 1,
+                    "document_id": 1,
+                    "content": f"chunk {i}",
+                    "embedding": vectors[i],
+                    "title": "doc 1",
+                }
+                for i in range(3)
+            ]
+            assert await replica.sync(FakePool(conn)) == 3
+            assert replica.is_ready
+            await replica.stop()
+
+        asyncio.run(scenario())
+        assert len(replica) == 3
+
+
+class FakeConnection:
+    def __init__(self, live_documents):
+        self.live_documents = live_documents
+        self.rows = []
+        self.fetched = []
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def cursor(self, sql, max_vector_id):
+        for row in self.rows:
+            if row["id"] > max_vector_id:
+                yield row
+
+    async def fetch(self, sql, document_ids):
+        self.fetched.append((sql, document_ids))
+        return [{"document_id": d} for d in self.live_documents if d in document_ids]
+
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.conn
@@ -0,0 +1,116 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.vector_schema import (
+    COMPACT_SCHEMA,
+    FULL_SCHEMA,
+    build_batch_search_sql,
+    build_search_sql,
+    get_vector_schema,
+)
+from src.services.vector_storage_migration import VectorStorageMigrator
+
+
+class TestVectorSchema:
+    def test_get_vector_schema(self):
+        assert get_vector_schema("full") is FULL_SCHEMA
+        assert get_vector_schema("compact") is COMPACT_SCHEMA
+        with pytest.raises(ValueError):
+            get_vector_schema("int8")
+
+    def test_full_search_reads_content_from_vector_table(self):
+        query = build_search_sql(FULL_SCHEMA, "$1", "$2", "$3::bigint[]")
+        assert "dv.content" in query
+        assert "$1::vector" in query
+        assert "ANY($3::bigint[])" in query
+        assert "document_chunks" not in query
+
+    def test_compact_search_fetches_content_for_top_k_only(self):
+        query = build_search_sql(COMPACT_SCHEMA, "%(embedding)s", "%(limit)s")
+        assert "FROM document_vectors_half dv" in query
+        assert "%(embedding)s::halfvec" in query
+        assert "JOIN document_chunks dc ON dc.id = nearest.chunk_id" in query
+        assert "dv.content" not in query
+        assert "ANY(" not in query
+
+    def test_score_threshold_is_pushed_into_sql(self):
+        unscoped = build_search_sql(FULL_SCHEMA, "$1", "$2", max_distance="$3::float8")
+        exact = build_search_sql(
+            FULL_SCHEMA, "$1", "$2", "$3::bigint[]", "exact", max_distance="$4::float8"
+        )
+        ann = build_search_sql(
+            COMPACT_SCHEMA, "$1", "$2", "$3::bigint[]", "ann", "$4::int", "$5::float8"
+        )
+        unbounded = build_search_sql(FULL_SCHEMA, "$1", "$2", "$3::bigint[]", "ann", "$4::int")
+
+        assert "WHERE candidates.distance <= $3::float8" in unscoped
+        assert "horizon" not in unscoped
+        assert "WHERE dv.embedding <=> $1::vector <= $4::float8" in exact
+        assert "AND fetched.distance <= $5::float8" in ann
+        assert "horizon" not in unbounded
+
+    def test_horizon_is_aggregated_before_threshold_filter(self):
+        ann = build_search_sql(
+            COMPACT_SCHEMA, "$1", "$2", "$3::bigint[]", "ann", "$4::int", "$5::float8"
+        )
+
+        assert "FROM (SELECT MAX(distance) AS horizon FROM fetched) bounds" in ann
+        assert ann.index("bounds") < ann.index("AND fetched.distance <= $5::float8")
+        assert ") nearest ON true" in ann
+        assert "LEFT JOIN document_chunks dc ON dc.id = nearest.chunk_id" in ann
+
+    def test_batch_search_runs_lateral_per_query(self):
+        query = build_batch_search_sql(COMPACT_SCHEMA, "$1", "$2", "$3::bigint[]", "exact")
+        assert "unnest($1::halfvec[]) WITH ORDINALITY AS q(embedding, query_index)" in query
+        assert "CROSS JOIN LATERAL" in query
+        assert "dv.embedding <=> q.embedding" in query
+        assert query.index("AS MATERIALIZED") < query.index("CROSS JOIN LATERAL")
+        assert "ORDER BY q.query_index, nearest.distance" in query
+
+
+class FakeCursor:
+    def __init__(self, batches, calls):
+        self.batches = batches
+        self.calls = calls
+
+    def execute(self, query, params):
+        self.calls.append(params)
+
+    def fetchone(self):
+        return self.batches.pop(0)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, batches):
+        self.batches = batches
+        self.calls = []
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self.batches, self.calls)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+class TestVectorStorageMigrator:
+    def test_migrate_advances_watermark_per_batch(self):
+        conn = FakeConnection([(100, 100), (180, 75), (None, 0)])
+
+        copied = VectorStorageMigrator("postgresql://unused").migrate(
+            start_after=0, batch_size=100, conn=conn
+        )
+
+        assert copied == 175
+        assert conn.calls == [(0, 100), (100, 100), (180, 100)]
+        assert conn.commits == 3
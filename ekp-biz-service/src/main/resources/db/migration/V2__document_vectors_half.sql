@@ -0,0 +1,16 @@
+-- V2__document_vectors_half.sql
+-- Compact vector storage: half-precision embeddings without the duplicated chunk text
+-- (content is read from document_chunks by chunk_id). Requires pgvector 0.7+.
+
+CREATE TABLE document_vectors_half (
+    id BIGSERIAL PRIMARY KEY,
+    document_id BIGINT NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    chunk_id BIGINT NOT NULL UNIQUE REFERENCES document_chunks(id) ON DELETE CASCADE,
+    embedding halfvec(1024) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_document_vectors_half_document_id ON document_vectors_half(document_id);
+
+-- Create vector index for similarity search (HNSW)
+CREATE INDEX idx_document_vectors_half_embedding ON document_vectors_half USING hnsw (embedding halfvec_cosine_ops);
@@ -0,0 +1,42 @@
+-- V3__document_stats.sql
+-- Per-document indexing statistics, maintained by the AI service in the same
+-- transaction as chunk/vector writes so listings do not COUNT(*) document_vectors.
+
+CREATE TABLE document_stats (
+    document_id BIGINT PRIMARY KEY REFERENCES documents(id) ON DELETE CASCADE,
+    vector_count INTEGER NOT NULL DEFAULT 0,
+    chunk_count INTEGER NOT NULL DEFAULT 0,
+    token_count BIGINT NOT NULL DEFAULT 0,
+    last_indexed_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Backfill from existing chunks and vectors
+INSERT INTO document_stats (document_id, vector_count, chunk_count, token_count, last_indexed_at)
+SELECT
+    d.id,
+    GREATEST(COALESCE(v.vector_count, 0), COALESCE(h.vector_count, 0)),
+    COALESCE(c.chunk_count, 0),
+    COALESCE(c.token_count, 0),
+    GREATEST(c.last_created_at, v.last_created_at, h.last_created_at)
+FROM documents d
+LEFT JOIN (
+    SELECT document_id, COUNT(*) AS chunk_count, SUM(COALESCE(token_count, 0)) AS token_count,
+           MAX(created_at) AS last_created_at
+    FROM document_chunks
+    GROUP BY document_id
+) c ON c.document_id = d.id
+LEFT JOIN (
+    SELECT document_id, COUNT(*) AS vector_count, MAX(created_at) AS last_created_at
+    FROM document_vectors
+    GROUP BY document_id
+) v ON v.document_id = d.id
+LEFT JOIN (
+    SELECT document_id, COUNT(*) AS vector_count, MAX(created_at) AS last_created_at
+    FROM document_vectors_half
+    GROUP BY document_id
+) h ON h.document_id = d.id
+WHERE c.document_id IS NOT NULL OR v.document_id IS NOT NULL OR h.document_id IS NOT NULL;
+
+CREATE TRIGGER update_document_stats_updated_at BEFORE UPDATE ON document_stats
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
@@ -0,0 +1,11 @@
+-- V4__text_search_trgm.sql
+-- Trigram indexes for the keyword / metadata retrieval branches of the AI service.
+-- word_similarity on character trigrams also works for Chinese text without segmentation.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_document_chunks_content_trgm
+    ON document_chunks USING gin (content gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_documents_title_trgm
+    ON documents USING gin (title gin_trgm_ops);
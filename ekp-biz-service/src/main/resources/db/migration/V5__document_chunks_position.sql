@@ -0,0 +1,5 @@
+-- V5__document_chunks_position.sql
+-- Lookup of neighbouring chunks by (document_id, chunk_index) for context assembly in the AI service.
+
+CREATE INDEX IF NOT EXISTS idx_document_chunks_document_position
+    ON document_chunks (document_id, chunk_index);
@@ -0,0 +1,28 @@
+-- V6__document_embeddings.sql
+-- Document-level embeddings for two-stage retrieval in the AI service: the first stage
+-- picks candidate documents from this small table, the second searches chunks scoped to them.
+-- Written at ingest as the normalized centroid of the chunk vectors blended with the title vector.
+
+CREATE TABLE document_embeddings (
+    document_id BIGINT PRIMARY KEY REFERENCES documents(id) ON DELETE CASCADE,
+    embedding vector(1024) NOT NULL,
+    chunk_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_document_embeddings_embedding ON document_embeddings USING hnsw (embedding vector_cosine_ops);
+
+-- Backfill from existing chunk vectors (centroid only; the title blend is applied on re-index)
+INSERT INTO document_embeddings (document_id, embedding, chunk_count)
+SELECT document_id, AVG(l2_normalize(embedding)), COUNT(*)
+FROM document_vectors
+GROUP BY document_id;
+
+INSERT INTO document_embeddings (document_id, embedding, chunk_count)
+SELECT document_id, AVG(l2_normalize(embedding::vector)), COUNT(*)
+FROM document_vectors_half
+GROUP BY document_id
+ON CONFLICT (document_id) DO NOTHING;
+
+CREATE TRIGGER update_document_embeddings_updated_at BEFORE UPDATE ON document_embeddings
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
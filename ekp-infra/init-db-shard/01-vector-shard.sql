@@ -0,0 +1,15 @@
+-- Vector shard node: holds a hash partition of document_vectors (see ekp-ai-service sharded_vector_store)
+CREATE EXTENSION IF NOT EXISTS vector;
+
+-- No foreign keys: documents and document_chunks live on the primary database
+CREATE TABLE IF NOT EXISTS document_vectors (
+    id BIGSERIAL PRIMARY KEY,
+    document_id BIGINT NOT NULL,
+    chunk_id BIGINT NOT NULL,
+    content TEXT NOT NULL,
+    embedding vector(1024) NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_document_vectors_document_id ON document_vectors(document_id);
+CREATE INDEX IF NOT EXISTS idx_document_vectors_embedding_hnsw
+    ON document_vectors USING hnsw (embedding vector_cosine_ops);